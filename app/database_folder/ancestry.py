@@ -0,0 +1,93 @@
+"""
+Maintenance of the cat_ancestry closure table.
+
+One row per (ancestor_id, descendant_id) pair, with depth the number of
+generations on the shortest path between them; each cat also has a depth 0
+row pointing to itself. Ancestors more than MAX_ANCESTRY_DEPTH generations
+up are not stored.
+
+The rows of a cat are recomputed with a recursive walk up the parent
+columns. The walk deduplicates (ancestor, descendant, depth) rows, so its
+size follows ancestors times generations rather than the number of pedigree
+paths, which doubles with every generation of a linebred pedigree. A
+parent change or deletion recomputes the cat and its descendants only.
+"""
+import asyncio
+
+from sqlalchemy import text
+
+MAX_ANCESTRY_DEPTH = 64
+
+_ANCESTRY_WALK = """
+    INSERT INTO cat_ancestry (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE walk(ancestor_id, descendant_id, depth) AS (
+        SELECT cat_id, cat_id, 0 FROM cat {where}
+        UNION
+        SELECT p.cat_id, w.descendant_id, w.depth + 1
+        FROM walk AS w
+        JOIN cat AS c ON c.cat_id = w.ancestor_id
+        JOIN cat AS p ON p.cat_id IN (c.cat_dam_id, c.cat_sire_id)
+        WHERE w.depth < :max_depth
+    )
+    SELECT ancestor_id, descendant_id, min(depth) FROM walk
+    GROUP BY ancestor_id, descendant_id
+"""
+
+_INSERT_ANCESTRY = text(_ANCESTRY_WALK.format(where="WHERE cat_id = ANY(:cat_ids)"))
+
+_REBUILD = text(_ANCESTRY_WALK.format(where=""))
+
+_DELETE_ANCESTRY = text("""
+    DELETE FROM cat_ancestry
+    WHERE descendant_id = ANY(:cat_ids) OR ancestor_id = ANY(:cat_ids)
+""")
+
+_IS_DESCENDANT = text("""
+    SELECT 1 FROM cat_ancestry
+    WHERE ancestor_id = :cat_id AND descendant_id = :parent_id
+    LIMIT 1
+""")
+
+
+async def _recompute_ancestry(session, cat_ids: list):
+    await session.execute(text("DELETE FROM cat_ancestry WHERE descendant_id = ANY(:cat_ids)"),
+                          {"cat_ids": cat_ids})
+    await session.execute(_INSERT_ANCESTRY, {"cat_ids": cat_ids, "max_depth": MAX_ANCESTRY_DEPTH})
+
+
+async def relink_cat_ancestry(session, cat_id: int, dam_id: int = None, sire_id: int = None):
+    """Recompute the ancestry of a cat and all its descendants after a parent change"""
+    for parent_id in (dam_id, sire_id):
+        if parent_id and (await session.execute(_IS_DESCENDANT, {"cat_id": cat_id, "parent_id": parent_id})).first():
+            raise ValueError(f"Cat {parent_id} is a descendant of cat {cat_id} and cannot be its parent")
+
+    await _recompute_ancestry(session, await descendant_ids(session, cat_id))
+
+
+async def unlink_cat_ancestry(session, cat_id: int):
+    """Remove a deleted cat from the table and recompute the ancestry of its descendants"""
+    affected_ids = [i for i in await descendant_ids(session, cat_id) if i != cat_id]
+    await session.execute(_DELETE_ANCESTRY, {"cat_ids": [cat_id]})
+    if affected_ids:
+        await _recompute_ancestry(session, affected_ids)
+
+
+async def descendant_ids(session, cat_id: int) -> list:
+    """Get the ids of a cat and all its descendants"""
+    result = await session.execute(
+        text("SELECT DISTINCT descendant_id FROM cat_ancestry WHERE ancestor_id = :cat_id"), {"cat_id": cat_id})
+    return [row[0] for row in result.all()] or [cat_id]
+
+
+async def rebuild_cat_ancestry(session) -> int:
+    """Recompute the whole closure table from cat_dam_id/cat_sire_id"""
+    await session.execute(text("TRUNCATE cat_ancestry"))
+    result = await session.execute(_REBUILD, {"max_depth": MAX_ANCESTRY_DEPTH})
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    from app.database_folder.orm import AsyncOrm
+
+    rows = asyncio.run(AsyncOrm.rebuild_cat_ancestry())
+    print(f"cat_ancestry rebuilt: {rows} rows")
@@ -0,0 +1,263 @@
+"""
+Content-addressed store for cat photos and files.
+
+Every blob is stored once under the SHA-256 of its content, in directories
+sharded by the first two byte pairs of the digest:
+BLOB_DIR/ab/cd/abcd...<ext>. cat_photos and cat_files reference blobs by
+that path, so identical uploads share one file and a microchip change only
+updates the cat row. A file reference carries the uploaded name after '#'.
+
+The blob table indexes the referenced blobs with their size and reference
+count, kept in the transaction that changes the referencing cat rows.
+Garbage collection removes blobs that have been unreferenced for longer
+than BLOB_GC_GRACE_SECONDS, with every file sharing their digest (photo
+renditions); the grace period keeps uploads that are not saved to a cat yet.
+
+Storing never holds a lock: an upload of content that is already stored
+touches the blob, and writes it again if the blob is gone by then. The
+collector first renames the files of a blob to trash names, so a later
+touch cannot reach them, then checks their modification times again: a blob
+touched in the meantime is put back, otherwise the trash is removed.
+"""
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+
+from sqlalchemy import text
+
+from app.database_folder.db_setting import settings
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# BLOB_DIR/ab/cd/<digest><ext>, optionally followed by #<uploaded name>
+_REFERENCE = re.compile(r'^(?P<path>(?:.*/)?[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?P<ext>\.[a-z0-9]+)?)'
+                        r'(?:#(?P<name>.*))?$', re.DOTALL)
+# Upload names of the per-microchip layout: <stem>_<8 hex digits><ext>
+_LEGACY_NAME = re.compile(r'^(?P<stem>.+)_[0-9a-f]{8}(?P<ext>\.[^.]*)?$', re.IGNORECASE)
+
+_DIGEST_NAME = re.compile(r'^[0-9a-f]{64}')
+# Prefix of files renamed by remove_blobs before they are deleted
+TRASH_PREFIX = '.trash-'
+
+_ADD_REFS = text("""
+    INSERT INTO blob (sha256, extension, size, refcount, updated_at)
+    VALUES (:digest, :ext, :size, :count, now())
+    ON CONFLICT (sha256) DO UPDATE
+    SET refcount = blob.refcount + EXCLUDED.refcount, updated_at = now()
+""")
+
+_REMOVE_REFS = text("""
+    UPDATE blob SET refcount = GREATEST(refcount - :count, 0), updated_at = now()
+    WHERE sha256 = :digest
+""")
+
+_DELETE_UNREFERENCED = text("""
+    DELETE FROM blob
+    WHERE refcount = 0 AND updated_at < now() - make_interval(secs => :grace)
+    RETURNING sha256
+""")
+
+
+def blob_path(digest: str, ext: str = '') -> str:
+    """Sharded path of a blob, with forward slashes as stored in the database"""
+    return f"{settings.BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+def parse_reference(reference: str):
+    """(digest, extension, path, uploaded name) of a blob reference, None for other paths"""
+    match = _REFERENCE.match(reference.replace('\\', '/')) if reference else None
+    if match is None:
+        return None
+    return match.group('digest'), match.group('ext') or '', match.group('path'), match.group('name')
+
+
+def is_blob(reference: str) -> bool:
+    return parse_reference(reference) is not None
+
+
+def reference_path(reference: str) -> str:
+    """File system path of a reference, without the uploaded name"""
+    parsed = parse_reference(reference)
+    return parsed[2] if parsed else reference
+
+
+def display_name(reference: str) -> str:
+    """Name a reference was uploaded under, as far as it is known"""
+    parsed = parse_reference(reference)
+    if parsed:
+        return parsed[3] or os.path.basename(parsed[2])
+    name = os.path.basename(reference.replace('\\', '/'))
+    match = _LEGACY_NAME.match(name)
+    return match.group('stem') + (match.group('ext') or '') if match else name
+
+
+def _touch(path: str) -> bool:
+    """Restart the grace period of a stored blob; False when it is not stored (any more)"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _store(digest: str, ext: str, temp_path: str) -> str:
+    path = blob_path(digest, ext)
+    if _touch(path):
+        os.remove(temp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+    return path
+
+
+def put_blob(content: bytes, ext: str = '') -> str:
+    """Store content and return its blob path; content that is already stored is not written again"""
+    digest = hashlib.sha256(content).hexdigest()
+    path = blob_path(digest, ext)
+    # A new upload of an unreferenced blob restarts its grace period
+    if _touch(path):
+        return path
+    os.makedirs(settings.BLOB_DIR, exist_ok=True)
+    # Write next to the store and rename, so a blob is never visible half written
+    fd, temp_path = tempfile.mkstemp(dir=settings.BLOB_DIR, suffix='.part')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    return _store(digest, ext, temp_path)
+
+
+def put_blob_stream(stream, ext: str = '') -> str:
+    """Store a binary file object, hashing it while it is copied"""
+    os.makedirs(settings.BLOB_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=settings.BLOB_DIR, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while chunk := stream.read(READ_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return _store(digest.hexdigest(), ext, temp_path)
+
+
+def _blob_counts(references) -> Counter:
+    counts = Counter()
+    for reference in references or ():
+        parsed = parse_reference(reference)
+        if parsed:
+            counts[parsed[0], parsed[1]] += 1
+    return counts
+
+
+async def adjust_blob_references(session, old_references, new_references):
+    """Count the blob references a cat gains and loses when its photos and files change"""
+    old_counts, new_counts = _blob_counts(old_references), _blob_counts(new_references)
+    for (digest, ext), count in (new_counts - old_counts).items():
+        path = blob_path(digest, ext)
+        size = os.path.getsize(path) if os.path.exists(path) else None
+        await session.execute(_ADD_REFS, {"digest": digest, "ext": ext, "size": size, "count": count})
+    for (digest, _), count in (old_counts - new_counts).items():
+        await session.execute(_REMOVE_REFS, {"digest": digest, "count": count})
+
+
+async def unreferenced_blobs(session, grace_seconds: float | None = None) -> list:
+    """
+    Delete the index rows of blobs unreferenced for grace_seconds and find the stored blobs no cat ever referenced
+    Returns (directory, digest) pairs for remove_blobs once the transaction is committed
+    """
+    grace = settings.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    blobs = [(os.path.dirname(blob_path(digest)), digest)
+             for (digest,) in (await session.execute(_DELETE_UNREFERENCED, {"grace": grace})).all()]
+    # Files without an index row were uploaded but never saved to a cat
+    for directory, _, names in os.walk(settings.BLOB_DIR):
+        digests = {name[:64] for name in names if _DIGEST_NAME.match(name)}
+        if digests:
+            known = await session.execute(text("SELECT sha256 FROM blob WHERE sha256 = ANY(:digests)"),
+                                          {"digests": list(digests)})
+            blobs.extend((directory, digest) for digest in digests - {row[0] for row in known.all()})
+        # Temporary files of interrupted writes and trash of an interrupted collection
+        blobs.extend((directory, name) for name in names if name.endswith('.part') or name.startswith(TRASH_PREFIX))
+    return blobs
+
+
+def remove_blobs(blobs: list, grace_seconds: float | None = None) -> int:
+    """Remove the files of unreferenced_blobs that were not written or uploaded again within the grace period"""
+    grace = settings.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    deadline = time.time() - grace
+    removed = 0
+    for directory, digest in blobs:
+        # Photo renditions share the digest of their blob and go with it
+        paths = glob.glob(os.path.join(directory, glob.escape(digest) + '*'))
+        try:
+            if any(os.path.getmtime(path) >= deadline for path in paths):
+                continue
+        except FileNotFoundError:
+            continue
+        trash = []
+        for path in paths:
+            trash_path = os.path.join(directory, f"{TRASH_PREFIX}{os.getpid()}-{os.path.basename(path)}")
+            try:
+                os.rename(path, trash_path)
+                trash.append((path, trash_path))
+            except FileNotFoundError:
+                pass
+        # Touched between the first check and the rename: the blob was stored again, put it back
+        if any(os.path.getmtime(trash_path) >= deadline for _, trash_path in trash):
+            for path, trash_path in trash:
+                os.replace(trash_path, path)
+            continue
+        for _, trash_path in trash:
+            os.remove(trash_path)
+            removed += 1
+    return removed
+
+
+async def import_legacy_references(session) -> list:
+    """
+    Move the photos and files of every cat from the per-microchip directories into the store
+    Returns the imported paths, which can be deleted once the transaction is committed
+    """
+    imported = []
+    rows = await session.execute(text("SELECT cat_id, cat_photos, cat_files FROM cat"))
+    for cat_id, photos, files in rows.all():
+        new_photos, new_files = [], []
+        for references, converted, keep_name in ((photos, new_photos, False), (files, new_files, True)):
+            for reference in references or []:
+                if reference and not is_blob(reference) and os.path.isfile(reference):
+                    with open(reference, 'rb') as f:
+                        path = put_blob_stream(f, os.path.splitext(reference)[1])
+                    imported.append(reference)
+                    converted.append(f"{path}#{display_name(reference)}" if keep_name else path)
+                else:
+                    converted.append(reference)
+        if new_photos != (photos or []) or new_files != (files or []):
+            await session.execute(
+                text("UPDATE cat SET cat_photos = :photos, cat_files = :files WHERE cat_id = :cat_id"),
+                {"photos": new_photos, "files": new_files, "cat_id": cat_id})
+            await adjust_blob_references(session, (photos or []) + (files or []), new_photos + new_files)
+    return imported
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    from app.database_folder.orm import AsyncOrm
+
+    if sys.argv[1:2] == ["import"]:
+        from app.niceGUI_folder.photo_service import PhotoService
+
+        paths = asyncio.run(AsyncOrm.import_legacy_blobs())
+        for path in paths:
+            PhotoService.delete_photo(path)
+        photos, written = PhotoService.backfill_variants()
+        print(f"Moved {len(paths)} photos and files into {settings.BLOB_DIR}, wrote {written} photo renditions")
+    elif sys.argv[1:2] == ["gc"]:
+        print(f"Blob garbage collection removed {asyncio.run(AsyncOrm.collect_blob_garbage())} files")
+    else:
+        print("Usage: python -m app.database_folder.blob_store import|gc")
@@ -0,0 +1,122 @@
+"""
+Composable filter spec for cat list queries.
+
+Every field that is set adds one SQL condition and all conditions are combined
+with AND, so a page fetched with a filter is always full and no filtering is
+left to the caller. List fields become IN-lists, *_from/*_to and *_min/*_max
+are inclusive ranges and booleans match exactly.
+"""
+from dataclasses import dataclass, fields
+from datetime import date
+
+from sqlalchemy import or_
+
+from app.database_folder.model import Cat, Owner, Breed
+from app.database_folder.search import indexed_search_condition, search_terms
+
+
+def _values(value) -> list:
+    """Accept a single value or a list of values"""
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def search_condition(search: str, breed=Breed):
+    """Case-insensitive substring match over the searchable cat, owner and breeder columns (sequential scan)"""
+    pattern = f"%{search}%"
+    return or_(
+        Cat.cat_firstname.ilike(pattern),
+        Cat.cat_surname.ilike(pattern),
+        Cat.cat_callname.ilike(pattern),
+        Cat.cat_gender.ilike(pattern),
+        Cat.cat_microchip_number.ilike(pattern),
+        Cat.cat_EMS_colour.ilike(pattern),
+        Cat.cat_litter.ilike(pattern),
+        Cat.cat_haritage_number.ilike(pattern),
+        Cat.cat_haritage_number_2.ilike(pattern),
+        Cat.cat_eye_colour.ilike(pattern),
+        Cat.cat_hair_type.ilike(pattern),
+        Cat.cat_tests.ilike(pattern),
+        Cat.cat_blood_group.ilike(pattern),
+        Cat.cat_gencode.ilike(pattern),
+        Cat.cat_features.ilike(pattern),
+        Cat.cat_notes.ilike(pattern),
+        Cat.cat_show_results.ilike(pattern),
+        Cat.cat_birth_country.ilike(pattern),
+        Cat.cat_location.ilike(pattern),
+        Cat.cat_association.ilike(pattern),
+        Cat.cat_jaw_fault.ilike(pattern),
+        Cat.cat_hernia.ilike(pattern),
+        Cat.cat_testicles.ilike(pattern),
+        Cat.cat_death_cause.ilike(pattern),
+        Cat.cat_status.ilike(pattern),
+        Owner.owner_firstname.ilike(pattern),
+        Owner.owner_surname.ilike(pattern),
+        Owner.owner_email.ilike(pattern),
+        breed.breed_firstname.ilike(pattern),
+        breed.breed_surname.ilike(pattern),
+        breed.breed_email.ilike(pattern),
+    )
+
+
+@dataclass
+class CatFilter:
+    """Structured cat filters, combined with AND"""
+    search: str | None = None
+    genders: list | str | None = None
+    owner_ids: list | int | None = None
+    breed_ids: list | int | None = None
+    colours: list | str | None = None
+    eye_colours: list | str | None = None
+    hair_types: list | str | None = None
+    statuses: list | str | None = None
+    birthday_from: date | None = None
+    birthday_to: date | None = None
+    weight_min: float | None = None
+    weight_max: float | None = None
+    breeding_animal: bool | None = None
+    breeding_lock: bool | None = None
+    alive: bool | None = None
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, f.name) in (None, '', []) for f in fields(self))
+
+    def conditions(self, breed=Breed, indexed_search: bool = False) -> list:
+        """SQL conditions for a query over Cat joined with Owner and breed (the Breed entity or an alias)"""
+        conditions = []
+        if self.search and indexed_search:
+            if search_terms(self.search):
+                conditions.append(indexed_search_condition(self.search))
+        elif self.search:
+            conditions.append(search_condition(self.search, breed))
+
+        for column, value in (
+            (Cat.cat_gender, self.genders),
+            (Cat.owner_id, self.owner_ids),
+            (Cat.cat_breed_id, self.breed_ids),
+            (Cat.cat_EMS_colour, self.colours),
+            (Cat.cat_eye_colour, self.eye_colours),
+            (Cat.cat_hair_type, self.hair_types),
+            (Cat.cat_status, self.statuses),
+        ):
+            if value not in (None, '', []):
+                conditions.append(column.in_(_values(value)))
+
+        if self.birthday_from is not None:
+            conditions.append(Cat.cat_birthday >= self.birthday_from)
+        if self.birthday_to is not None:
+            conditions.append(Cat.cat_birthday <= self.birthday_to)
+        if self.weight_min is not None:
+            conditions.append(Cat.cat_weight >= self.weight_min)
+        if self.weight_max is not None:
+            conditions.append(Cat.cat_weight <= self.weight_max)
+
+        # NULL flags count as False, the column default
+        if self.breeding_animal is not None:
+            conditions.append(Cat.cat_breeding_animal.is_(True) if self.breeding_animal
+                              else Cat.cat_breeding_animal.isnot(True))
+        if self.breeding_lock is not None:
+            conditions.append(Cat.cat_breeding_lock.is_(True) if self.breeding_lock
+                              else Cat.cat_breeding_lock.isnot(True))
+        if self.alive is not None:
+            conditions.append(Cat.cat_death_date.is_(None) if self.alive else Cat.cat_death_date.isnot(None))
+        return conditions
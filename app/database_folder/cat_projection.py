@@ -0,0 +1,120 @@
+"""
+Column projections for cat info rows.
+
+get_cat_info selects only the columns behind the requested row keys with a
+Core select, so a page is fetched as plain tuples instead of five ORM
+entities per row. Named profiles cover the views of the app.
+"""
+from sqlalchemy import case, func
+
+from app.database_folder.model import Cat, Owner
+
+
+def _parent_name(parent):
+    return case((parent.cat_id.isnot(None), func.concat(parent.cat_firstname, ' ', parent.cat_surname)))
+
+
+def cat_info_columns(dam, sire, breed) -> dict:
+    """Row key -> SQL expression for a query over Cat joined with Owner, dam, sire and breed aliases"""
+    return {
+        'id': Cat.cat_id,
+        'firstname': Cat.cat_firstname,
+        'surname': Cat.cat_surname,
+        'callname': Cat.cat_callname,
+        'gender': Cat.cat_gender,
+        'birthday': Cat.cat_birthday,
+        'microchip': Cat.cat_microchip_number,
+        'title': Cat.cat_title,
+        'haritage_number': Cat.cat_haritage_number,
+        'haritage_number_2': Cat.cat_haritage_number_2,
+        'eye_colour': Cat.cat_eye_colour,
+        'hair_type': Cat.cat_hair_type,
+        'tests': Cat.cat_tests,
+        'litter_size_male': Cat.cat_litter_size_male,
+        'litter_size_female': Cat.cat_litter_size_female,
+        'blood_group': Cat.cat_blood_group,
+        'gencode': Cat.cat_gencode,
+        'features': Cat.cat_features,
+        'notes': Cat.cat_notes,
+        'show_results': Cat.cat_show_results,
+        'breeding_lock': Cat.cat_breeding_lock,
+        'breeding_lock_date': Cat.cat_breeding_lock_date,
+        'breeding_animal': Cat.cat_breeding_animal,
+        'birth_country': Cat.cat_birth_country,
+        'location': Cat.cat_location,
+        'weight': Cat.cat_weight,
+        'birth_weight': Cat.cat_birth_weight,
+        'transfer_weight': Cat.cat_transfer_weight,
+        'faults_deviations': Cat.cat_faults_deviations,
+        'association': Cat.cat_association,
+        'jaw_fault': Cat.cat_jaw_fault,
+        'hernia': Cat.cat_hernia,
+        'testicles': Cat.cat_testicles,
+        'death_date': Cat.cat_death_date,
+        'death_cause': Cat.cat_death_cause,
+        'status': Cat.cat_status,
+        'kitten_transfer': Cat.cat_kitten_transfer,
+        'wcf_sticker': Cat.wcf_sticker,
+        'inbreeding_coefficient': Cat.cat_inbreeding_coefficient,
+        'description': Cat.cat_description,
+        'breed': Cat.cat_breed_id,
+        'colour': Cat.cat_EMS_colour,
+        'litter': Cat.cat_litter,
+        'owner_id': Cat.owner_id,
+        'owner_firstname': Owner.owner_firstname,
+        'owner_surname': Owner.owner_surname,
+        'owner_email': Owner.owner_email,
+        'owner_city': Owner.owner_city,
+        'owner_country': Owner.owner_country,
+        'breed_firstname': breed.breed_firstname,
+        'breed_surname': breed.breed_surname,
+        'breed_email': breed.breed_email,
+        'breed_city': breed.breed_city,
+        'breed_country': breed.breed_country,
+        'breed_phone': breed.breed_phone,
+        'dam': _parent_name(dam),
+        'sire': _parent_name(sire),
+    }
+
+
+# Keys of the full row, as returned before projections existed
+FULL_FIELDS = (
+    'id', 'firstname', 'surname', 'callname', 'gender', 'birthday', 'microchip', 'title', 'haritage_number',
+    'haritage_number_2', 'eye_colour', 'hair_type', 'tests', 'litter_size_male', 'litter_size_female',
+    'blood_group', 'gencode', 'features', 'notes', 'show_results', 'breeding_lock', 'breeding_lock_date',
+    'breeding_animal', 'birth_country', 'location', 'weight', 'birth_weight', 'transfer_weight',
+    'faults_deviations', 'association', 'jaw_fault', 'hernia', 'testicles', 'death_date', 'death_cause', 'status',
+    'kitten_transfer', 'wcf_sticker', 'inbreeding_coefficient', 'description', 'breed', 'colour', 'litter',
+    'owner_id', 'owner_firstname', 'owner_surname', 'owner_email', 'breed_firstname', 'breed_surname',
+    'breed_email', 'dam', 'sire',
+)
+
+CAT_INFO_PROFILES = {
+    'full': FULL_FIELDS,
+    # Columns of the cats page table
+    'table': tuple(f for f in FULL_FIELDS if f not in ('breeding_lock_date', 'breed', 'owner_email', 'breed_email')),
+    # Columns of the studbook listing and detail rows
+    'studbook': (
+        'id', 'firstname', 'surname', 'callname', 'gender', 'birthday', 'microchip', 'haritage_number',
+        'haritage_number_2', 'colour', 'litter', 'status', 'notes', 'breeding_animal', 'wcf_sticker',
+        'inbreeding_coefficient', 'breed', 'owner_id', 'owner_firstname', 'owner_surname', 'owner_email',
+        'owner_city', 'owner_country', 'breed_firstname', 'breed_surname', 'breed_email', 'breed_city',
+        'breed_country', 'breed_phone', 'dam', 'sire',
+    ),
+    # Columns written by the cats exports
+    'export': (
+        'id', 'firstname', 'surname', 'callname', 'gender', 'birthday', 'microchip', 'title', 'eye_colour',
+        'hair_type', 'colour', 'status', 'owner_firstname', 'owner_surname', 'breed_firstname', 'breed_surname',
+    ),
+}
+
+
+def resolve_fields(fields) -> tuple:
+    """Row keys for a profile name or a list of keys (the id is always included)"""
+    if fields is None:
+        return FULL_FIELDS
+    if isinstance(fields, str):
+        if fields not in CAT_INFO_PROFILES:
+            raise ValueError(f"Unknown cat info profile: {fields}")
+        return CAT_INFO_PROFILES[fields]
+    return ('id',) + tuple(f for f in dict.fromkeys(fields) if f != 'id')
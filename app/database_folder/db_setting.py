@@ -7,6 +7,12 @@ class Settings(BaseSettings):
     DB_USER: str
     DB_PASS: str
     DB_NAME: str
+    SESSION_BACKEND: str = "memory"  # memory, file or postgres
+    SESSION_TTL_SECONDS: int = 86400
+    SESSION_DIR: str = "sessions"
+    SLOW_QUERY_SECONDS: float = 0.5
+    BLOB_DIR: str = "blob_store"
+    BLOB_GC_GRACE_SECONDS: int = 86400  # unreferenced blobs are kept this long before garbage collection
 
     @property
     def DATABASE_URL_asyncpg(self):
@@ -0,0 +1,86 @@
+"""
+Faceted filter options for cat lists.
+
+Distinct values with their counts are computed by the database with one
+GROUPING SETS scan over the cat table. Results are cached per scope
+(owner and filters) and the cache is dropped whenever a cat is written.
+"""
+import asyncio
+
+from sqlalchemy import func, select, tuple_
+
+from app.database_folder.cat_filters import CatFilter
+from app.database_folder.model import Cat, Owner, Breed
+from app.database_folder.postgres import async_session
+
+FACET_COLUMNS = {
+    'gender': Cat.cat_gender,
+    'colour': Cat.cat_EMS_colour,
+    'eye_colour': Cat.cat_eye_colour,
+    'hair_type': Cat.cat_hair_type,
+    'status': Cat.cat_status,
+    'breed_id': Cat.cat_breed_id,
+    'owner_id': Cat.owner_id,
+}
+
+# Scopes kept at once, the oldest one is dropped first
+MAX_CACHED_SCOPES = 256
+
+_cache = {}
+_cache_version = 0
+_cache_lock = asyncio.Lock()
+
+
+async def load_cat_facets(session, fields, owner_id: int | None = None, filters: CatFilter | None = None) -> dict:
+    """Distinct non-empty values with counts for each field, sorted by value"""
+    columns = [FACET_COLUMNS[field] for field in fields]
+    query = (
+        select(*columns, func.count())
+        .select_from(Cat)
+        .group_by(func.grouping_sets(*[tuple_(column) for column in columns]))
+    )
+    if owner_id is not None:
+        query = query.where(Cat.owner_id == owner_id)
+    if filters is not None and not filters.is_empty():
+        # Search also matches owner and breeder columns
+        query = (query.join(Owner, Cat.owner_id == Owner.owner_id)
+                 .outerjoin(Breed, Cat.cat_breed_id == Breed.breed_id)
+                 .where(*filters.conditions(Breed)))
+
+    facets = {field: [] for field in fields}
+    for row in (await session.execute(query)).all():
+        # Each grouping set leaves the other columns NULL, NULL values themselves are skipped
+        for field, value in zip(fields, row):
+            if value is not None and value != '':
+                facets[field].append((value, row[-1]))
+    for values in facets.values():
+        values.sort(key=lambda item: str(item[0]))
+    return facets
+
+
+async def get_cached_cat_facets(fields=None, owner_id: int | None = None, filters: CatFilter | None = None) -> dict:
+    """Facets for a scope, computed once and kept until a cat is written"""
+    fields = tuple(fields or FACET_COLUMNS)
+    key = (fields, owner_id, repr(filters) if filters is not None and not filters.is_empty() else None)
+    if key in _cache:
+        return _cache[key]
+
+    async with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+        version = _cache_version
+        async with async_session() as session:
+            facets = await load_cat_facets(session, fields, owner_id, filters)
+        # A write during the query makes the result stale, return it but do not keep it
+        if version == _cache_version:
+            if len(_cache) >= MAX_CACHED_SCOPES:
+                _cache.pop(next(iter(_cache)))
+            _cache[key] = facets
+        return facets
+
+
+def invalidate_cat_facets():
+    """Drop all cached facets after a cat was added, changed or deleted"""
+    global _cache_version
+    _cache_version += 1
+    _cache.clear()
@@ -0,0 +1,427 @@
+"""
+Inbreeding coefficient (COI) engine.
+
+The pedigree is loaded once into compact integer arrays, renumbered so that
+parents always come before their offspring (index 0 means unknown parent).
+Coefficients are computed with the tabular method over a window: a dense
+kinship matrix of only the cats that still have offspring to compute. Cats
+are done generation by generation, each generation with a few array
+operations: the kinship of a cat with every cat in the window is the mean of
+its parents' rows, its coefficient is the kinship of its parents, and its
+slot is freed after its last offspring. Unrelated families (separate breeds
+or lines) are done one group after another, so the window only holds the
+breeding cats of one group. When the window would not fit in WINDOW_CELLS
+the coefficients follow Meuwissen & Luo (1992) with sparse rows of L: the
+row of a cat holds only itself and its ancestors, each with the share of
+its genes that comes from that ancestor, and is half the sum of its parents'
+rows. Kinship matrices for mating planning take one backward pass over the
+ancestors of the sires and one forward pass over those of the dams per batch
+of sires, vectorized per generation, and need the coefficients of those
+ancestors only; the cached whole-database graph starts
+from the coefficients stored in cat.cat_inbreeding_coefficient, so usually
+none have to be computed.
+"""
+import asyncio
+
+import numpy as np
+from sqlalchemy import select, text, update
+
+from app.database_folder.ancestry import MAX_ANCESTRY_DEPTH
+from app.database_folder.model import Cat
+from app.database_folder.postgres import async_session
+
+_ANCESTOR_ROWS = text("""
+    WITH RECURSIVE pedigree(cat_id, depth) AS (
+        SELECT cat_id, 0 FROM cat WHERE cat_id = ANY(:cat_ids)
+        UNION
+        SELECT p.cat_id, g.depth + 1
+        FROM pedigree AS g
+        JOIN cat AS c ON c.cat_id = g.cat_id
+        JOIN cat AS p ON p.cat_id = c.cat_dam_id OR p.cat_id = c.cat_sire_id
+        WHERE g.depth < :max_depth
+    )
+    SELECT cat_id, cat_dam_id, cat_sire_id FROM cat
+    WHERE cat_id IN (SELECT cat_id FROM pedigree)
+""")
+
+
+def _merge_rows(index, first, second):
+    """Row of a cat from its parents' rows: itself with 1, every ancestor with half its parents' shares"""
+    rows = [row for row in (first, second) if row is not None]
+    ancestors = np.concatenate([row[0] for row in rows] + [[index]])
+    shares = np.concatenate([row[1] for row in rows] + [[2.0]])
+    if len(rows) == 2:
+        # Two sorted runs: a stable sort merges them in linear time
+        order = np.argsort(ancestors, kind='stable')
+        ancestors, shares = ancestors[order], shares[order]
+        starts = np.flatnonzero(np.r_[True, ancestors[1:] != ancestors[:-1]])
+        ancestors, shares = ancestors[starts], np.add.reduceat(shares, starts)
+    return ancestors, 0.5 * shares
+
+
+def _row_kinship(first, second, D) -> float:
+    """Half the sum of L[a] * L[b] * D over the common ancestors of two cats"""
+    if len(first[0]) > len(second[0]):
+        first, second = second, first
+    # Rows are sorted, so the common ancestors are found by binary search without sorting again
+    position = np.searchsorted(second[0], first[0])
+    position[position == len(second[0])] = 0
+    common = second[0][position] == first[0]
+    if not common.any():
+        return 0.0
+    return 0.5 * float(np.sum(first[1][common] * second[1][position[common]] * D[first[0][common]]))
+
+
+class PedigreeGraph:
+    """Pedigree stored as parent index arrays in topological order"""
+
+    # Upper bound on the dense kinship work matrix (ancestors x cats) held in memory at once
+    BATCH_CELLS = 4_000_000
+    # Largest kinship window of the tabular method (200 MB); larger pedigrees use sparse rows
+    WINDOW_CELLS = 25_000_000
+    # Unrelated families are computed one group at a time, so the window holds only one group
+    GROUP_CATS = 5000
+
+    def __init__(self, rows, coefficients: dict | None = None):
+        """rows are (cat_id, dam_id, sire_id); coefficients are known inbreeding coefficients by cat id"""
+        parents = {cat_id: (dam_id, sire_id) for cat_id, dam_id, sire_id in rows}
+
+        # Kahn's algorithm: a cat gets its generation once both known parents have one.
+        # Cats caught in a parent cycle never get one and are treated as founders.
+        children = {}
+        pending = {}
+        for cat_id, (dam_id, sire_id) in parents.items():
+            known = [p for p in {dam_id, sire_id} if p in parents and p != cat_id]
+            pending[cat_id] = len(known)
+            for parent_id in known:
+                children.setdefault(parent_id, []).append(cat_id)
+        generation = {cat_id: 0 for cat_id, count in pending.items() if count == 0}
+        queue = list(generation)
+        while queue:
+            parent_id = queue.pop()
+            for child_id in children.get(parent_id, ()):
+                pending[child_id] -= 1
+                generation[child_id] = max(generation.get(child_id, 0), generation[parent_id] + 1)
+                if pending[child_id] == 0:
+                    queue.append(child_id)
+
+        order = sorted(parents, key=lambda c: (generation.get(c, 0), c))
+        self.ids = np.array([0] + order, dtype=np.int64)
+        self.index = {cat_id: i for i, cat_id in enumerate(order, 1)}
+        self.dam = np.zeros(len(order) + 1, dtype=np.int32)
+        self.sire = np.zeros(len(order) + 1, dtype=np.int32)
+        self.generation = np.zeros(len(order) + 1, dtype=np.int32)
+        for i, cat_id in enumerate(order, 1):
+            if pending[cat_id]:
+                continue
+            dam_id, sire_id = parents[cat_id]
+            self.dam[i] = self.index.get(dam_id, 0)
+            self.sire[i] = self.index.get(sire_id, 0)
+            self.generation[i] = generation[cat_id]
+        self._inbreeding = np.zeros(len(order) + 1)
+        self._inbreeding[0] = -1.0
+        self._mendelian = np.zeros(len(order) + 1)
+        self._computed = np.zeros(len(order) + 1, dtype=bool)
+        self._computed[0] = True
+        if coefficients:
+            self._seed(coefficients)
+
+    def _seed(self, coefficients: dict):
+        known = self._computed.copy()
+        for cat_id, value in coefficients.items():
+            if value is not None and cat_id in self.index:
+                self._inbreeding[self.index[cat_id]] = value
+                known[self.index[cat_id]] = True
+        # D needs the coefficients of both parents as well
+        seeded = known & known[self.dam] & known[self.sire]
+        seeded[0] = False
+        F = self._inbreeding
+        self._mendelian[seeded] = 0.5 - 0.25 * (F[self.dam[seeded]] + F[self.sire[seeded]])
+        self._computed |= seeded
+
+    def __len__(self):
+        return len(self.ids) - 1
+
+    def inbreeding(self, members=None):
+        """
+        Inbreeding coefficients by index (index 0 holds -1 for unknown parents).
+        With members, only theirs and those of their ancestors are computed.
+        """
+        self._compute(np.arange(1, len(self) + 1) if members is None else self.ancestors(members))
+        return self._inbreeding
+
+    def _compute(self, indices):
+        """Coefficients of sorted indices that include all their ancestors"""
+        if self._computed[indices].all():
+            return
+        if not self._compute_window(indices):
+            self._compute_sparse(indices)
+        self._computed[indices] = True
+
+    def _groups(self, indices):
+        """Group of each of the indices: unrelated families, packed together up to GROUP_CATS cats"""
+        root = list(range(len(self) + 1))
+
+        def find(i):
+            while root[i] != i:
+                root[i] = root[root[i]]
+                i = root[i]
+            return i
+
+        for i, dam, sire in zip(indices.tolist(), self.dam[indices].tolist(), self.sire[indices].tolist()):
+            for parent in (dam, sire):
+                if parent:
+                    first, second = find(i), find(parent)
+                    if first != second:
+                        root[max(first, second)] = min(first, second)
+        _, component, sizes = np.unique([find(i) for i in indices.tolist()], return_inverse=True,
+                                        return_counts=True)
+        # A group starts with the family that crosses the next multiple of GROUP_CATS
+        return ((np.cumsum(sizes) - sizes) // self.GROUP_CATS)[component]
+
+    def _compute_window(self, indices) -> bool:
+        """
+        Tabular method over a window: the kinship matrix of the cats that still have
+        offspring to compute. Each group of families is done generation by generation,
+        a cat takes a slot of the window when it is computed and frees it after its
+        last offspring. Returns False when the window would exceed WINDOW_CELLS.
+        """
+        n = len(self) + 1
+        dams, sires = self.dam[indices], self.sire[indices]
+        step = np.zeros(n, dtype=np.int64)
+        step[indices] = self._groups(indices) * (int(self.generation.max()) + 1) + self.generation[indices]
+        order = np.argsort(step[indices], kind='stable')
+        indices, dams, sires = indices[order], dams[order], sires[order]
+        # Step of the last offspring of each cat, -1 for cats without offspring
+        last = np.full(n, -1, dtype=np.int64)
+        np.maximum.at(last, dams, step[indices])
+        np.maximum.at(last, sires, step[indices])
+        last[0] = -1
+        parents = indices[last[indices] >= 0]
+        if len(parents):
+            steps = int(last.max()) + 2
+            live = np.cumsum(np.bincount(step[parents], minlength=steps) - np.bincount(last[parents] + 1,
+                                                                                       minlength=steps))
+            size = int(live.max()) + 1
+        else:
+            size = 1
+        if size * size > self.WINDOW_CELLS:
+            return False
+
+        F, D = self._inbreeding, self._mendelian
+        # Slot 0 stays all zeros and stands for unknown parents
+        kinship = np.zeros((size, size))
+        slot = np.zeros(n, dtype=np.int64)
+        free = np.arange(size - 1, 0, -1)
+        batch = max(1, self.BATCH_CELLS // size)
+        bounds = np.flatnonzero(np.r_[True, np.diff(step[indices]) != 0, True])
+        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            cats, cat_dams, cat_sires = indices[start:end], dams[start:end], sires[start:end]
+            F[cats] = kinship[slot[cat_dams], slot[cat_sires]]
+            D[cats] = 0.5 - 0.25 * (F[cat_dams] + F[cat_sires])
+            with_offspring = last[cats] >= 0
+            for first in range(0, int(with_offspring.sum()), batch):
+                new = cats[with_offspring][first:first + batch]
+                slots, free = free[-len(new):], free[:-len(new)]
+                slot[new] = slots
+                dam_slots, sire_slots = slot[self.dam[new]], slot[self.sire[new]]
+                # f(cat, x) = (f(dam, x) + f(sire, x)) / 2 for every cat x computed before
+                rows = 0.5 * (kinship[dam_slots] + kinship[sire_slots])
+                kinship[slots] = rows
+                kinship[:, slots] = rows.T
+                kinship[np.ix_(slots, slots)] = 0.5 * (rows[:, dam_slots] + rows[:, sire_slots])
+                kinship[slots, slots] = 0.5 * (1.0 + F[new])
+            done = np.unique(np.concatenate([cat_dams, cat_sires]))
+            done = done[(done > 0) & (last[done] == step[cats[0]])]
+            free = np.concatenate([free, slot[done]])
+        return True
+
+    def _compute_sparse(self, indices):
+        """Meuwissen & Luo with sparse rows, for pedigrees whose window does not fit in memory"""
+        F, D = self._inbreeding, self._mendelian
+        dams, sires = self.dam[indices], self.sire[indices]
+        # Offspring still to compute per cat; a row is dropped when its last offspring is done
+        offspring = np.bincount(dams, minlength=len(self) + 1) + np.bincount(sires, minlength=len(self) + 1)
+        offspring[0] = 0
+        rows = {}
+        # Full siblings share one computation
+        pair_inbreeding = {}
+        for i, dam, sire in zip(indices.tolist(), dams.tolist(), sires.tolist()):
+            if dam and sire:
+                pair = (dam, sire)
+                if pair not in pair_inbreeding:
+                    pair_inbreeding[pair] = _row_kinship(rows[dam], rows[sire], D)
+                F[i] = pair_inbreeding[pair]
+            D[i] = 0.5 - 0.25 * (F[dam] + F[sire])
+            if offspring[i]:
+                rows[i] = _merge_rows(i, rows.get(dam), rows.get(sire))
+            for parent in {dam, sire} - {0}:
+                offspring[parent] -= 1 if dam != sire else 2
+                if offspring[parent] == 0:
+                    del rows[parent]
+
+    def ancestors(self, members):
+        """Sorted indices of the given cats and all their ancestors"""
+        seen = np.zeros(len(self.ids), dtype=bool)
+        frontier = np.unique(members)
+        while len(frontier):
+            seen[frontier] = True
+            parents = np.concatenate([self.dam[frontier], self.sire[frontier]])
+            frontier = np.unique(parents[(parents > 0) & ~seen[parents]])
+        return np.flatnonzero(seen)
+
+    def kinship_matrix(self, dams, sires):
+        """Kinship of every dam x sire index pair, i.e. the COI of their offspring"""
+        dams = np.asarray(dams, dtype=np.int64)
+        sires = np.asarray(sires, dtype=np.int64)
+        if len(dams) == 0 or len(sires) == 0:
+            return np.zeros((len(dams), len(sires)))
+        if len(dams) < len(sires):
+            return self.kinship_matrix(sires, dams).T
+
+        # a(dam, sire) = (L D L')[dam, sire] (Colleau 2002), one sire per column: the row of L of
+        # the sire by a backward pass over its ancestors, times D, then L times that by a forward
+        # pass over the ancestors of the dams, which leaves a(x, sire) at every dam x.
+        sire_columns, dam_columns = self.ancestors(sires), self.ancestors(dams)
+        self._compute(np.union1d(sire_columns, dam_columns))
+        sire_position, transfers = self._transfers(sire_columns)
+        dam_position = np.full(len(self.ids), len(dam_columns), dtype=np.int64)
+        dam_position[dam_columns] = np.arange(len(dam_columns))
+        # Sire columns that are ancestors of the dams as well, and where they are among the dam columns
+        shared = dam_position[sire_columns] < len(dam_columns)
+        scaled = self._mendelian[sire_columns[shared]][:, None]
+        target = dam_position[sire_columns[shared]]
+        dam_parents = dam_position[self.dam[dam_columns]], dam_position[self.sire[dam_columns]]
+        levels = np.flatnonzero(np.r_[True, np.diff(self.generation[dam_columns]) != 0, True])
+
+        result = np.zeros((len(dams), len(sires)))
+        batch = max(1, self.BATCH_CELLS // max(len(sire_columns), len(dam_columns)))
+        for start in range(0, len(sires), batch):
+            L = self._relationship_rows(sires[start:start + batch], sire_position, transfers)
+            # One extra zero row stands for unknown parents
+            a = np.zeros((len(dam_columns) + 1, L.shape[1]))
+            a[target] = L[shared] * scaled
+            for first, end in zip(levels[:-1].tolist(), levels[1:].tolist()):
+                a[first:end] += 0.5 * (a[dam_parents[0][first:end]] + a[dam_parents[1][first:end]])
+            result[:, start:start + batch] = 0.5 * a[dam_position[dams]]
+        return result
+
+    def _transfers(self, columns):
+        """
+        For every generation of the columns (youngest first), which columns pass
+        half their value to which parent column, grouped by parent so each parent
+        is updated once per level. A parent is always of an older generation.
+        """
+        position = np.full(len(self.ids), -1, dtype=np.int64)
+        position[columns] = np.arange(len(columns))
+        column_generation = self.generation[columns]
+        transfers = []
+        for g in range(int(column_generation.max()), 0, -1):
+            level = np.flatnonzero(column_generation == g)
+            for parent in (self.sire, self.dam):
+                target = position[parent[columns[level]]]
+                known = target >= 0
+                source, target = level[known], target[known]
+                if len(source) == 0:
+                    continue
+                order = np.argsort(target, kind='stable')
+                source, target = source[order], target[order]
+                starts = np.flatnonzero(np.r_[True, target[1:] != target[:-1]])
+                transfers.append((source, target[starts], starts))
+        return position, transfers
+
+    @staticmethod
+    def _relationship_rows(members, position, transfers):
+        """Rows of L (stored transposed: column x member) for the given cats"""
+        L = np.zeros((int(position.max()) + 1, len(members)))
+        L[position[members], np.arange(len(members))] = 1.0
+        for source, target, starts in transfers:
+            L[target] += 0.5 * np.add.reduceat(L[source], starts, axis=0)
+        return L
+
+    def coefficients(self, cat_ids=None):
+        """Inbreeding coefficients by cat id"""
+        if cat_ids is None:
+            F = self.inbreeding()
+            return {int(cat_id): float(F[i]) for i, cat_id in enumerate(self.ids) if i}
+        cat_ids = [cat_id for cat_id in cat_ids if cat_id in self.index]
+        F = self.inbreeding([self.index[cat_id] for cat_id in cat_ids])
+        return {cat_id: float(F[self.index[cat_id]]) for cat_id in cat_ids}
+
+
+async def load_pedigree_graph(session, cat_ids=None, stored: bool = False) -> PedigreeGraph:
+    """Load the whole pedigree, or only the ancestors of the given cats; stored reuses the stored coefficients"""
+    if cat_ids is None and stored:
+        result = await session.execute(
+            select(Cat.cat_id, Cat.cat_dam_id, Cat.cat_sire_id, Cat.cat_inbreeding_coefficient))
+        rows = result.all()
+        return await asyncio.to_thread(PedigreeGraph, [row[:3] for row in rows], {row[0]: row[3] for row in rows})
+    if cat_ids is None:
+        result = await session.execute(select(Cat.cat_id, Cat.cat_dam_id, Cat.cat_sire_id))
+    else:
+        result = await session.execute(_ANCESTOR_ROWS, {"cat_ids": list(cat_ids), "max_depth": MAX_ANCESTRY_DEPTH})
+    return PedigreeGraph(result.all())
+
+
+_cached_graph = None
+_cached_graph_version = 0
+_cached_graph_lock = asyncio.Lock()
+
+
+async def get_cached_pedigree_graph() -> PedigreeGraph:
+    """Whole-database pedigree graph, loaded once and kept until the pedigree changes"""
+    global _cached_graph
+    graph = _cached_graph
+    if graph is not None:
+        return graph
+
+    async with _cached_graph_lock:
+        if _cached_graph is not None:
+            return _cached_graph
+        version = _cached_graph_version
+        async with async_session() as session:
+            graph = await load_pedigree_graph(session, stored=True)
+        # A pedigree change during the query makes the graph stale, use it but do not keep it
+        if version == _cached_graph_version:
+            _cached_graph = graph
+        return graph
+
+
+def invalidate_pedigree_graph():
+    """Drop the cached pedigree graph after a cat or its parents changed"""
+    global _cached_graph, _cached_graph_version
+    _cached_graph_version += 1
+    _cached_graph = None
+
+
+async def rank_matings(dam_ids, sire_ids) -> list:
+    """Kinship (expected kitten COI) of every dam x sire pair, lowest first"""
+    graph = await get_cached_pedigree_graph()
+    dam_ids = [cat_id for cat_id in dam_ids if cat_id in graph.index]
+    sire_ids = [cat_id for cat_id in sire_ids if cat_id in graph.index]
+    kinship = await asyncio.to_thread(graph.kinship_matrix,
+                                      [graph.index[cat_id] for cat_id in dam_ids],
+                                      [graph.index[cat_id] for cat_id in sire_ids])
+    order = np.argsort(kinship, axis=None, kind='stable')
+    dam_position, sire_position = np.unravel_index(order, kinship.shape)
+    return [{"dam_id": dam_ids[d], "sire_id": sire_ids[s], "kinship": float(kinship[d, s])}
+            for d, s in zip(dam_position.tolist(), sire_position.tolist())]
+
+
+async def store_inbreeding_coefficients(session, cat_ids=None) -> dict:
+    """Compute inbreeding coefficients and write them to cat.cat_inbreeding_coefficient"""
+    graph = await load_pedigree_graph(session, cat_ids)
+    coefficients = await asyncio.to_thread(graph.coefficients, cat_ids)
+    if coefficients:
+        await session.execute(
+            update(Cat),
+            [{"cat_id": cat_id, "cat_inbreeding_coefficient": value} for cat_id, value in coefficients.items()],
+        )
+    return coefficients
+
+
+if __name__ == "__main__":
+    from app.database_folder.orm import AsyncOrm
+
+    coefficients = asyncio.run(AsyncOrm.update_inbreeding_coefficients())
+    print(f"Inbreeding coefficients updated for {len(coefficients)} cats")
@@ -0,0 +1,221 @@
+"""
+In-process metrics for database access (and photo encoding).
+
+log_function_call reports the latency and row count of every AsyncOrm
+method, and instrument_engine hooks SQLAlchemy engine events to time every
+statement (grouped by its normalized SQL) and the wait for a pool
+connection. Statements slower than the threshold are kept in a small
+slow-query log. The photo pipeline reports the JPEG encode passes per
+upload. The registry renders itself in the Prometheus text format
+for the /metrics endpoint.
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the rows returned histogram buckets
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+# Upper bounds of the JPEG encode passes per photo histogram buckets
+ENCODE_PASS_BUCKETS = (1, 2, 3, 4, 5, 6, 7, 8, 9)
+
+# Distinct normalized statements tracked, later ones are counted under "other"
+MAX_STATEMENTS = 500
+SLOW_QUERY_LOG_SIZE = 100
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|\$\d+|%\(\w+\)s|:\w+")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """SQL with literals and parameters replaced by ? and whitespace collapsed"""
+    statement = _LITERAL_RE.sub("?", statement)
+    statement = _LIST_RE.sub("(?, ...)", statement)
+    return _SPACE_RE.sub(" ", statement).strip()
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """Histograms and counters for AsyncOrm methods, SQL statements and the connection pool"""
+
+    def __init__(self, slow_query_seconds: float = 0.5):
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.method_latency = {}
+            self.method_rows = {}
+            self.method_errors = {}
+            self.statement_latency = {}
+            self.statement_rows = {}
+            self.pool_wait = Histogram(LATENCY_BUCKETS)
+            self.photo_encode_passes = Histogram(ENCODE_PASS_BUCKETS)
+            self.photo_encode_latency = Histogram(LATENCY_BUCKETS)
+            self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+            self.pool = None
+
+    def observe_call(self, name: str, seconds: float, rows: int | None = None, error: bool = False):
+        with self._lock:
+            histogram = self.method_latency.get(name)
+            if histogram is None:
+                histogram = self.method_latency[name] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            if error:
+                self.method_errors[name] = self.method_errors.get(name, 0) + 1
+            elif rows is not None:
+                histogram = self.method_rows.get(name)
+                if histogram is None:
+                    histogram = self.method_rows[name] = Histogram(ROW_BUCKETS)
+                histogram.observe(rows)
+
+    def observe_statement(self, statement: str, seconds: float, rows: int | None = None):
+        sql = normalize_sql(statement)
+        with self._lock:
+            if sql not in self.statement_latency and len(self.statement_latency) >= MAX_STATEMENTS:
+                sql = "other"
+            histogram = self.statement_latency.get(sql)
+            if histogram is None:
+                histogram = self.statement_latency[sql] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            if rows is not None and rows >= 0:
+                histogram = self.statement_rows.get(sql)
+                if histogram is None:
+                    histogram = self.statement_rows[sql] = Histogram(ROW_BUCKETS)
+                histogram.observe(rows)
+            if seconds >= self.slow_query_seconds:
+                self.slow_queries.append({"time": time.time(), "seconds": round(seconds, 4),
+                                          "rows": rows, "sql": sql})
+                slow = True
+            else:
+                slow = False
+        if slow:
+            logging.getLogger("bot").warning("Slow query (%.3fs): %s", seconds, sql)
+
+    def observe_pool_wait(self, seconds: float):
+        with self._lock:
+            self.pool_wait.observe(seconds)
+
+    def observe_photo_encode(self, passes: int, seconds: float):
+        with self._lock:
+            self.photo_encode_passes.observe(passes)
+            self.photo_encode_latency.observe(seconds)
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            _render_histograms(lines, "catdb_orm_call_duration_seconds",
+                               "Duration of AsyncOrm method calls", "method", self.method_latency)
+            _render_histograms(lines, "catdb_orm_call_rows", "Rows returned by AsyncOrm method calls",
+                               "method", self.method_rows)
+            lines.append("# HELP catdb_orm_call_errors_total AsyncOrm method calls that raised")
+            lines.append("# TYPE catdb_orm_call_errors_total counter")
+            for name, count in sorted(self.method_errors.items()):
+                lines.append(f'catdb_orm_call_errors_total{{method="{_escape(name)}"}} {count}')
+            _render_histograms(lines, "catdb_sql_statement_duration_seconds",
+                               "Duration of SQL statements by normalized SQL", "sql", self.statement_latency)
+            _render_histograms(lines, "catdb_sql_statement_rows", "Rows returned or affected by SQL statements",
+                               "sql", self.statement_rows)
+            _render_histograms(lines, "catdb_pool_wait_seconds", "Wait for a pooled database connection",
+                               None, {None: self.pool_wait})
+            _render_histograms(lines, "catdb_photo_encode_passes", "Full JPEG encode passes per uploaded photo",
+                               None, {None: self.photo_encode_passes})
+            _render_histograms(lines, "catdb_photo_encode_seconds", "JPEG size-targeting time per uploaded photo",
+                               None, {None: self.photo_encode_latency})
+            lines.append("# HELP catdb_slow_queries_logged Slow queries currently in the slow-query log")
+            lines.append("# TYPE catdb_slow_queries_logged gauge")
+            lines.append(f"catdb_slow_queries_logged {len(self.slow_queries)}")
+            if self.pool is not None:
+                lines.append("# HELP catdb_pool_checked_out Connections currently checked out of the pool")
+                lines.append("# TYPE catdb_pool_checked_out gauge")
+                lines.append(f"catdb_pool_checked_out {self.pool.checkedout()}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _render_histograms(lines, metric, help_text, label, histograms):
+    lines.append(f"# HELP {metric} {help_text}")
+    lines.append(f"# TYPE {metric} histogram")
+    for key, histogram in sorted(histograms.items(), key=lambda item: str(item[0])):
+        labels = f'{label}="{_escape(key)}",' if label else ""
+        for bound, count in histogram.cumulative():
+            lines.append(f'{metric}_bucket{{{labels}le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{labels}le="+Inf"}} {histogram.count}')
+        suffix = f"{{{labels.rstrip(',')}}}" if label else ""
+        lines.append(f"{metric}_sum{suffix} {histogram.sum:.6f}")
+        lines.append(f"{metric}_count{suffix} {histogram.count}")
+
+
+registry = MetricsRegistry()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that reports how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            registry.observe_pool_wait(time.perf_counter() - start)
+
+
+def instrument_engine(engine, slow_query_seconds: float | None = None):
+    """Time every statement run by a (sync or async) engine"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if slow_query_seconds is not None:
+        registry.slow_query_seconds = slow_query_seconds
+    if hasattr(sync_engine.pool, "checkedout"):
+        registry.pool = sync_engine.pool
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        registry.observe_statement(statement, elapsed, getattr(cursor, "rowcount", None))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+        if starts:
+            registry.observe_statement(exception_context.statement or "", time.perf_counter() - starts.pop())
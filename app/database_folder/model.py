@@ -1,10 +1,23 @@
 from app.database_folder.postgres import Base
-from sqlalchemy import (BigInteger, Column, DateTime, ForeignKey,
-                        String, UniqueConstraint, func, Date, ARRAY, Boolean, Float, Integer)
-from sqlalchemy.orm import relationship
+from sqlalchemy import (BigInteger, Column, DateTime, ForeignKey, DDL, Computed, Text, event,
+                        String, UniqueConstraint, func, Date, ARRAY, Boolean, Float, Integer, Index)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship, deferred
 
 import_model = "Models"
 
+# Trigram indexes on the search documents need the pg_trgm extension
+event.listen(Base.metadata, 'before_create', DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+def search_document(*columns):
+    """SQL for a lowercased document of the given text columns, used by generated search columns"""
+    return "lower(" + " || ' ' || ".join(f"coalesce(\"{column}\", '')" for column in columns) + ")"
+
+
+def trigram_index(name, column):
+    return Index(name, column, postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
 
 class Owner(Base):
     __tablename__ = 'owner'
@@ -20,6 +33,13 @@ class Owner(Base):
     owner_phone = Column(String, nullable=True)
     owner_hashed_password = Column(String, nullable=False)
     owner_permission = Column(BigInteger, default=0)
+    owner_search_document = deferred(Column(Text, Computed(search_document(
+        'owner_firstname', 'owner_surname', 'owner_email'), persisted=True)))
+
+    __table_args__ = (
+        Index('ux_owner_email_lower', func.lower(owner_email), unique=True),
+        trigram_index('ix_owner_search_document_trgm', 'owner_search_document'),
+    )
 
 
 class Cat(Base):
@@ -35,6 +55,7 @@ class Cat(Base):
     cat_birthday = Column(Date)
     cat_dam_id = Column(BigInteger, nullable=True)
     cat_sire_id = Column(BigInteger, nullable=True)
+    cat_inbreeding_coefficient = Column(Float, nullable=True)
     cat_microchip_number = Column(String, nullable=True)
     cat_EMS_colour = Column(String, nullable=True)
     cat_litter = Column(String, nullable=True)
@@ -71,6 +92,63 @@ class Cat(Base):
     cat_photos = Column(ARRAY(String))
     cat_files = Column(ARRAY(String))
     wcf_sticker = Column(String, nullable=True)
+    cat_search_document = deferred(Column(Text, Computed(search_document(
+        'cat_firstname', 'cat_surname', 'cat_callname', 'cat_gender', 'cat_microchip_number', 'cat_EMS_colour',
+        'cat_litter', 'cat_haritage_number', 'cat_haritage_number_2', 'cat_eye_colour', 'cat_hair_type',
+        'cat_tests', 'cat_blood_group', 'cat_gencode', 'cat_features', 'cat_notes', 'cat_show_results',
+        'cat_birth_country', 'cat_location', 'cat_association', 'cat_jaw_fault', 'cat_hernia', 'cat_testicles',
+        'cat_death_cause', 'cat_status'), persisted=True)))
+    # Names only, for the dam/sire typeahead, which must not match words of the notes
+    cat_name_document = deferred(Column(Text, Computed(search_document(
+        'cat_firstname', 'cat_surname', 'cat_callname'), persisted=True)))
+
+    __table_args__ = (
+        Index('ix_cat_owner_id', 'owner_id'),
+        Index('ix_cat_breed_id', 'cat_breed_id'),
+        trigram_index('ix_cat_search_document_trgm', 'cat_search_document'),
+        trigram_index('ix_cat_name_document_trgm', 'cat_name_document'),
+        # Parent typeahead: candidates of one gender by name, and microchip prefix lookup
+        Index('ix_cat_gender_name', cat_gender, func.coalesce(cat_firstname, ''), cat_id),
+        Index('ix_cat_microchip_pattern', cat_microchip_number,
+              postgresql_ops={'cat_microchip_number': 'text_pattern_ops'}),
+    )
+
+
+class CatAncestry(Base):
+    __tablename__ = 'cat_ancestry'
+    ancestor_id = Column(BigInteger, primary_key=True)
+    descendant_id = Column(BigInteger, primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('ix_cat_ancestry_ancestor_depth', 'ancestor_id', 'depth'),
+        Index('ix_cat_ancestry_descendant_depth', 'descendant_id', 'depth'),
+    )
+
+
+class UserSession(Base):
+    __tablename__ = 'user_session'
+    session_id = Column(String, primary_key=True)
+    user_data = Column(JSONB, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index('ix_user_session_expires_at', 'expires_at'),
+    )
+
+
+class Blob(Base):
+    __tablename__ = 'blob'
+    sha256 = Column(String(64), primary_key=True)
+    extension = Column(String, nullable=False, default='')
+    size = Column(BigInteger, nullable=True)
+    refcount = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_blob_unreferenced', 'updated_at', postgresql_where=refcount == 0),
+    )
 
 
 class History(Base):
@@ -103,3 +181,9 @@ class Breed(Base):
     breed_phone = Column(String, nullable=True)
     breed_email = Column(String)
     breed_description = Column(String, nullable=True)
+    breed_search_document = deferred(Column(Text, Computed(search_document(
+        'breed_firstname', 'breed_surname', 'breed_email'), persisted=True)))
+
+    __table_args__ = (
+        trigram_index('ix_breed_search_document_trgm', 'breed_search_document'),
+    )
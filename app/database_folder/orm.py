@@ -1,16 +1,43 @@
 from datetime import datetime, timedelta, date
 
 import pandas as pd
-from app.database_folder.model import (Cat, Owner, History, OwnerPermission, Breed)
+from app.database_folder.model import (Cat, Owner, History, OwnerPermission, Breed, CatAncestry)
+from app.database_folder.ancestry import (relink_cat_ancestry, unlink_cat_ancestry,
+                                         rebuild_cat_ancestry, descendant_ids)
+from app.database_folder.blob_store import (adjust_blob_references, import_legacy_references, remove_blobs,
+                                           unreferenced_blobs)
+from app.database_folder.pagination import decode_cursor
+from app.database_folder.reference_cache import ReferenceCache
+from app.database_folder.statistics import (cat_statistics_key, get_statistics, record_cat_change,
+                                            record_count_change)
+from app.database_folder.cat_filters import CatFilter
+from app.database_folder.cat_projection import cat_info_columns, resolve_fields
+from app.database_folder.facets import get_cached_cat_facets, invalidate_cat_facets
+from app.database_folder.search import search_index_available, search_rank, search_terms
+from app.database_folder.parent_search import (NAME_INDEX, PARENT_PAGE_SIZE, parent_candidates_query,
+                                              parent_page_cursor)
+from app.database_folder.inbreeding import (store_inbreeding_coefficients, invalidate_pedigree_graph,
+                                            rank_matings)
 from app.database_folder.postgres import async_engine, async_session
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import (BigInteger, MetaData, Table, and_, asc, cast, delete,
-                        desc, text, update, func, or_)
+from sqlalchemy import (BigInteger, Integer, MetaData, Table, and_, asc, cast, delete,
+                        desc, text, update, func, or_, literal)
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.future import select
 from sqlalchemy.orm import aliased
 from logger import log_function_call
 from app.niceGUI_folder.pydentic_models import CatCreate, CatUpdate, OwnerCreate, OwnerUpdate
+from app.niceGUI_folder.search_pipeline import invalidate_search_caches
+
+STREAM_CHUNK_SIZE = 2000  # rows per fetch of the stream_* methods
+
+# Columns of the owner and breeder exports (owners without the password hash)
+OWNER_EXPORT_COLUMNS = (Owner.owner_id, Owner.owner_firstname, Owner.owner_surname, Owner.owner_email,
+                        Owner.owner_address, Owner.owner_city, Owner.owner_country, Owner.owner_zip,
+                        Owner.owner_birthday, Owner.owner_phone, Owner.owner_permission)
+BREED_EXPORT_COLUMNS = (Breed.breed_id, Breed.breed_firstname, Breed.breed_surname, Breed.breed_gender,
+                        Breed.breed_birthday, Breed.breed_address, Breed.breed_city, Breed.breed_country,
+                        Breed.breed_zip, Breed.breed_phone, Breed.breed_email, Breed.breed_description)
 
 
 class AsyncOrm:
@@ -143,7 +170,16 @@ class AsyncOrm:
                 cat_description=cat_description
             )
             session.add(new_cat)
+            await session.flush()
+            await relink_cat_ancestry(session, new_cat.cat_id, cat_dam_id, cat_sire_id)
+            await store_inbreeding_coefficients(session, [new_cat.cat_id])
+            await adjust_blob_references(session, [], new_cat.cat_photos + new_cat.cat_files)
+            added = cat_statistics_key(new_cat)
             await session.commit()
+            invalidate_pedigree_graph()
+            invalidate_cat_facets()
+            invalidate_search_caches()
+            record_cat_change(None, added)
             return new_cat
 
     @staticmethod
@@ -175,6 +211,10 @@ class AsyncOrm:
                 
                 if not cat:
                     return False
+
+                parents_changed = (cat.cat_dam_id, cat.cat_sire_id) != (dam_id, sire_id)
+                before = cat_statistics_key(cat)
+                old_references = list(cat.cat_photos or []) + list(cat.cat_files or [])
                 
                 cat.cat_firstname = firstname
                 cat.cat_surname = surname
@@ -228,8 +268,21 @@ class AsyncOrm:
                     cat.cat_files = cat_files
                 if cat_title is not None:
                     cat.cat_title = cat_title
+                after = cat_statistics_key(cat)
+                await adjust_blob_references(session, old_references,
+                                             list(cat.cat_photos or []) + list(cat.cat_files or []))
+
+                if parents_changed:
+                    await session.flush()
+                    await relink_cat_ancestry(session, cat_id, dam_id, sire_id)
+                    await store_inbreeding_coefficients(session, await descendant_ids(session, cat_id))
 
                 await session.commit()
+                if parents_changed:
+                    invalidate_pedigree_graph()
+                invalidate_cat_facets()
+                invalidate_search_caches()
+                record_cat_change(before, after)
                 return True
                 
         except Exception as e:
@@ -249,8 +302,19 @@ class AsyncOrm:
                 if not cat:
                     return False
                 
+                affected_ids = [i for i in await descendant_ids(session, cat_id) if i != cat_id]
+                before = cat_statistics_key(cat)
+                await adjust_blob_references(session, list(cat.cat_photos or []) + list(cat.cat_files or []), [])
                 await session.delete(cat)
+                await session.flush()
+                await unlink_cat_ancestry(session, cat_id)
+                if affected_ids:
+                    await store_inbreeding_coefficients(session, affected_ids)
                 await session.commit()
+                invalidate_pedigree_graph()
+                invalidate_cat_facets()
+                invalidate_search_caches()
+                record_cat_change(before, None)
                 return True
                 
         except Exception as e:
@@ -279,6 +343,8 @@ class AsyncOrm:
             )
             session.add(new_owner)
             await session.commit()
+            owner_list_cache.invalidate()
+            record_count_change('owners', 1)
             return new_owner
 
     @log_function_call
@@ -289,8 +355,9 @@ class AsyncOrm:
                         owner_email: str | None = None,
                         owner_permission: str | None = None,
                         limit: int | None = None,
-                        offset: int = 0):
-        query = select(Owner)
+                        offset: int = 0,
+                        cursor: str | None = None):
+        query = select(Owner).order_by(Owner.owner_id)
         if owner_id is not None:
             query = query.filter_by(owner_id=owner_id)
         if owner_firstname is not None:
@@ -302,7 +369,9 @@ class AsyncOrm:
         if owner_permission is not None:
             query = query.filter_by(owner_permission=owner_permission)
 
-        # Add pagination
+        # Add pagination (keyset when a cursor is given, offset otherwise)
+        if cursor:
+            query = query.where(Owner.owner_id > decode_cursor(cursor, int)[0])
         if limit is not None:
             query = query.limit(limit)
         if offset > 0:
@@ -367,6 +436,7 @@ class AsyncOrm:
             if owner_permission:
                 owner.owner_permission = owner_permission
             await session.commit()
+            owner_list_cache.invalidate()
             return owner
 
     @staticmethod
@@ -404,6 +474,7 @@ class AsyncOrm:
                     owner.owner_permission = owner_data['owner_permission']
                 
                 await session.commit()
+                owner_list_cache.invalidate()
                 return True
                 
         except Exception as e:
@@ -422,6 +493,8 @@ class AsyncOrm:
             if owner:
                 await session.delete(owner)
                 await session.commit()
+                owner_list_cache.invalidate()
+                record_count_change('owners', -1)
                 return True
             return False
 
@@ -642,9 +715,8 @@ class AsyncOrm:
                 return True
             return False
 
-    @log_function_call
     @staticmethod
-    async def get_cat_info(
+    async def cat_info_query(
         cat_id: int | None = None,
         cat_firstname: str | None = None,
         cat_surname: str | None = None,
@@ -658,21 +730,33 @@ class AsyncOrm:
         owner_firstname: str | None = None,
         owner_surname: str | None = None,
         owner_email: str | None = None,
+        filters: CatFilter | None = None,
+        indexed_search: bool | None = None,
+        fields: str | list | None = None,
         limit: int | None = None,
         offset: int = 0,
+        cursor: str | None = None,
     ):
+        """Query for get_cat_info and stream_cat_info"""
         # Create aliases for parent cats
         Dam = aliased(Cat)
         Sire = aliased(Cat)
         BreedAlias = aliased(Breed)
-        
+
+        # Select only the projected columns, joining parents and breeder only when they are needed
+        keys = resolve_fields(fields)
+        columns = cat_info_columns(Dam, Sire, BreedAlias)
         query = (
-            select(Cat, Owner, Dam, Sire, BreedAlias)
+            select(*[columns[key].label(key) for key in keys])
+            .select_from(Cat)
             .join(Owner, Cat.owner_id == Owner.owner_id)
-            .outerjoin(Dam, Cat.cat_dam_id == Dam.cat_id)
-            .outerjoin(Sire, Cat.cat_sire_id == Sire.cat_id)
-            .outerjoin(BreedAlias, Cat.cat_breed_id == BreedAlias.breed_id)
         )
+        if 'dam' in keys:
+            query = query.outerjoin(Dam, Cat.cat_dam_id == Dam.cat_id)
+        if 'sire' in keys:
+            query = query.outerjoin(Sire, Cat.cat_sire_id == Sire.cat_id)
+        if any(key.startswith('breed_') for key in keys) or (filters is not None and filters.search):
+            query = query.outerjoin(BreedAlias, Cat.cat_breed_id == BreedAlias.breed_id)
         if cat_id is not None:
             query = query.where(Cat.cat_id == cat_id)
         if cat_firstname:
@@ -699,195 +783,92 @@ class AsyncOrm:
             query = query.where(Owner.owner_surname == owner_surname)
         if owner_email:
             query = query.where(Owner.owner_email == owner_email)
+        # Search uses the trigram index when it has been migrated, ranked results come first
+        ranked = (filters is not None and bool(filters.search) and bool(search_terms(filters.search))
+                  and indexed_search is not False and await search_index_available())
+        if filters is not None:
+            query = query.where(*filters.conditions(BreedAlias, indexed_search=ranked))
 
-        # Add pagination
+        # Add pagination (keyset when a cursor is given, offset otherwise)
+        if ranked:
+            rank = search_rank(filters.search, BreedAlias)
+            query = query.add_columns(rank.label('search_rank')).order_by(rank.desc(), Cat.cat_id)
+            if cursor:
+                last_rank, last_id = decode_cursor(cursor, (int, float), int)
+                query = query.where(or_(rank < last_rank, and_(rank == last_rank, Cat.cat_id > last_id)))
+        else:
+            query = query.order_by(Cat.cat_id)
+            if cursor:
+                query = query.where(Cat.cat_id > decode_cursor(cursor, int)[0])
         if limit is not None:
             query = query.limit(limit)
         if offset > 0:
             query = query.offset(offset)
+        return query
+
+    @log_function_call
+    @staticmethod
+    async def get_cat_info(
+        cat_id: int | None = None,
+        cat_firstname: str | None = None,
+        cat_surname: str | None = None,
+        cat_birthday: datetime | None = None,
+        cat_microchip_number: str | None = None,
+        cat_breed_id: str | None = None,
+        cat_EMS_colour: str | None = None,
+        cat_gender: str | None = None,
+        cat_litter: str | None = None,
+        owner_id: int | None = None,
+        owner_firstname: str | None = None,
+        owner_surname: str | None = None,
+        owner_email: str | None = None,
+        filters: CatFilter | None = None,
+        indexed_search: bool | None = None,
+        fields: str | list | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+        cursor: str | None = None,
+    ):
+        """Cat rows joined with owner, parents and breeder; fields is a profile name or a list of row keys"""
+        query = await AsyncOrm.cat_info_query(
+            cat_id=cat_id, cat_firstname=cat_firstname, cat_surname=cat_surname, cat_birthday=cat_birthday,
+            cat_microchip_number=cat_microchip_number, cat_breed_id=cat_breed_id, cat_EMS_colour=cat_EMS_colour,
+            cat_gender=cat_gender, cat_litter=cat_litter, owner_id=owner_id, owner_firstname=owner_firstname,
+            owner_surname=owner_surname, owner_email=owner_email, filters=filters, indexed_search=indexed_search,
+            fields=fields, limit=limit, offset=offset, cursor=cursor)
 
         async with async_session() as session:
             result = await session.execute(query)
-            rows = []
-            for c, o, d, s, b in result.all():
-                rows.append({
-                    'id': c.cat_id,
-                    'firstname': c.cat_firstname,
-                    'surname': c.cat_surname,
-                    'callname': c.cat_callname,
-                    'gender': c.cat_gender,
-                    'birthday': c.cat_birthday,
-                    'microchip': c.cat_microchip_number,
-                    'title': c.cat_title,
-                    'haritage_number': c.cat_haritage_number,
-                    'haritage_number_2': c.cat_haritage_number_2,
-                    'eye_colour': c.cat_eye_colour,
-                    'hair_type': c.cat_hair_type,
-                    'tests': c.cat_tests,
-                    'litter_size_male': c.cat_litter_size_male,
-                    'litter_size_female': c.cat_litter_size_female,
-                    'blood_group': c.cat_blood_group,
-                    'gencode': c.cat_gencode,
-                    'features': c.cat_features,
-                    'notes': c.cat_notes,
-                    'show_results': c.cat_show_results,
-                    'breeding_lock': c.cat_breeding_lock,
-                    'breeding_lock_date': c.cat_breeding_lock_date,
-                    'breeding_animal': c.cat_breeding_animal,
-                    'birth_country': c.cat_birth_country,
-                    'location': c.cat_location,
-                    'weight': c.cat_weight,
-                    'birth_weight': c.cat_birth_weight,
-                    'transfer_weight': c.cat_transfer_weight,
-                    'faults_deviations': c.cat_faults_deviations,
-                    'association': c.cat_association,
-                    'jaw_fault': c.cat_jaw_fault,
-                    'hernia': c.cat_hernia,
-                    'testicles': c.cat_testicles,
-                    'death_date': c.cat_death_date,
-                    'death_cause': c.cat_death_cause,
-                    'status': c.cat_status,
-                    'kitten_transfer': c.cat_kitten_transfer,
-                    'wcf_sticker': c.wcf_sticker,
-                    'description': c.cat_description,
-                    'breed': c.cat_breed_id,
-                    'colour': c.cat_EMS_colour,
-                    'litter': c.cat_litter,
-                    'owner_id': c.owner_id,
-                    'owner_firstname': o.owner_firstname,
-                    'owner_surname': o.owner_surname,
-                    'owner_email': o.owner_email,
-                    'breed_firstname': b.breed_firstname if b else None,
-                    'breed_surname': b.breed_surname if b else None,
-                    'breed_email': b.breed_email if b else None,
-                    'dam': f'{d.cat_firstname} {d.cat_surname}' if d else None,
-                    'sire': f'{s.cat_firstname} {s.cat_surname}' if s else None,
-                })
+            rows = [dict(row._mapping) for row in result.all()]
 
         if cat_id is not None:
             return (len(rows), rows[0] if rows else None)
         return (len(rows), rows)
 
-    @log_function_call
     @staticmethod
-    async def get_cat_info_like(search: str | None = None, limit: int | None = None, offset: int = 0):
-        # Create aliases for parent cats
-        Dam = aliased(Cat)
-        Sire = aliased(Cat)
-        BreedAlias = aliased(Breed)
-        
-        query = (
-            select(Cat, Owner, Dam, Sire, BreedAlias)
-            .join(Owner, Cat.owner_id == Owner.owner_id)
-            .outerjoin(Dam, Cat.cat_dam_id == Dam.cat_id)
-            .outerjoin(Sire, Cat.cat_sire_id == Sire.cat_id)
-            .outerjoin(BreedAlias, Cat.cat_breed_id == BreedAlias.breed_id)
-        )
-
-        if search:
-            pattern = f"%{search}%"
-            query = query.where(
-                or_(
-                    Cat.cat_firstname.ilike(pattern),
-                    Cat.cat_surname.ilike(pattern),
-                    Cat.cat_callname.ilike(pattern),
-                    Cat.cat_gender.ilike(pattern),
-                    Cat.cat_microchip_number.ilike(pattern),
-                    Cat.cat_EMS_colour.ilike(pattern),
-                    Cat.cat_litter.ilike(pattern),
-                    Cat.cat_haritage_number.ilike(pattern),
-                    Cat.cat_haritage_number_2.ilike(pattern),
-                    Cat.cat_eye_colour.ilike(pattern),
-                    Cat.cat_hair_type.ilike(pattern),
-                    Cat.cat_tests.ilike(pattern),
-                    Cat.cat_blood_group.ilike(pattern),
-                    Cat.cat_gencode.ilike(pattern),
-                    Cat.cat_features.ilike(pattern),
-                    Cat.cat_notes.ilike(pattern),
-                    Cat.cat_show_results.ilike(pattern),
-                    Cat.cat_birth_country.ilike(pattern),
-                    Cat.cat_location.ilike(pattern),
-                    Cat.cat_association.ilike(pattern),
-                    Cat.cat_jaw_fault.ilike(pattern),
-                    Cat.cat_hernia.ilike(pattern),
-                    Cat.cat_testicles.ilike(pattern),
-                    Cat.cat_death_cause.ilike(pattern),
-                    Cat.cat_status.ilike(pattern),
-                    Owner.owner_firstname.ilike(pattern),
-                    Owner.owner_surname.ilike(pattern),
-                    Owner.owner_email.ilike(pattern),
-                    BreedAlias.breed_firstname.ilike(pattern),
-                    BreedAlias.breed_surname.ilike(pattern),
-                    BreedAlias.breed_email.ilike(pattern),
-                )
-            )
+    async def stream_rows(query, chunk_size: int = STREAM_CHUNK_SIZE):
+        """Rows of a query as lists of dicts, fetched through a server-side cursor chunk_size rows at a time"""
+        async with async_session() as session:
+            result = await session.stream(query, execution_options={'yield_per': chunk_size})
+            async for partition in result.mappings().partitions():
+                yield [dict(row) for row in partition]
 
-        # Add pagination
-        if limit is not None:
-            query = query.limit(limit)
-        if offset > 0:
-            query = query.offset(offset)
+    @staticmethod
+    async def stream_cat_info(owner_id: int | None = None, filters: CatFilter | None = None,
+                              fields: str | list | None = None, chunk_size: int = STREAM_CHUNK_SIZE):
+        """All rows of get_cat_info for an export, in chunks and without loading them at once"""
+        query = await AsyncOrm.cat_info_query(owner_id=owner_id, filters=filters, fields=fields)
+        async for rows in AsyncOrm.stream_rows(query, chunk_size):
+            yield rows
 
-        async with async_session() as session:
-            result = await session.execute(query)
-            rows = []
-            for c, o, d, s, b in result.all():
-                rows.append({
-                    'id': c.cat_id,
-                    'firstname': c.cat_firstname,
-                    'surname': c.cat_surname,
-                    'callname': c.cat_callname,
-                    'gender': c.cat_gender,
-                    'birthday': c.cat_birthday,
-                    'microchip': c.cat_microchip_number,
-                    'title': c.cat_title,
-                    'haritage_number': c.cat_haritage_number,
-                    'haritage_number_2': c.cat_haritage_number_2,
-                    'eye_colour': c.cat_eye_colour,
-                    'hair_type': c.cat_hair_type,
-                    'tests': c.cat_tests,
-                    'litter_size_male': c.cat_litter_size_male,
-                    'litter_size_female': c.cat_litter_size_female,
-                    'blood_group': c.cat_blood_group,
-                    'gencode': c.cat_gencode,
-                    'features': c.cat_features,
-                    'notes': c.cat_notes,
-                    'show_results': c.cat_show_results,
-                    'breeding_lock': c.cat_breeding_lock,
-                    'breeding_lock_date': c.cat_breeding_lock_date,
-                    'breeding_animal': c.cat_breeding_animal,
-                    'birth_country': c.cat_birth_country,
-                    'location': c.cat_location,
-                    'weight': c.cat_weight,
-                    'birth_weight': c.cat_birth_weight,
-                    'transfer_weight': c.cat_transfer_weight,
-                    'faults_deviations': c.cat_faults_deviations,
-                    'association': c.cat_association,
-                    'jaw_fault': c.cat_jaw_fault,
-                    'hernia': c.cat_hernia,
-                    'testicles': c.cat_testicles,
-                    'death_date': c.cat_death_date,
-                    'death_cause': c.cat_death_cause,
-                    'status': c.cat_status,
-                    'kitten_transfer': c.cat_kitten_transfer,
-                    'wcf_sticker': c.wcf_sticker,
-                    'description': c.cat_description,
-                    'breed': c.cat_breed_id,
-                    'colour': c.cat_EMS_colour,
-                    'litter': c.cat_litter,
-                    'owner_id': c.owner_id,
-                    'owner_firstname': o.owner_firstname,
-                    'owner_surname': o.owner_surname,
-                    'owner_email': o.owner_email,
-                    'breed_firstname': b.breed_firstname if b else None,
-                    'breed_surname': b.breed_surname if b else None,
-                    'breed_email': b.breed_email if b else None,
-                    'dam': f'{d.cat_firstname} {d.cat_surname}' if d else None,
-                    'sire': f'{s.cat_firstname} {s.cat_surname}' if s else None,
-                })
-
-        print(f"get_cat_info_like returned {len(rows)} rows")
-        return (len(rows), rows)
+    @log_function_call
+    @staticmethod
+    async def get_cat_info_like(search: str | None = None, limit: int | None = None, offset: int = 0,
+                                cursor: str | None = None, indexed_search: bool | None = None,
+                                fields: str | list | None = None):
+        """Search cats, ranked via the trigram index when available (indexed_search=False forces ILIKE)"""
+        return await AsyncOrm.get_cat_info(filters=CatFilter(search=search), indexed_search=indexed_search,
+                                           fields=fields, limit=limit, offset=offset, cursor=cursor)
 
     @log_function_call
     @staticmethod
@@ -919,6 +900,8 @@ class AsyncOrm:
             )
             session.add(new_breed)
             await session.commit()
+            breed_list_cache.invalidate()
+            record_count_change('breeds', 1)
             return new_breed
 
     @log_function_call
@@ -928,8 +911,9 @@ class AsyncOrm:
                         breed_surname: str = None,
                         breed_email: str = None,
                         limit: int | None = None,
-                        offset: int = 0):
-        query = select(Breed)
+                        offset: int = 0,
+                        cursor: str | None = None):
+        query = select(Breed).order_by(Breed.breed_id)
         if breed_id is not None:
             query = query.filter_by(breed_id=breed_id)
         if breed_firstname is not None:
@@ -939,7 +923,9 @@ class AsyncOrm:
         if breed_email is not None:
             query = query.filter_by(breed_email=breed_email)
 
-        # Add pagination
+        # Add pagination (keyset when a cursor is given, offset otherwise)
+        if cursor:
+            query = query.where(Breed.breed_id > decode_cursor(cursor, int)[0])
         if limit is not None:
             query = query.limit(limit)
         if offset > 0:
@@ -965,6 +951,32 @@ class AsyncOrm:
                 return (len(rows), rows[0] if rows else None)
             return (len(rows), rows)
 
+    @staticmethod
+    async def get_owner_list():
+        """All owners for option lists (without password hashes), cached until an owner changes"""
+        rows = await owner_list_cache.get()
+        return (len(rows), rows)
+
+    @staticmethod
+    async def get_breed_list():
+        """All breeders for option lists, cached until a breeder changes"""
+        rows = await breed_list_cache.get()
+        return (len(rows), rows)
+
+    @staticmethod
+    async def stream_owners(chunk_size: int = STREAM_CHUNK_SIZE):
+        """All owners (without password hashes) ordered by id, in chunks"""
+        query = select(*OWNER_EXPORT_COLUMNS).order_by(Owner.owner_id)
+        async for rows in AsyncOrm.stream_rows(query, chunk_size):
+            yield rows
+
+    @staticmethod
+    async def stream_breeds(chunk_size: int = STREAM_CHUNK_SIZE):
+        """All breeders ordered by id, in chunks"""
+        query = select(*BREED_EXPORT_COLUMNS).order_by(Breed.breed_id)
+        async for rows in AsyncOrm.stream_rows(query, chunk_size):
+            yield rows
+
     @staticmethod
     async def get_owner_by_id(owner_id: int):
         """Get owner by ID"""
@@ -976,6 +988,31 @@ class AsyncOrm:
             print(f"Error getting owner by ID: {e}")
             return None
 
+    @staticmethod
+    async def get_owner_by_email(owner_email: str):
+        """Get owner by email (case-insensitive, uses the lower(owner_email) unique index)"""
+        try:
+            async with async_session() as session:
+                result = await session.execute(
+                    select(Owner).where(func.lower(Owner.owner_email) == owner_email.strip().lower()))
+                return result.scalar_one_or_none()
+        except Exception as e:
+            print(f"Error getting owner by email: {e}")
+            return None
+
+    @staticmethod
+    async def update_owner_password_hash(owner_id: int, owner_hashed_password: str) -> bool:
+        """Replace the stored password hash of an owner"""
+        try:
+            async with async_session() as session:
+                await session.execute(update(Owner).where(Owner.owner_id == owner_id)
+                                      .values(owner_hashed_password=owner_hashed_password))
+                await session.commit()
+                return True
+        except Exception as e:
+            print(f"Error updating owner password: {e}")
+            return False
+
     @staticmethod
     async def get_breed_by_id(breed_id: int):
         """Get breed by ID"""
@@ -1024,6 +1061,7 @@ class AsyncOrm:
                     breed.breed_description = breed_data['breed_description']
                 
                 await session.commit()
+                breed_list_cache.invalidate()
                 return True
                 
         except Exception as e:
@@ -1045,6 +1083,8 @@ class AsyncOrm:
                 
                 await session.delete(breed)
                 await session.commit()
+                breed_list_cache.invalidate()
+                record_count_change('breeds', -1)
                 return True
                 
         except Exception as e:
@@ -1096,38 +1136,226 @@ class AsyncOrm:
                 'sire': sire
             }
 
+    @log_function_call
+    @staticmethod
+    async def get_cat_pedigree(cat_id: int, max_depth: int = 3):
+        """Get all ancestors of a cat up to specified depth in a single recursive query"""
+        Parent = aliased(Cat)
+        pedigree = (
+            select(Cat.cat_id, Cat.cat_dam_id, Cat.cat_sire_id, cast(literal(0), Integer).label('depth'))
+            .where(Cat.cat_id == cat_id)
+            .cte('pedigree', recursive=True)
+        )
+        pedigree = pedigree.union(
+            select(Parent.cat_id, Parent.cat_dam_id, Parent.cat_sire_id, (pedigree.c.depth + 1).label('depth'))
+            .join(pedigree, or_(Parent.cat_id == pedigree.c.cat_dam_id,
+                                Parent.cat_id == pedigree.c.cat_sire_id))
+            .where(pedigree.c.depth < max_depth)
+        )
+        query = (
+            select(Cat.cat_id, Cat.cat_firstname, Cat.cat_surname, Cat.cat_gender,
+                   Cat.cat_birthday, Cat.cat_microchip_number, Cat.cat_dam_id, Cat.cat_sire_id)
+            .where(Cat.cat_id.in_(select(pedigree.c.cat_id)))
+        )
+        async with async_session() as session:
+            result = await session.execute(query)
+            return {row.cat_id: row for row in result.all()}
+
     @log_function_call
     @staticmethod
     async def get_cat_family_tree(cat_id: int, max_depth: int = 3):
         """Get family tree for a cat up to specified depth"""
+        pedigree = await AsyncOrm.get_cat_pedigree(cat_id, max_depth)
+
+        def build_tree(current_cat_id, depth):
+            if depth > max_depth or not current_cat_id:
+                return None
+            cat = pedigree.get(current_cat_id)
+            if not cat:
+                return None
+            return {
+                'id': cat.cat_id,
+                'firstname': cat.cat_firstname,
+                'surname': cat.cat_surname,
+                'gender': cat.cat_gender,
+                'birthday': cat.cat_birthday,
+                'microchip': cat.cat_microchip_number,
+                'dam': build_tree(cat.cat_dam_id, depth + 1),
+                'sire': build_tree(cat.cat_sire_id, depth + 1),
+            }
+
+        return build_tree(cat_id, 0)
+
+    @log_function_call
+    @staticmethod
+    async def get_cat_ancestors(cat_id: int, max_depth: int | None = None):
+        """Get all ancestors of a cat from the ancestry closure table"""
+        ancestry = (
+            select(CatAncestry.ancestor_id.label('cat_id'), func.min(CatAncestry.depth).label('depth'))
+            .where(CatAncestry.descendant_id == cat_id, CatAncestry.depth > 0)
+            .group_by(CatAncestry.ancestor_id)
+        )
+        if max_depth is not None:
+            ancestry = ancestry.where(CatAncestry.depth <= max_depth)
+        return await AsyncOrm._get_ancestry_cats(ancestry.subquery())
+
+    @log_function_call
+    @staticmethod
+    async def get_cat_descendants(cat_id: int, max_depth: int | None = None):
+        """Get all descendants of a cat from the ancestry closure table"""
+        ancestry = (
+            select(CatAncestry.descendant_id.label('cat_id'), func.min(CatAncestry.depth).label('depth'))
+            .where(CatAncestry.ancestor_id == cat_id, CatAncestry.depth > 0)
+            .group_by(CatAncestry.descendant_id)
+        )
+        if max_depth is not None:
+            ancestry = ancestry.where(CatAncestry.depth <= max_depth)
+        return await AsyncOrm._get_ancestry_cats(ancestry.subquery())
+
+    @log_function_call
+    @staticmethod
+    async def get_common_ancestors(cat_id_1: int, cat_id_2: int, max_depth: int | None = None):
+        """Get ancestors shared by two cats with the shortest distance to each of them"""
+        First = aliased(CatAncestry)
+        Second = aliased(CatAncestry)
+        ancestry = (
+            select(First.ancestor_id.label('cat_id'),
+                   func.min(First.depth).label('depth'),
+                   func.min(Second.depth).label('depth_2'))
+            .join(Second, Second.ancestor_id == First.ancestor_id)
+            .where(First.descendant_id == cat_id_1, Second.descendant_id == cat_id_2,
+                   First.depth > 0, Second.depth > 0)
+            .group_by(First.ancestor_id)
+        )
+        if max_depth is not None:
+            ancestry = ancestry.where(First.depth <= max_depth, Second.depth <= max_depth)
+        return await AsyncOrm._get_ancestry_cats(ancestry.subquery())
+
+    @staticmethod
+    async def _get_ancestry_cats(ancestry):
+        query = (
+            select(Cat, ancestry)
+            .join(ancestry, ancestry.c.cat_id == Cat.cat_id)
+            .order_by(ancestry.c.depth, Cat.cat_id)
+        )
         async with async_session() as session:
-            def get_cat_info(cat):
-                if not cat:
-                    return None
-                return {
-                    'id': cat.cat_id,
-                    'firstname': cat.cat_firstname,
-                    'surname': cat.cat_surname,
-                    'gender': cat.cat_gender,
-                    'birthday': cat.cat_birthday,
-                    'microchip': cat.cat_microchip_number
-                }
-            
-            async def build_tree(current_cat_id, depth):
-                if depth > max_depth or not current_cat_id:
-                    return None
-                    
-                cat_query = select(Cat).where(Cat.cat_id == current_cat_id)
-                cat_result = await session.execute(cat_query)
-                cat = cat_result.scalars().first()
-                
-                if not cat:
-                    return None
-                
-                tree_node = get_cat_info(cat)
-                tree_node['dam'] = await build_tree(cat.cat_dam_id, depth + 1)
-                tree_node['sire'] = await build_tree(cat.cat_sire_id, depth + 1)
-                
-                return tree_node
-            
-            return await build_tree(cat_id, 0)
\ No newline at end of file
+            result = await session.execute(query)
+            rows = []
+            for row in result.all():
+                cat = row.Cat
+                item = {"cat_id": cat.cat_id,
+                        "cat_firstname": cat.cat_firstname,
+                        "cat_surname": cat.cat_surname,
+                        "cat_gender": cat.cat_gender,
+                        "cat_birthday": cat.cat_birthday,
+                        "cat_microchip_number": cat.cat_microchip_number,
+                        "depth": row.depth}
+                if "depth_2" in ancestry.c:
+                    item["depth_2"] = row.depth_2
+                rows.append(item)
+            return (len(rows), rows)
+
+    @log_function_call
+    @staticmethod
+    async def rebuild_cat_ancestry():
+        """Rebuild the ancestry closure table for all cats"""
+        async with async_session() as session:
+            rows = await rebuild_cat_ancestry(session)
+            await session.commit()
+            return rows
+
+    @log_function_call
+    @staticmethod
+    async def import_legacy_blobs():
+        """Move the photos and files of all cats into the blob store, return the paths that were moved"""
+        async with async_session() as session:
+            paths = await import_legacy_references(session)
+            await session.commit()
+            return paths
+
+    @log_function_call
+    @staticmethod
+    async def collect_blob_garbage(grace_seconds: float | None = None):
+        """Remove unreferenced blobs from the blob store, return the number of files removed"""
+        async with async_session() as session:
+            blobs = await unreferenced_blobs(session, grace_seconds)
+            await session.commit()
+        return remove_blobs(blobs, grace_seconds)
+
+    @log_function_call
+    @staticmethod
+    async def update_inbreeding_coefficients(cat_ids: list | None = None):
+        """Recompute and store inbreeding coefficients for the given cats (all cats by default)"""
+        async with async_session() as session:
+            coefficients = await store_inbreeding_coefficients(session, cat_ids)
+            await session.commit()
+            return coefficients
+
+    @log_function_call
+    @staticmethod
+    async def plan_matings(dam_ids: list | None = None, sire_ids: list | None = None, limit: int | None = None):
+        """Rank dam x sire pairs by expected kitten COI (all unlocked breeding animals by default)"""
+        async with async_session() as session:
+            candidates = select(Cat.cat_id).where(Cat.cat_breeding_animal.is_(True),
+                                                  Cat.cat_breeding_lock.isnot(True))
+            if dam_ids is None:
+                result = await session.execute(candidates.where(Cat.cat_gender == "Female"))
+                dam_ids = result.scalars().all()
+            if sire_ids is None:
+                result = await session.execute(candidates.where(Cat.cat_gender == "Male"))
+                sire_ids = result.scalars().all()
+
+        pairs = await rank_matings(dam_ids, sire_ids)
+        if limit is not None:
+            pairs = pairs[:limit]
+
+        async with async_session() as session:
+            cat_ids = {p["dam_id"] for p in pairs} | {p["sire_id"] for p in pairs}
+            result = await session.execute(
+                select(Cat.cat_id, Cat.cat_firstname, Cat.cat_surname).where(Cat.cat_id.in_(cat_ids)))
+            names = {row.cat_id: f"{row.cat_firstname} {row.cat_surname}" for row in result.all()}
+        rows = [{**p, "dam": names.get(p["dam_id"]), "sire": names.get(p["sire_id"])} for p in pairs]
+        return (len(rows), rows)
+
+    @log_function_call
+    @staticmethod
+    async def search_parents(gender: str, search: str | None = None, cursor: str | None = None,
+                             limit: int = PARENT_PAGE_SIZE, breeding_animal: bool = False, alive: bool = False,
+                             unlocked: bool = False, child_birthday: date | None = None,
+                             exclude_cat_id: int | None = None):
+        """One page of dam or sire candidates matching a typed name or microchip, with the next page cursor"""
+        async with async_session() as session:
+            # A cat cannot be the parent of itself or of one of its ancestors
+            exclude_ids = await descendant_ids(session, exclude_cat_id) if exclude_cat_id else None
+            query = parent_candidates_query(gender, search, cursor, limit, breeding_animal, alive, unlocked,
+                                            child_birthday, exclude_ids,
+                                            indexed_search=bool(search) and await search_index_available(NAME_INDEX))
+            result = await session.execute(query)
+            rows = [dict(row._mapping) for row in result.all()]
+        return (len(rows), rows, parent_page_cursor(rows, limit))
+
+    @staticmethod
+    async def get_statistics():
+        """Dashboard counts and breakdowns from the cached statistics snapshot"""
+        return await get_statistics()
+
+    @log_function_call
+    @staticmethod
+    async def get_cat_facets(fields: list | None = None, owner_id: int | None = None,
+                             filters: CatFilter | None = None):
+        """Distinct values with counts per field ({field: [(value, count), ...]}), cached until a cat changes"""
+        return await get_cached_cat_facets(fields, owner_id, filters)
+
+
+async def _load_owner_list():
+    _, owners = await AsyncOrm.get_owner()
+    return [{k: v for k, v in owner.items() if k != "owner_hashed_password"} for owner in owners]
+
+
+async def _load_breed_list():
+    _, breeds = await AsyncOrm.get_breed()
+    return breeds
+
+
+owner_list_cache = ReferenceCache(_load_owner_list)
+breed_list_cache = ReferenceCache(_load_breed_list)
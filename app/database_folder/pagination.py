@@ -0,0 +1,27 @@
+"""
+Opaque cursor tokens for keyset pagination.
+
+A cursor holds the sort key of the last row of a page. The next page starts
+after that key, so the database seeks straight to it through the primary key
+index instead of skipping OFFSET rows.
+"""
+import base64
+import json
+
+
+def encode_cursor(*key) -> str:
+    """Encode the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(list(key), default=str).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """Decode a cursor produced by encode_cursor, whose key must have one value of each of types"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError as e:
+        raise ValueError(f"Invalid pagination cursor: {cursor!r}") from e
+    if not isinstance(key, list) or len(key) != len(types) or not all(
+            isinstance(value, kind) and not isinstance(value, bool) for value, kind in zip(key, types)):
+        raise ValueError(f"Invalid pagination cursor: {cursor!r}")
+    return tuple(key)
@@ -0,0 +1,93 @@
+"""
+Typeahead search for dam and sire candidates.
+
+The cat forms used to load every female and male cat into their selects.
+They now ask for one page of candidates at a time, matching the typed text
+against the name and microchip number. Pages are ordered by first name and
+continued with a keyset cursor over (first name, id), served by the
+ix_cat_gender_name index; microchip prefixes use ix_cat_microchip_pattern
+and name terms the trigram index of the name document (see
+migration_add_parent_search_index.sql). Both paths match the same columns,
+so the results do not depend on whether the index exists.
+"""
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func, literal_column, or_, select, tuple_
+
+from app.database_folder.model import Cat
+from app.database_folder.pagination import decode_cursor, encode_cursor
+from app.database_folder.search import search_terms
+
+# Trigram index of the name document, matched instead of ILIKE once migrated
+NAME_INDEX = 'ix_cat_name_document_trgm'
+
+# A parent is at least this old when the kitten is born, and not older than the maximum
+MIN_PARENT_AGE = relativedelta(months=6)
+MAX_PARENT_AGE = relativedelta(years=20)
+
+PARENT_PAGE_SIZE = 20
+
+
+def _sort_name():
+    # Rendered inline so the expression matches the ix_cat_gender_name index
+    return func.coalesce(Cat.cat_firstname, literal_column("''"))
+
+
+def _escape_like(term: str) -> str:
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def parent_term_condition(term: str, indexed: bool):
+    """A search term matches the start of the microchip number or occurs in the name"""
+    escaped = _escape_like(term)
+    microchip = Cat.cat_microchip_number.like(f"{escaped}%", escape='\\')
+    pattern = f"%{escaped}%"
+    if indexed:
+        return or_(microchip, Cat.cat_name_document.like(pattern, escape='\\'))
+    return or_(microchip, Cat.cat_firstname.ilike(pattern, escape='\\'),
+               Cat.cat_surname.ilike(pattern, escape='\\'), Cat.cat_callname.ilike(pattern, escape='\\'))
+
+
+def parent_candidates_query(gender: str, search: str | None = None, cursor: str | None = None,
+                            limit: int = PARENT_PAGE_SIZE, breeding_animal: bool = False, alive: bool = False,
+                            unlocked: bool = False, child_birthday: date | None = None,
+                            exclude_ids: list | None = None, indexed_search: bool = False):
+    """One page of possible parents of the given gender"""
+    query = select(Cat.cat_id.label('id'), Cat.cat_firstname.label('firstname'),
+                   Cat.cat_surname.label('surname'), Cat.cat_microchip_number.label('microchip'),
+                   Cat.cat_birthday.label('birthday'), Cat.cat_EMS_colour.label('colour'),
+                   _sort_name().label('sort_name')) \
+        .where(Cat.cat_gender == gender)
+    for term in search_terms(search or ''):
+        query = query.where(parent_term_condition(term, indexed_search))
+    if breeding_animal:
+        query = query.where(Cat.cat_breeding_animal.is_(True))
+    if alive:
+        query = query.where(Cat.cat_death_date.is_(None))
+    if unlocked:
+        query = query.where(Cat.cat_breeding_lock.isnot(True))
+    if child_birthday:
+        # Cats without a birthday stay selectable
+        query = query.where(or_(Cat.cat_birthday.is_(None),
+                                Cat.cat_birthday.between(child_birthday - MAX_PARENT_AGE,
+                                                         child_birthday - MIN_PARENT_AGE)))
+    if exclude_ids:
+        query = query.where(Cat.cat_id.notin_(exclude_ids))
+    if cursor:
+        query = query.where(tuple_(_sort_name(), Cat.cat_id) > tuple_(*decode_cursor(cursor, str, int)))
+    return query.order_by(_sort_name(), Cat.cat_id).limit(limit)
+
+
+def parent_page_cursor(rows: list, limit: int) -> str | None:
+    """Cursor of the page after rows, None when rows was the last page"""
+    if len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1]['sort_name'], rows[-1]['id'])
+
+
+def parent_label(row: dict) -> str:
+    """Option label of a candidate"""
+    label = f"{row.get('firstname') or ''} {row.get('surname') or ''}".strip()
+    details = [str(value) for value in (row.get('microchip'), row.get('birthday')) if value]
+    return f"{label} ({', '.join(details)})" if details else label
@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy_utils import create_database, database_exists
 from app.database_folder.db_setting import settings
+from app.database_folder.metrics import InstrumentedQueuePool, instrument_engine
 from logger import logger
 
 
@@ -13,12 +14,15 @@ class Base(DeclarativeBase):
 async_engine = create_async_engine(
     settings.DATABASE_URL_asyncpg,
     echo=False,
+    poolclass=InstrumentedQueuePool,
     pool_size=5,
     max_overflow=10,
     pool_pre_ping=True,
     future=True,
 )
 
+instrument_engine(async_engine, settings.SLOW_QUERY_SECONDS)
+
 async_session = async_sessionmaker(async_engine)
 
 
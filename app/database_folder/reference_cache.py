@@ -0,0 +1,51 @@
+"""
+Read-through cache for the owner and breeder lists behind dropdowns.
+
+Every form and listing page needs all owners and breeders just to build
+option labels. The lists are cached for a TTL and loaded single-flight:
+concurrent page renders await the same query instead of each running their
+own. The owner and breed write methods of AsyncOrm invalidate the lists.
+"""
+import asyncio
+import time
+
+
+class ReferenceCache:
+    """One cached value, loaded by an async loader at most once at a time"""
+
+    def __init__(self, loader, ttl: float = 300.0):
+        self.loader = loader
+        self.ttl = ttl
+        self._value = None
+        self._expires_at = 0.0
+        self._loading = None
+        self._version = 0
+
+    async def get(self):
+        """Cached value, loading it when missing or expired (treat it as read-only)"""
+        if self._value is not None and time.monotonic() < self._expires_at:
+            return self._value
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load())
+        # Shielded, so a cancelled page render does not cancel the load the others wait for
+        return await asyncio.shield(self._loading)
+
+    async def _load(self):
+        version = self._version
+        task = asyncio.current_task()
+        try:
+            value = await self.loader()
+            # A write during the load makes the result stale, it is returned but not kept
+            if version == self._version:
+                self._value = value
+                self._expires_at = time.monotonic() + self.ttl
+            return value
+        finally:
+            if self._loading is task:
+                self._loading = None
+
+    def invalidate(self):
+        """Drop the value after a write, the next get loads it again"""
+        self._version += 1
+        self._value = None
+        self._loading = None
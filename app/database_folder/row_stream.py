@@ -0,0 +1,78 @@
+"""
+CSV and NDJSON encoding of streamed query rows.
+
+The export endpoints pass the chunks of an AsyncOrm.stream_* method through
+encode_rows (and gzip_chunks when compression is asked for), so every chunk
+is encoded and sent as soon as the server-side cursor returns it and the
+response never holds more than one chunk.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+ROW_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return ', '.join(str(item) for item in value)
+    return value
+
+
+async def encode_csv(chunks, columns: list):
+    """A header line, then one CSV block per chunk of row dicts"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+    async for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(row.get(column)) for column in columns] for row in rows)
+        yield buffer.getvalue().encode()
+
+
+async def encode_ndjson(chunks, columns: list):
+    """One JSON object per line, with the keys in column order"""
+    async for rows in chunks:
+        lines = [json.dumps({column: row.get(column) for column in columns}, default=_json_value,
+                            ensure_ascii=False) for row in rows]
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode()
+
+
+def encode_rows(chunks, columns: list, row_format: str):
+    """Encoder of a ROW_FORMATS format"""
+    if row_format == 'csv':
+        return encode_csv(chunks, columns)
+    if row_format == 'ndjson':
+        return encode_ndjson(chunks, columns)
+    raise ValueError(f"Unknown row format: {row_format}")
+
+
+async def gzip_chunks(chunks, level: int = 6):
+    """Compress a byte stream into one gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,64 @@
+"""
+Indexed cat search.
+
+Cats, owners and breeders carry a generated, lowercased search document with a
+pg_trgm GIN index (see migration_add_search_index.sql). Every search term must
+occur in the document of the cat, its owner or its breeder; each of the three
+lookups is served by an index and the matches are combined by cat id.
+Results are ranked by word_similarity, which favours terms matching the start
+of a word. Without the indexes the ILIKE search in cat_filters is used.
+"""
+from sqlalchemy import Float, and_, func, select, text, union
+
+from app.database_folder.model import Cat, Owner, Breed
+from app.database_folder.postgres import async_session
+
+# Index name: whether it exists
+_index_available = {}
+
+
+async def search_index_available(index: str = 'ix_cat_search_document_trgm') -> bool:
+    """Whether a trigram search index has been migrated, checked once per process"""
+    if index not in _index_available:
+        async with async_session() as session:
+            result = await session.execute(text("SELECT 1 FROM pg_indexes WHERE indexname = :index"),
+                                           {"index": index})
+            _index_available[index] = result.first() is not None
+    return _index_available[index]
+
+
+def search_terms(search: str) -> list:
+    """Lowercased whitespace separated terms of a search string"""
+    return search.lower().split()
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def indexed_search_condition(search: str):
+    """Every term occurs in the search document of the cat, its owner or its breeder"""
+    conditions = []
+    for term in search_terms(search):
+        pattern = _like_pattern(term)
+        matching_cats = union(
+            select(Cat.cat_id).where(Cat.cat_search_document.like(pattern, escape='\\')),
+            select(Cat.cat_id).where(Cat.owner_id.in_(
+                select(Owner.owner_id).where(Owner.owner_search_document.like(pattern, escape='\\')))),
+            select(Cat.cat_id).where(Cat.cat_breed_id.in_(
+                select(Breed.breed_id).where(Breed.breed_search_document.like(pattern, escape='\\')))),
+        )
+        conditions.append(Cat.cat_id.in_(matching_cats))
+    return and_(*conditions)
+
+
+def search_rank(search: str, breed=Breed):
+    """Relevance of a cat row (joined with Owner and breed) for a search string"""
+    search = ' '.join(search_terms(search))
+    return func.greatest(
+        func.word_similarity(search, Cat.cat_search_document),
+        func.word_similarity(search, Owner.owner_search_document),
+        func.word_similarity(search, breed.breed_search_document),
+        type_=Float,
+    )
@@ -0,0 +1,127 @@
+"""
+Dashboard statistics.
+
+The counts and breakdowns are computed with one GROUPING SETS aggregate over
+the cat table (plus two counts) and kept as an in-process snapshot, so
+rendering the dashboard is a dict lookup. AsyncOrm writes adjust the
+snapshot in place (a cat's key before and after the write), and it is
+recomputed in the background once it is older than STATISTICS_TTL to pick
+up changes made outside this process.
+"""
+import asyncio
+import time
+from collections import Counter
+
+from sqlalchemy import extract, false, func, select, tuple_
+
+from app.database_folder.model import Breed, Cat, Owner
+from app.database_folder.postgres import async_session
+
+STATISTICS_TTL = 300  # seconds
+
+# Breakdown name -> column, in the order of cat_statistics_key
+BREAKDOWNS = {
+    'by_gender': Cat.cat_gender,
+    'by_status': Cat.cat_status,
+    'by_breed': Cat.cat_breed_id,
+    'by_birth_year': extract('year', Cat.cat_birthday),
+    'by_breeding_animal': func.coalesce(Cat.cat_breeding_animal, false()),
+    'by_breeding_lock': func.coalesce(Cat.cat_breeding_lock, false()),
+}
+
+_snapshot = None
+_loaded_at = 0.0
+_version = 0
+_lock = asyncio.Lock()
+_refresh_task = None
+
+
+def cat_statistics_key(cat) -> tuple:
+    """Values of a Cat for each breakdown, taken before and after a write"""
+    return (cat.cat_gender, cat.cat_status, cat.cat_breed_id,
+            cat.cat_birthday.year if cat.cat_birthday else None,
+            bool(cat.cat_breeding_animal), bool(cat.cat_breeding_lock))
+
+
+async def load_statistics(session) -> dict:
+    """Totals and per-breakdown counts, computed by the database"""
+    columns = list(BREAKDOWNS.values())
+    query = (
+        select(*columns, func.grouping(*columns), func.count())
+        .select_from(Cat)
+        .group_by(func.grouping_sets(*[tuple_(column) for column in columns], tuple_()))
+    )
+    statistics = {name: Counter() for name in BREAKDOWNS}
+    statistics['cats'] = 0
+    all_grouped = (1 << len(columns)) - 1
+    for row in (await session.execute(query)).all():
+        *values, grouping, count = row
+        if grouping == all_grouped:
+            statistics['cats'] = count
+            continue
+        # grouping() sets a bit for every column aggregated away, the first column is the highest bit
+        for i, name in enumerate(BREAKDOWNS):
+            if not grouping & (1 << (len(columns) - 1 - i)):
+                value = values[i]
+                statistics[name][int(value) if name == 'by_birth_year' and value is not None else value] = count
+    statistics['owners'] = (await session.execute(select(func.count(Owner.owner_id)))).scalar()
+    statistics['breeds'] = (await session.execute(select(func.count(Breed.breed_id)))).scalar()
+    return statistics
+
+
+async def _reload():
+    global _snapshot, _loaded_at
+    version = _version
+    async with async_session() as session:
+        statistics = await load_statistics(session)
+    _snapshot = statistics
+    # A write during the query may be missing from the result, so reload it on the next read
+    _loaded_at = time.monotonic() if version == _version else 0.0
+    return statistics
+
+
+async def get_statistics() -> dict:
+    """Current statistics snapshot (treat it as read-only)"""
+    global _refresh_task
+    if _snapshot is None:
+        async with _lock:
+            if _snapshot is None:
+                await _reload()
+        return _snapshot
+    if time.monotonic() - _loaded_at > STATISTICS_TTL and (_refresh_task is None or _refresh_task.done()):
+        # Serve the stale snapshot and refresh it in the background
+        _refresh_task = asyncio.create_task(_refresh())
+    return _snapshot
+
+
+async def _refresh():
+    try:
+        async with _lock:
+            await _reload()
+    except Exception as e:
+        print(f"Statistics refresh failed: {e}")
+
+
+def record_cat_change(before: tuple | None, after: tuple | None):
+    """Move a cat between breakdown counts after it was added (before=None), changed or deleted (after=None)"""
+    global _version
+    _version += 1
+    if _snapshot is None or before == after:
+        return
+    for key, delta in ((before, -1), (after, 1)):
+        if key is None:
+            continue
+        _snapshot['cats'] += delta
+        for name, value in zip(BREAKDOWNS, key):
+            counts = _snapshot[name]
+            counts[value] += delta
+            if counts[value] <= 0:
+                del counts[value]
+
+
+def record_count_change(total: str, delta: int):
+    """Adjust the 'owners' or 'breeds' total after an add or delete"""
+    global _version
+    _version += 1
+    if _snapshot is not None:
+        _snapshot[total] += delta
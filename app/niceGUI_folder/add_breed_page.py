@@ -7,7 +7,7 @@ from fastapi import Request
 
 
 async def add_breed_page_render(request: Request):
-    get_header('Add Breed Page', request)
+    await get_header('Add Breed Page', request)
 
     with ui.column().classes('w-full items-center q-py-xl'):
         with ui.card().classes('w-full max-w-4xl q-pa-lg'):
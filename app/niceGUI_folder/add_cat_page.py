@@ -3,14 +3,16 @@ from pydantic import ValidationError
 # from app.niceGUI_folder.pydentic_models import CatCreate
 from app.database_folder.orm import AsyncOrm
 from app.niceGUI_folder.header import get_header
+from app.niceGUI_folder.parent_picker import ParentPicker
 from app.niceGUI_folder.photo_service import PhotoService
+from app.niceGUI_folder.photo_pipeline import upload_photo
 from app.niceGUI_folder.file_service import FileService
 from datetime import datetime
 from fastapi import Request
 
 
 async def add_cat_page_render(request: Request):
-    get_header('Add Cat Page', request)
+    await get_header('Add Cat Page', request)
     
     # Store uploaded photos and files
     uploaded_photos = []
@@ -20,30 +22,17 @@ async def add_cat_page_render(request: Request):
     # cities = gc.get_cities()
     # city_list = [c['name'] for c in cities.values() if c['countrycode'] == 'DE'] 
 
-    _, owners = await AsyncOrm.get_owner()
+    _, owners = await AsyncOrm.get_owner_list()
     owner_map = {
          o['owner_id']: f'{o["owner_firstname"]} {o["owner_surname"]}'
          for o in owners
     }
     
-    _, breeds = await AsyncOrm.get_breed()
+    _, breeds = await AsyncOrm.get_breed_list()
     breed_map = {
          b['breed_id']: f'{b["breed_firstname"]} {b["breed_surname"]}'
          for b in breeds
     } if breeds else {}
-    # Get female cats for dam selection
-    _, cats_female = await AsyncOrm.get_cat(cat_gender="Female")
-    dam_map = {
-        cat["cat_id"]: f'{cat["cat_firstname"]} {cat["cat_surname"]} ({cat["cat_microchip_number"]})'
-        for cat in cats_female
-    } if cats_female else {}
-    
-    # Get male cats for sire selection
-    _, cats_male = await AsyncOrm.get_cat(cat_gender="Male")
-    sire_map = {
-        cat["cat_id"]: f'{cat["cat_firstname"]} {cat["cat_surname"]} ({cat["cat_microchip_number"]})'
-        for cat in cats_male
-    } if cats_male else {}
 
     with ui.column().classes('w-full items-center q-py-xl'):
         with ui.card().classes('w-full max-w-2xl q-pa-lg'):
@@ -89,10 +78,29 @@ async def add_cat_page_render(request: Request):
             ui.separator().classes('q-my-md')
             ui.label('👨‍👩‍👧‍👦 Family Information').classes('text-h6 q-mb-md')
             with ui.grid().classes('grid-cols-1 md:grid-cols-2 gap-4 w-full'):
-                dam = ui.select(dict(dam_map), label='Dam (Mother)') \
-                    .props('outlined dense clearable use-input').classes('w-full')
-                sire = ui.select(dict(sire_map), label='Sire (Father)') \
-                    .props('outlined dense clearable use-input').classes('w-full')
+                dam = ParentPicker('Female', 'Dam (Mother)')
+                sire = ParentPicker('Male', 'Sire (Father)')
+
+                def update_parent_age(e):
+                    try:
+                        child_birthday = datetime.strptime(e.value, '%Y-%m-%d').date() if e.value else None
+                    except ValueError:
+                        return
+                    dam.set_child_birthday(child_birthday)
+                    sire.set_child_birthday(child_birthday)
+
+                birthday.on_value_change(update_parent_age)
+                coi_label = ui.label('').classes('text-subtitle2')
+
+                async def update_expected_coi():
+                    if dam.value and sire.value:
+                        _, pairs = await AsyncOrm.plan_matings([int(dam.value)], [int(sire.value)])
+                        coi_label.text = f"Expected kitten COI: {pairs[0]['kinship'] * 100:.2f}%" if pairs else ''
+                    else:
+                        coi_label.text = ''
+
+                dam.on_value_change(lambda e: update_expected_coi())
+                sire.on_value_change(lambda e: update_expected_coi())
                 
                 litter = ui.input(label='Litter').props('outlined dense').classes('w-full')
                 litter_size_male = ui.number(label='Litter Size (Male)', value=0, min=0, max=20) \
@@ -182,7 +190,7 @@ async def add_cat_page_render(request: Request):
             # Photo upload area
             photo_container = ui.column().classes('w-full')
             
-            def handle_photo_upload(e):
+            async def handle_photo_upload(e):
                 """Handle photo upload"""
                 try:
                     # Validate photo (without size check since we'll compress if needed)
@@ -192,8 +200,7 @@ async def add_cat_page_render(request: Request):
                         return
                     
                     # Save photo (with automatic compression)
-                    microchip_value = microchip.value if microchip.value else None
-                    photo_path = PhotoService.save_photo(e.content.read(), e.name, microchip_value)
+                    photo_path = await upload_photo(e.content.read(), e.name)
                     if photo_path:
                         uploaded_photos.append(photo_path)
                         update_photo_gallery()
@@ -201,6 +208,9 @@ async def add_cat_page_render(request: Request):
                     else:
                         ui.notify('Failed to save photo', color='negative', position='top')
                         
+                except RuntimeError as ex:
+                    # Photo queue is full
+                    ui.notify(str(ex), type='warning', position='top')
                 except Exception as ex:
                     ui.notify(f'Error uploading photo: {str(ex)}', color='negative', position='top')
             
@@ -210,7 +220,7 @@ async def add_cat_page_render(request: Request):
                 with photo_container:
                     if uploaded_photos:
                         ui.label(f'Uploaded photos ({len(uploaded_photos)}):').classes('text-subtitle2 q-mb-sm')
-                        PhotoService.create_photo_gallery(uploaded_photos, "300px")
+                        PhotoService.create_photo_gallery(uploaded_photos, "160px")
                         
                         # Add delete buttons for each photo
                         for i, photo_path in enumerate(uploaded_photos):
@@ -253,13 +263,7 @@ async def add_cat_page_render(request: Request):
                         ui.notify(error_msg, color='negative', position='top')
                         return
                     
-                    # Save file (we need microchip, but it might not be set yet)
-                    if not microchip.value:
-                        ui.notify('Please enter microchip number before uploading files', 
-                                  color='negative', position='top')
-                        return
-                    
-                    success, message, file_path = FileService.save_file(microchip.value, e)
+                    success, message, file_path = FileService.save_file(e)
                     if success:
                         uploaded_files.append(file_path)
                         update_file_list()
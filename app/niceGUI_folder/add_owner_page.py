@@ -2,13 +2,13 @@ from nicegui import ui
 from pydantic import ValidationError
 from app.database_folder.orm import AsyncOrm
 from app.niceGUI_folder.header import get_header
-import hashlib
+from app.niceGUI_folder.password_hasher import hash_password_async
 from datetime import date
 from fastapi import Request
 
 
 async def add_owner_page_render(request: Request):
-    get_header('Add Owner Page', request)
+    await get_header('Add Owner Page', request)
 
     # Получаем список разрешений для выбора
     _, permissions = await AsyncOrm.get_owner_permission()
@@ -73,7 +73,7 @@ async def add_owner_page_render(request: Request):
                         owner_zip=zip_code.value if zip_code.value else None,
                         owner_birthday=birthday_date,
                         owner_phone=phone.value if phone.value else None,
-                        owner_hashed_password=hashlib.sha256(password.value.encode()).hexdigest(),
+                        owner_hashed_password=await hash_password_async(password.value),
                         owner_permission=permission.value if permission.value else 1
                     )
                     ui.notify('Owner added successfully!', color='positive')
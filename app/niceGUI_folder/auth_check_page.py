@@ -6,13 +6,13 @@ from fastapi import Request
 from app.niceGUI_folder.session_manager import SessionManager
 
 
-def auth_check_page_render(request: Request):
+async def auth_check_page_render(request: Request):
     """Check authentication and redirect accordingly"""
     ui.page_title('Authentication Check - Cat Database')
     
     # Check if user is authenticated
     session_id = request.cookies.get("session_id")
-    if session_id and SessionManager.is_authenticated(session_id):
+    if session_id and await SessionManager.is_authenticated(session_id):
         # User is authenticated, redirect to dashboard
         ui.navigate.to('/dashboard')
     else:
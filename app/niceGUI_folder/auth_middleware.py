@@ -17,16 +17,16 @@ def require_auth(required_permission: int = 1):
         async def wrapper(request: Request, *args, **kwargs):
             # Достаём session_id из cookie
             session_id = request.cookies.get("session_id")
-            if not session_id or not SessionManager.is_authenticated(session_id):
+            if not session_id or not await SessionManager.is_authenticated(session_id):
                 ui.notify('Please login to access this page', type='negative', position='top')
                 ui.navigate.to('/login')
                 return
 
             # Получаем данные пользователя
-            user_data = SessionManager.get_current_user(session_id)
+            user_data = await SessionManager.get_current_user(session_id)
             if not user_data:
                 ui.notify('Session expired. Please login again', type='negative', position='top')
-                SessionManager.clear_session(session_id)
+                await SessionManager.clear_session(session_id)
                 ui.navigate.to('/login')
                 return
 
@@ -47,19 +47,19 @@ def require_auth(required_permission: int = 1):
     return decorator
 
 
-def get_current_user_from_session(request: Request) -> dict | None:
+async def get_current_user_from_session(request: Request) -> dict | None:
     """Get current user data from session (cookie-based)"""
     session_id = request.cookies.get("session_id")
     if not session_id:
         return None
-    return SessionManager.get_current_user(session_id)
+    return await SessionManager.get_current_user(session_id)
 
 
-def logout_user(request: Request):
+async def logout_user(request: Request):
     """Logout current user (cookie-based)"""
     session_id = request.cookies.get("session_id")
     if session_id:
-        SessionManager.clear_session(session_id)
+        await SessionManager.clear_session(session_id)
 
     response = RedirectResponse(url='/login', status_code=303)
     response.delete_cookie("session_id")
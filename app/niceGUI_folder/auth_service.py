@@ -2,10 +2,12 @@
 Authentication Service for managing user sessions and permissions
 Following SOLID principles - Single Responsibility Principle
 """
-import hashlib
+import asyncio
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 from app.database_folder.orm import AsyncOrm
+from app.niceGUI_folder.password_hasher import (DUMMY_HASH, hash_password, hash_password_async, needs_rehash,
+                                                verify_password_async)
 
 
 class AuthService:
@@ -20,8 +22,8 @@ class AuthService:
     
     @classmethod
     def hash_password(cls, password: str) -> str:
-        """Hash password using SHA-256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        """Hash password using scrypt with a random salt"""
+        return hash_password(password)
     
     @classmethod
     async def authenticate_user(cls, email: str, password: str) -> Optional[Dict[str, Any]]:
@@ -30,49 +32,42 @@ class AuthService:
         Returns user data if successful, None otherwise
         """
         try:
-            # Get all owners with retry logic
-            owners = []
+            # Single indexed lookup with retry logic
+            owner = None
             max_retries = 3
             for attempt in range(max_retries):
                 try:
-                    _, owners = await AsyncOrm.get_owner()
+                    owner = await AsyncOrm.get_owner_by_email(email)
                     break
                 except Exception as e:
                     print(f"Database access attempt {attempt + 1} failed: {e}")
                     if attempt < max_retries - 1:
-                        import asyncio
                         await asyncio.sleep(1)  # Wait 1 second before retry
                     else:
                         raise e
             
-            if not owners:
-                print("No owners found in database")
-                return None
-            
-            # Find owner by email
-            owner = None
-            for o in owners:
-                if o.get('owner_email') == email:
-                    owner = o
-                    break
-            
             if not owner:
+                # Spend the same KDF time as for a wrong password
+                await verify_password_async(password, DUMMY_HASH)
                 print(f"No owner found with email: {email}")
                 return None
             
-            # Check password (assuming password is already hashed in database)
-            hashed_password = cls.hash_password(password)
-            if owner.get('owner_hashed_password') != hashed_password:
+            # The KDF runs in a thread pool, off the event loop
+            if not await verify_password_async(password, owner.owner_hashed_password):
                 print(f"Password mismatch for email: {email}")
                 return None
             
+            # Upgrade legacy SHA-256 hashes now that the plain password is known
+            if needs_rehash(owner.owner_hashed_password):
+                await AsyncOrm.update_owner_password_hash(owner.owner_id, await hash_password_async(password))
+            
             # Return user data
             return {
-                'owner_id': owner.get('owner_id'),
-                'owner_firstname': owner.get('owner_firstname'),
-                'owner_surname': owner.get('owner_surname'),
-                'owner_email': owner.get('owner_email'),
-                'owner_permission': owner.get('owner_permission', 0),
+                'owner_id': owner.owner_id,
+                'owner_firstname': owner.owner_firstname,
+                'owner_surname': owner.owner_surname,
+                'owner_email': owner.owner_email,
+                'owner_permission': owner.owner_permission or 0,
                 'login_time': datetime.now()
             }
             
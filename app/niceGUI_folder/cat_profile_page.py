@@ -143,9 +143,9 @@ async def cat_profile_page_render(request: Request, cat_id: int):
     session_id = request.cookies.get("session_id")
     current_user = None
     if session_id:
-        current_user = SessionManager.get_current_user(session_id)
+        current_user = await SessionManager.get_current_user(session_id)
     
-    get_header('Cat Profile', request)
+    await get_header('Cat Profile', request)
     
     # Get cat information with parents
     cat_info = await AsyncOrm.get_cat_with_parents(cat_id)
@@ -222,6 +222,9 @@ async def cat_profile_page_render(request: Request, cat_id: int):
                         ui.label(f'Litter: {cat.cat_litter or "Not specified"}').classes('q-mb-xs')
                         ui.label(f'Litter Size (Male): {cat.cat_litter_size_male or "Not specified"}').classes('q-mb-xs')
                         ui.label(f'Litter Size (Female): {cat.cat_litter_size_female or "Not specified"}').classes('q-mb-xs')
+                        coi = cat.cat_inbreeding_coefficient
+                        ui.label(f'Inbreeding Coefficient: {f"{coi * 100:.2f}%" if coi is not None else "Not specified"}') \
+                            .classes('q-mb-xs')
                     
                     with ui.column():
                         if breed:
@@ -320,7 +323,7 @@ async def cat_profile_page_render(request: Request, cat_id: int):
             with ui.card().classes('w-full max-w-4xl q-pa-lg q-mt-md'):
                 ui.label('📸 Photos').classes('text-h6 q-mb-md')
                 print(f"Cat photos: {cat.cat_photos}")
-                PhotoService.create_photo_gallery(cat.cat_photos, "400px")
+                PhotoService.create_photo_gallery(cat.cat_photos, "160px")
         
         # Files section
         if cat.cat_files and len(cat.cat_files) > 0:
@@ -1,16 +1,12 @@
 from datetime import date, datetime
-import tempfile
-import os
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from app.niceGUI_folder.header import get_header
 from app.niceGUI_folder.auth_service import AuthService
 from nicegui import ui
 from app.database_folder.orm import AsyncOrm
+from app.database_folder.pagination import encode_cursor
+from app.database_folder.cat_filters import CatFilter
+from app.niceGUI_folder.search_pipeline import SearchPipeline, SEARCH_DEBOUNCE, session_search_cache
+from app.niceGUI_folder.export_jobs import start_export, start_stream_export
 from fastapi import Request
 
 cats_column = [
@@ -30,6 +26,7 @@ cats_column = [
     {'name': 'litter', 'label': 'Litter', 'field': 'litter', 'align': 'left'},
     {'name': 'dam', 'label': 'Dam', 'field': 'dam', 'align': 'left'},
     {'name': 'sire', 'label': 'Sire', 'field': 'sire', 'align': 'left'},
+    {'name': 'inbreeding_coefficient', 'label': 'COI', 'field': 'inbreeding_coefficient', 'align': 'left'},
     {'name': 'litter_size_male', 'label': 'Litter Male', 'field': 'litter_size_male', 'align': 'left'},
     {'name': 'litter_size_female', 'label': 'Litter Female', 'field': 'litter_size_female', 'align': 'left'},
     {'name': 'tests', 'label': 'Tests', 'field': 'tests', 'align': 'left'},
@@ -128,9 +125,9 @@ async def cats_page_render(request: Request):
     session_id = request.cookies.get("session_id")
     current_user = None
     if session_id:
-        current_user = SessionManager.get_current_user(session_id)
+        current_user = await SessionManager.get_current_user(session_id)
     
-    get_header('🐱 Cats', request)
+    await get_header('🐱 Cats', request)
 
     # Add Cat button for admins
     if current_user and current_user.get('owner_permission') == 1:
@@ -138,12 +135,12 @@ async def cats_page_render(request: Request):
             ui.button('Add Cat', on_click=lambda: ui.navigate.to('/add_cat')).classes('q-mr-sm')
 
     # Load data for filters (only metadata, not all data)
-    _, owners_data = await AsyncOrm.get_owner()
-    _, breeds_data = await AsyncOrm.get_breed()
+    _, owners_data = await AsyncOrm.get_owner_list()
+    _, breeds_data = await AsyncOrm.get_breed_list()
 
     # Pagination settings
     PAGE_SIZE = 100
-    current_offset = 0
+    next_cursor = None
     all_cats_data = []
     loading_more = False
     has_more_data = True
@@ -155,38 +152,65 @@ async def cats_page_render(request: Request):
     else:
         cats_data = []
 
-    async def load_cats_data(offset=0, limit=PAGE_SIZE, reset=False):
-        """Load cats data with pagination"""
-        nonlocal all_cats_data, has_more_data, loading_more
+    def parse_date(value):
+        """Parse a date input value, ignoring incomplete input"""
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+        except ValueError:
+            return None
+
+    def yes_no(value):
+        """Map a Yes/No select value to a boolean filter"""
+        return {'Yes': True, 'No': False}.get(value)
+
+    def build_cat_filter():
+        """Build the database filter spec from the current filter inputs"""
+        selected_owner_id = next((k for k, v in owner_options.items() if v == owner_filter_select.value), None)
+        selected_breeder_id = next((k for k, v in breed_options.items() if v == breeder_filter.value), None)
+        return CatFilter(
+            search=search_input.value or None,
+            genders=gender_filter.value or None,
+            owner_ids=selected_owner_id,
+            breed_ids=selected_breeder_id,
+            colours=color_filter.value or None,
+            eye_colours=eye_color_filter.value or None,
+            hair_types=hair_type_filter.value or None,
+            statuses=status_filter.value or None,
+            birthday_from=parse_date(birthday_from.value),
+            birthday_to=parse_date(birthday_to.value),
+            weight_min=weight_min.value,
+            weight_max=weight_max.value,
+            breeding_animal=yes_no(breeding_animal_filter.value),
+            breeding_lock=yes_no(breeding_lock_filter.value),
+        )
+
+    async def fetch_cats_page(cat_filter, cursor=None, limit=PAGE_SIZE):
+        """Fetch one page of cats; the user permission filter is combined with the selected filters"""
+        _, new_cats = await AsyncOrm.get_cat_info(owner_id=owner_filter, filters=cat_filter, fields='table',
+                                                  limit=limit, cursor=cursor)
+        return new_cats
+
+    def store_cats_page(new_cats, limit=PAGE_SIZE, reset=False):
+        """Add a fetched page to the loaded data and advance the cursor"""
+        nonlocal all_cats_data, has_more_data, next_cursor
         
-        if loading_more:
-            return []
-            
-        loading_more = True
+        # Copy so cached search results are never extended in place
+        if reset:
+            all_cats_data = list(new_cats)
+        else:
+            all_cats_data.extend(new_cats)
         
-        try:
-            # Load data from database with pagination
-            _, new_cats = await AsyncOrm.get_cat_info(limit=limit, offset=offset)
-            
-            # Apply user permission filter
-            if owner_filter is not None and owner_filter != -1:
-                new_cats = [cat for cat in new_cats if cat.get('owner_id') == owner_filter]
-            
-            if reset:
-                all_cats_data = new_cats
-            else:
-                all_cats_data.extend(new_cats)
-            
-            # Check if there's more data
-            has_more_data = len(new_cats) == limit
-            
-            return new_cats
-        finally:
-            loading_more = False
+        # Check if there's more data
+        has_more_data = len(new_cats) == limit
+        if new_cats:
+            # Ranked search results page by (rank, id), everything else by id
+            last_cat = new_cats[-1]
+            next_cursor = (encode_cursor(last_cat['search_rank'], last_cat['id']) if 'search_rank' in last_cat
+                           else encode_cursor(last_cat['id']))
 
-    async def load_filtered_cats_data(offset=0, limit=PAGE_SIZE, reset=False):
-        """Load cats data with filters applied at database level"""
-        nonlocal all_cats_data, has_more_data, loading_more
+    async def load_cats_data(cursor=None, limit=PAGE_SIZE, reset=False):
+        """Load cats data with all filters applied at database level and keyset pagination"""
+        nonlocal loading_more
         
         if loading_more:
             return []
@@ -194,106 +218,23 @@ async def cats_page_render(request: Request):
         loading_more = True
         
         try:
-            # Build filter parameters for database query
-            filter_params = {}
-            
-            # Gender filter
-            if gender_filter.value:
-                filter_params['cat_gender'] = gender_filter.value
-            
-            # Owner filter
-            if owner_filter_select.value:
-                selected_owner_name = owner_filter_select.value
-                selected_owner_id = next((k for k, v in owner_options.items() if v == selected_owner_name), None)
-                if selected_owner_id:
-                    filter_params['owner_id'] = selected_owner_id
-            
-            # Breed filter
-            if breeder_filter.value:
-                selected_breeder_name = breeder_filter.value
-                selected_breeder_id = next((k for k, v in breed_options.items() if v == selected_breeder_name), None)
-                if selected_breeder_id:
-                    filter_params['cat_breed_id'] = selected_breeder_id
-            
-            # Color filter (supported by database)
-            if color_filter.value:
-                filter_params['cat_EMS_colour'] = color_filter.value
-            
-            # Birthday range filter (supported by database)
-            if birthday_from.value:
-                try:
-                    from_date = datetime.strptime(birthday_from.value, '%Y-%m-%d').date()
-                    filter_params['cat_birthday'] = from_date
-                except ValueError:
-                    pass
-            
-            # Apply user permission filter
-            if owner_filter is not None and owner_filter != -1:
-                filter_params['owner_id'] = owner_filter
-            
-            # Load data from database with filters
-            if search_input.value:
-                # Use search function for text search
-                _, new_cats = await AsyncOrm.get_cat_info_like(search=search_input.value, limit=limit, offset=offset)
-                # Apply additional filters to search results
-                for key, value in filter_params.items():
-                    if key == 'owner_id':
-                        new_cats = [cat for cat in new_cats if cat.get('owner_id') == value]
-                    elif key == 'cat_gender':
-                        new_cats = [cat for cat in new_cats if cat.get('gender') == value]
-                    elif key == 'cat_breed_id':
-                        new_cats = [cat for cat in new_cats if cat.get('breed') == value]
-                    elif key == 'cat_eye_colour':
-                        new_cats = [cat for cat in new_cats if cat.get('eye_colour') == value]
-                    elif key == 'cat_hair_type':
-                        new_cats = [cat for cat in new_cats if cat.get('hair_type') == value]
-                    elif key == 'cat_status':
-                        new_cats = [cat for cat in new_cats if cat.get('status') == value]
-                    elif key == 'cat_EMS_colour':
-                        new_cats = [cat for cat in new_cats if cat.get('colour') == value]
-                    elif key == 'cat_breeding_animal':
-                        new_cats = [cat for cat in new_cats if cat.get('breeding_animal') == value]
-                    elif key == 'cat_breeding_lock':
-                        new_cats = [cat for cat in new_cats if cat.get('breeding_lock') == value]
-            else:
-                # Use regular filter function
-                _, new_cats = await AsyncOrm.get_cat_info(limit=limit, offset=offset, **filter_params)
-            
-            if reset:
-                all_cats_data = new_cats
-            else:
-                all_cats_data.extend(new_cats)
-            
-            # Check if there's more data
-            has_more_data = len(new_cats) == limit
-            
+            new_cats = await fetch_cats_page(build_cat_filter(), cursor=cursor, limit=limit)
+            store_cats_page(new_cats, limit=limit, reset=reset)
             return new_cats
         finally:
             loading_more = False
 
     # Load filter options from database
     async def load_filter_options():
-        """Load all unique values for filter options from database"""
+        """Load distinct values for filter options, counted by the database"""
         nonlocal eye_color_options, hair_type_options, status_options, color_options
         
-        # Load all cats data to get unique values
-        _, all_cats = await AsyncOrm.get_cat_info(limit=10000)  # Load all data for filter options
-        
-        # Apply user permission filter
-        if owner_filter is not None and owner_filter != -1:
-            all_cats = [cat for cat in all_cats if cat.get('owner_id') == owner_filter]
-        
-        # Extract unique values
-        eye_color_options = list(set([cat.get('eye_colour') for cat in all_cats if cat.get('eye_colour')]))
-        hair_type_options = list(set([cat.get('hair_type') for cat in all_cats if cat.get('hair_type')]))
-        status_options = list(set([cat.get('status') for cat in all_cats if cat.get('status')]))
-        color_options = list(set([cat.get('colour') for cat in all_cats if cat.get('colour')]))
-        
-        # Sort options alphabetically
-        eye_color_options.sort()
-        hair_type_options.sort()
-        status_options.sort()
-        color_options.sort()
+        facets = await AsyncOrm.get_cat_facets(['eye_colour', 'hair_type', 'status', 'colour'],
+                                               owner_id=owner_filter)
+        eye_color_options = [value for value, _ in facets['eye_colour']]
+        hair_type_options = [value for value, _ in facets['hair_type']]
+        status_options = [value for value, _ in facets['status']]
+        color_options = [value for value, _ in facets['colour']]
 
     # Create filter options
     gender_options = ['Male', 'Female']
@@ -393,146 +334,22 @@ async def cats_page_render(request: Request):
     table_container = ui.column()
 
     async def apply_filters(reset_pagination=True):
-        """Apply all filters to the data with pagination support"""
-        nonlocal current_offset, all_cats_data
-        
+        """Reload the first page with the current filters, or return the loaded data"""
         if reset_pagination:
-            current_offset = 0
-            # Load filtered data from database instead of applying filters to loaded data
-            await load_filtered_cats_data(offset=0, limit=PAGE_SIZE, reset=True)
-        
-        # Apply database-level filters first, then client-side filters
-        filtered_cats = all_cats_data.copy()
-        
-        # Apply client-side filters that are not supported by database
-        # Eye color filter
-        if eye_color_filter.value:
-            filtered_cats = [cat for cat in filtered_cats if cat.get('eye_colour') == eye_color_filter.value]
-        
-        # Hair type filter
-        if hair_type_filter.value:
-            filtered_cats = [cat for cat in filtered_cats if cat.get('hair_type') == hair_type_filter.value]
-        
-        # Status filter
-        if status_filter.value:
-            filtered_cats = [cat for cat in filtered_cats if cat.get('status') == status_filter.value]
-        
-        # Breeding animal filter
-        if breeding_animal_filter.value:
-            breeding_value = breeding_animal_filter.value == 'Yes'
-            filtered_cats = [cat for cat in filtered_cats if cat.get('breeding_animal') == breeding_value]
-        
-        # Breeding lock filter
-        if breeding_lock_filter.value:
-            lock_value = breeding_lock_filter.value == 'Yes'
-            filtered_cats = [cat for cat in filtered_cats if cat.get('breeding_lock') == lock_value]
-        
-        # Weight range filter
-        if weight_min.value is not None:
-            filtered_cats = [cat for cat in filtered_cats
-                             if cat.get('weight') and cat.get('weight') >= weight_min.value]
-        
-        if weight_max.value is not None:
-            filtered_cats = [cat for cat in filtered_cats
-                             if cat.get('weight') and cat.get('weight') <= weight_max.value]
-        
-        # Birthday range filter (to date only, from date is handled by database)
-        if birthday_to.value:
-            try:
-                to_date = datetime.strptime(birthday_to.value, '%Y-%m-%d').date()
-                filtered_cats = [cat for cat in filtered_cats
-                                 if cat.get('birthday') and cat.get('birthday') <= to_date]
-            except ValueError:
-                pass
-        
-        return filtered_cats
+            await load_cats_data(limit=PAGE_SIZE, reset=True)
+        return all_cats_data
 
     async def load_more_data():
         """Load more data when scrolling"""
-        nonlocal current_offset, loading_more
-        
-        if loading_more or not has_more_data:
+        # A pending filter change will replace the loaded data anyway
+        if loading_more or not has_more_data or search_pipeline.pending:
             return
-            
-        current_offset += PAGE_SIZE
-        
-        # Check if we have any active filters
-        has_filters = any([
-            search_input.value,
-            gender_filter.value,
-            owner_filter_select.value,
-            breeder_filter.value,
-            eye_color_filter.value,
-            hair_type_filter.value,
-            status_filter.value,
-            color_filter.value,
-            birthday_from.value,
-            birthday_to.value,
-            weight_min.value is not None,
-            weight_max.value is not None,
-            breeding_animal_filter.value,
-            breeding_lock_filter.value
-        ])
         
-        if has_filters:
-            # Use filtered loading
-            new_cats = await load_filtered_cats_data(offset=current_offset, limit=PAGE_SIZE, reset=False)
-        else:
-            # Use regular loading
-            new_cats = await load_cats_data(offset=current_offset, limit=PAGE_SIZE, reset=False)
+        new_cats = await load_cats_data(cursor=next_cursor, limit=PAGE_SIZE, reset=False)
         
         if new_cats:
             # Update table with new data without resetting pagination
-            await update_table_without_reset()
-
-    async def update_table_without_reset():
-        """Update the table with current data without resetting pagination"""
-        # Apply client-side filters to current data
-        filtered_cats = all_cats_data.copy()
-        
-        # Apply client-side filters that are not supported by database
-        # Eye color filter
-        if eye_color_filter.value:
-            filtered_cats = [cat for cat in filtered_cats if cat.get('eye_colour') == eye_color_filter.value]
-        
-        # Hair type filter
-        if hair_type_filter.value:
-            filtered_cats = [cat for cat in filtered_cats if cat.get('hair_type') == hair_type_filter.value]
-        
-        # Status filter
-        if status_filter.value:
-            filtered_cats = [cat for cat in filtered_cats if cat.get('status') == status_filter.value]
-        
-        # Breeding animal filter
-        if breeding_animal_filter.value:
-            breeding_value = breeding_animal_filter.value == 'Yes'
-            filtered_cats = [cat for cat in filtered_cats if cat.get('breeding_animal') == breeding_value]
-        
-        # Breeding lock filter
-        if breeding_lock_filter.value:
-            lock_value = breeding_lock_filter.value == 'Yes'
-            filtered_cats = [cat for cat in filtered_cats if cat.get('breeding_lock') == lock_value]
-        
-        # Weight range filter
-        if weight_min.value is not None:
-            filtered_cats = [cat for cat in filtered_cats
-                             if cat.get('weight') and cat.get('weight') >= weight_min.value]
-        
-        if weight_max.value is not None:
-            filtered_cats = [cat for cat in filtered_cats
-                             if cat.get('weight') and cat.get('weight') <= weight_max.value]
-        
-        # Apply birthday range filter (to date only, from date is handled by database)
-        if birthday_to.value:
-            try:
-                to_date = datetime.strptime(birthday_to.value, '%Y-%m-%d').date()
-                filtered_cats = [cat for cat in filtered_cats
-                                 if cat.get('birthday') and cat.get('birthday') <= to_date]
-            except ValueError:
-                pass
-        
-        # Update the table display
-        await display_table(filtered_cats)
+            await display_table(all_cats_data)
 
     async def display_table(filtered_cats):
         """Display the table with given data"""
@@ -550,6 +367,10 @@ async def cats_page_render(request: Request):
             
             # Format birthday
             birthday_display = cat.get('birthday').isoformat() if cat.get('birthday') else ''
+
+            # Format inbreeding coefficient
+            coi = cat.get('inbreeding_coefficient')
+            coi_display = f"{coi * 100:.2f}%" if coi is not None else ''
             
             row = {
                 'id': cat.get('id'),
@@ -568,6 +389,7 @@ async def cats_page_render(request: Request):
                 'litter': cat.get('litter', ''),
                 'dam': cat.get('dam', ''),
                 'sire': cat.get('sire', ''),
+                'inbreeding_coefficient': coi_display,
                 'litter_size_male': cat.get('litter_size_male', ''),
                 'litter_size_female': cat.get('litter_size_female', ''),
                 'tests': cat.get('tests', ''),
@@ -628,243 +450,64 @@ async def cats_page_render(request: Request):
         filtered_cats = await apply_filters(reset_pagination=True)
         await display_table(filtered_cats)
 
+    async def show_first_page(new_cats):
+        """Display the first page delivered by the search pipeline"""
+        store_cats_page(new_cats, reset=True)
+        await display_table(all_cats_data)
+
+    search_pipeline = SearchPipeline(show_first_page, cache=session_search_cache(session_id))
+
+    def refresh_table(delay=0.0):
+        """Reload the first page for the current filters, superseding any query still running"""
+        cat_filter = build_cat_filter()
+        search_pipeline.submit((owner_filter, repr(cat_filter)), lambda: fetch_cats_page(cat_filter), delay)
+
+    def export_rows(cats):
+        """Header labels and cell values of the table columns (without actions) for an export"""
+        export_columns = [col for col in cats_column if col['name'] != 'actions']
+        rows = []
+        for cat in cats:
+            # Format title
+            title_display = cat.get('title')[0] if cat.get('title') and len(cat.get('title')) > 0 else ''
+
+            # Format owner name
+            owner_name = f"{cat.get('owner_firstname', '')} {cat.get('owner_surname', '')}".strip()
+
+            # Format breeder name
+            breeder_name = f"{cat.get('breed_firstname', '')} {cat.get('breed_surname', '')}".strip()
+
+            # Format birthday
+            birthday_display = cat.get('birthday').strftime('%Y-%m-%d') if cat.get('birthday') else ''
+
+            row_data = {
+                'id': cat.get('id'),
+                'firstname': cat.get('firstname', ''),
+                'surname': cat.get('surname', ''),
+                'callname': cat.get('callname', ''),
+                'gender': cat.get('gender', ''),
+                'birthday': birthday_display,
+                'microchip': cat.get('microchip', ''),
+                'title': title_display,
+                'eye_colour': cat.get('eye_colour', ''),
+                'hair_type': cat.get('hair_type', ''),
+                'colour': cat.get('colour', ''),
+                'breed_name': breeder_name,
+                'owner_name': owner_name,
+                'status': cat.get('status', ''),
+            }
+            rows.append([row_data.get(col['field'], '') for col in export_columns])
+        return [col['label'] for col in export_columns], rows
+
     async def export_to_xlsx():
-        """Export filtered cats data to XLSX file"""
-        try:
-            ui.notify('Export started...', type='info', position='top')
-            
-            # Get current filtered data
-            filtered_cats = await apply_filters(reset_pagination=False)
-            
-            if not filtered_cats:
-                ui.notify('No data to export', type='warning', position='top')
-                return
-            
-            # Create workbook and worksheet
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Cats Export"
-            
-            # Define headers (exclude actions column)
-            headers = [col['label'] for col in cats_column if col['name'] != 'actions']
-            
-            # Style for headers
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_alignment = Alignment(horizontal="center", vertical="center")
-            
-            # Write headers
-            for col_idx, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col_idx, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-            
-            # Write data rows
-            for row_idx, cat in enumerate(filtered_cats, 2):
-                # Format title
-                title_display = cat.get('title')[0] if cat.get('title') and len(cat.get('title')) > 0 else ''
-                
-                # Format owner name
-                owner_name = f"{cat.get('owner_firstname', '')} {cat.get('owner_surname', '')}".strip()
-                
-                # Format breeder name
-                breeder_name = f"{cat.get('breed_firstname', '')} {cat.get('breed_surname', '')}".strip()
-                
-                # Format birthday
-                birthday_display = cat.get('birthday').strftime('%Y-%m-%d') if cat.get('birthday') else ''
-                
-                # Create row data
-                row_data = {
-                    'id': cat.get('id'),
-                    'firstname': cat.get('firstname', ''),
-                    'surname': cat.get('surname', ''),
-                    'callname': cat.get('callname', ''),
-                    'gender': cat.get('gender', ''),
-                    'birthday': birthday_display,
-                    'microchip': cat.get('microchip', ''),
-                    'title': title_display,
-                    'eye_colour': cat.get('eye_colour', ''),
-                    'hair_type': cat.get('hair_type', ''),
-                    'colour': cat.get('colour', ''),
-                    'breed_name': breeder_name,
-                    'owner_name': owner_name,
-                    'status': cat.get('status', ''),
-                    'actions': ''
-                }
-                
-                for col_idx, col_def in enumerate(cats_column, 1):
-                    if col_def['name'] == 'actions':
-                        continue
-                    field_name = col_def['field']
-                    value = row_data.get(field_name, '')
-                    ws.cell(row=row_idx, column=col_idx, value=value)
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except Exception:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'cats_export_{timestamp}.xlsx'
-            
-            # Save to temporary file and read content
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-                wb.save(tmp_file.name)
-                temp_path = tmp_file.name
-            
-            # Read file content
-            with open(temp_path, 'rb') as f:
-                file_content = f.read()
-            
-            # Clean up temporary file
-            os.unlink(temp_path)
-            
-            # Download the file
-            ui.download(file_content, filename)
-            
-            ui.notify('XLSX file ready for download', type='positive', position='top')
-            
-        except Exception as e:
-            print(f"Export error: {e}")
-            ui.notify(f'Export failed: {str(e)}', type='negative', position='top')
+        """Export all cats matching the filters to an XLSX file, streamed from the database"""
+        headers, _ = export_rows([])
+        chunks = AsyncOrm.stream_cat_info(owner_id=owner_filter, filters=build_cat_filter(), fields='export')
+        await start_stream_export('Cats Export', headers, chunks, lambda cats: export_rows(cats)[1], 'cats_export')
 
     async def export_to_pdf():
         """Export filtered cats data to PDF file"""
-        try:
-            ui.notify('PDF export started...', type='info', position='top')
-            
-            # Get current filtered data
-            filtered_cats = await apply_filters(reset_pagination=False)
-            
-            if not filtered_cats:
-                ui.notify('No data to export', type='warning', position='top')
-                return
-            
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'cats_export_{timestamp}.pdf'
-            
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                temp_path = tmp_file.name
-            
-            # Create PDF document
-            doc = SimpleDocTemplate(temp_path, pagesize=landscape(A4))
-            story = []
-            
-            # Define styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=16,
-                spaceAfter=30,
-                alignment=1  # Center alignment
-            )
-            
-            # Add title
-            title = Paragraph("Cats Export", title_style)
-            story.append(title)
-            story.append(Spacer(1, 12))
-            
-            # Prepare table data (exclude actions column)
-            headers = [col['label'] for col in cats_column if col['name'] != 'actions']
-            table_data = [headers]
-            
-            # Add data rows
-            for cat in filtered_cats:
-                # Format title
-                title_display = cat.get('title')[0] if cat.get('title') and len(cat.get('title')) > 0 else ''
-                
-                # Format owner name
-                owner_name = f"{cat.get('owner_firstname', '')} {cat.get('owner_surname', '')}".strip()
-                
-                # Format breeder name
-                breeder_name = f"{cat.get('breed_firstname', '')} {cat.get('breed_surname', '')}".strip()
-                
-                # Format birthday
-                birthday_display = cat.get('birthday').strftime('%Y-%m-%d') if cat.get('birthday') else ''
-                
-                # Create row data
-                row_data = {
-                    'id': cat.get('id'),
-                    'firstname': cat.get('firstname', ''),
-                    'surname': cat.get('surname', ''),
-                    'callname': cat.get('callname', ''),
-                    'gender': cat.get('gender', ''),
-                    'birthday': birthday_display,
-                    'microchip': cat.get('microchip', ''),
-                    'title': title_display,
-                    'eye_colour': cat.get('eye_colour', ''),
-                    'hair_type': cat.get('hair_type', ''),
-                    'colour': cat.get('colour', ''),
-                    'breed_name': breeder_name,
-                    'owner_name': owner_name,
-                    'status': cat.get('status', ''),
-                    'actions': ''
-                }
-                
-                pdf_row_data = []
-                for col_def in cats_column:
-                    if col_def['name'] == 'actions':
-                        continue
-                    field_name = col_def['field']
-                    value = str(row_data.get(field_name, ''))
-                    # Truncate long text for PDF display
-                    if len(value) > 15:
-                        value = value[:12] + "..."
-                    pdf_row_data.append(value)
-                table_data.append(pdf_row_data)
-            
-            # Create table
-            table = Table(table_data)
-            table.setStyle(TableStyle([
-                # Header row styling
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                
-                # Data rows styling
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-            ]))
-            
-            story.append(table)
-            
-            # Build PDF
-            doc.build(story)
-            
-            # Read file content
-            with open(temp_path, 'rb') as f:
-                file_content = f.read()
-            
-            # Clean up temporary file
-            os.unlink(temp_path)
-            
-            # Download the file
-            ui.download(file_content, filename)
-            
-            ui.notify('PDF file ready for download', type='positive', position='top')
-            
-        except Exception as e:
-            print(f"PDF export error: {e}")
-            ui.notify(f'PDF export failed: {str(e)}', type='negative', position='top')
+        headers, rows = export_rows(await apply_filters(reset_pagination=False))
+        await start_export('pdf', 'Cats Export', headers, rows, 'cats_export')
 
     async def clear_all_filters():
         """Clear all filter inputs"""
@@ -883,27 +526,26 @@ async def cats_page_render(request: Request):
         breeding_animal_filter.value = ''
         breeding_lock_filter.value = ''
         
-        await update_table()
-
-    # Set up event handlers
-    search_input.on_value_change(lambda e: update_table())
-    gender_filter.on_value_change(lambda e: update_table())
-    owner_filter_select.on_value_change(lambda e: update_table())
-    breeder_filter.on_value_change(lambda e: update_table())
-    eye_color_filter.on_value_change(lambda e: update_table())
-    hair_type_filter.on_value_change(lambda e: update_table())
-    status_filter.on_value_change(lambda e: update_table())
-    color_filter.on_value_change(lambda e: update_table())
-    birthday_from.on_value_change(lambda e: update_table())
-    birthday_to.on_value_change(lambda e: update_table())
-    weight_min.on_value_change(lambda e: update_table())
-    weight_max.on_value_change(lambda e: update_table())
-    breeding_animal_filter.on_value_change(lambda e: update_table())
-    breeding_lock_filter.on_value_change(lambda e: update_table())
+        refresh_table()
+
+    # Set up event handlers (typing in the search box is debounced)
+    search_input.on_value_change(lambda e: refresh_table(SEARCH_DEBOUNCE))
+    gender_filter.on_value_change(lambda e: refresh_table())
+    owner_filter_select.on_value_change(lambda e: refresh_table())
+    breeder_filter.on_value_change(lambda e: refresh_table())
+    eye_color_filter.on_value_change(lambda e: refresh_table())
+    hair_type_filter.on_value_change(lambda e: refresh_table())
+    status_filter.on_value_change(lambda e: refresh_table())
+    color_filter.on_value_change(lambda e: refresh_table())
+    birthday_from.on_value_change(lambda e: refresh_table(SEARCH_DEBOUNCE))
+    birthday_to.on_value_change(lambda e: refresh_table(SEARCH_DEBOUNCE))
+    weight_min.on_value_change(lambda e: refresh_table(SEARCH_DEBOUNCE))
+    weight_max.on_value_change(lambda e: refresh_table(SEARCH_DEBOUNCE))
+    breeding_animal_filter.on_value_change(lambda e: refresh_table())
+    breeding_lock_filter.on_value_change(lambda e: refresh_table())
     clear_filters_btn.on_click(clear_all_filters)
     export_xlsx_btn.on_click(export_to_xlsx)
     export_pdf_btn.on_click(export_to_pdf)
 
     # Initial load
-    await load_cats_data(offset=0, limit=PAGE_SIZE, reset=True)
     await update_table()
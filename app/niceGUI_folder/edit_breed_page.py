@@ -9,7 +9,7 @@ from fastapi import Request
 
 async def edit_breed_page_render(request: Request, breed_id: int):
     """Render the edit breed page"""
-    get_header('Edit Breed', request)
+    await get_header('Edit Breed', request)
     
     # Load breed data
     breed_data = await BreedService.get_breed_data(breed_id)
@@ -9,9 +9,12 @@ from datetime import datetime
 from nicegui import ui
 from app.niceGUI_folder.header import get_header
 from app.niceGUI_folder.cat_service import CatService
+from app.niceGUI_folder.parent_picker import ParentPicker
 from app.niceGUI_folder.photo_service import PhotoService
+from app.niceGUI_folder.photo_pipeline import upload_photo
 from app.niceGUI_folder.file_service import FileService
 from app.database_folder.orm import AsyncOrm
+from app.database_folder.blob_store import reference_path
 from fastapi import Request
 
 
@@ -39,11 +42,10 @@ class EditCatPage:
         self.breeder_select = None
         self.dam_select = None
         self.sire_select = None
+        self.coi_label = None
 
         self.owner_options = []
         self.breeder_options = []
-        self.dam_options = []
-        self.sire_options = []
 
     async def load_data(self):
         """Load cat data and options"""
@@ -55,12 +57,9 @@ class EditCatPage:
                 return False
 
             self.owner_options, self.breeder_options = await self.cat_service.get_owners_and_breeders()
-            self.dam_options, self.sire_options = await self.cat_service.get_available_parents(self.cat_id)
 
             print(f"Owner options: {self.owner_options}")
             print(f"Breeder options: {self.breeder_options}")
-            print(f"Dam options: {self.dam_options}")
-            print(f"Sire options: {self.sire_options}")
 
             return True
         except Exception as e:
@@ -379,38 +378,21 @@ class EditCatPage:
                         self.breeder_select = None
                 with ui.card().classes('p-4'):
                     ui.label('👨‍👩‍👧‍👦 Parents').classes('text-h6 mb-4')
-                    if self.dam_options:
-                        dam_dict = {opt['value']: opt['label'] for opt in self.dam_options}
-                        self.dam_select = ui.select(
-                            options=dam_dict,
-                            label='Mother (Dam)'
-                        ).classes('w-full').props('clearable use-input')
-                        if dam and dam.cat_id:
-                            dam_id_str = str(dam.cat_id)
-                            print(f"Setting dam value to: {dam_id_str}")
-                            try:
-                                self.dam_select.value = dam_id_str
-                            except Exception as e:
-                                print(f"Could not set dam value: {e}")
-                    else:
-                        ui.label('No female cats available').classes('text-gray-500')
-                        self.dam_select = None
-                    if self.sire_options:
-                        sire_dict = {opt['value']: opt['label'] for opt in self.sire_options}
-                        self.sire_select = ui.select(
-                            options=sire_dict,
-                            label='Father (Sire)'
-                        ).classes('w-full').props('clearable use-input')
-                        if sire and sire.cat_id:
-                            sire_id_str = str(sire.cat_id)
-                            print(f"Setting sire value to: {sire_id_str}")
-                            try:
-                                self.sire_select.value = sire_id_str
-                            except Exception as e:
-                                print(f"Could not set sire value: {e}")
-                    else:
-                        ui.label('No male cats available').classes('text-gray-500')
-                        self.sire_select = None
+                    # Candidates are searched on the server; a cat cannot descend from itself
+                    self.dam_select = ParentPicker(
+                        'Female', 'Mother (Dam)',
+                        value=dam.cat_id if dam else None,
+                        value_label=f"{dam.cat_firstname} {dam.cat_surname}" if dam else None,
+                        exclude_cat_id=self.cat_id, child_birthday=cat.cat_birthday, props='')
+                    self.sire_select = ParentPicker(
+                        'Male', 'Father (Sire)',
+                        value=sire.cat_id if sire else None,
+                        value_label=f"{sire.cat_firstname} {sire.cat_surname}" if sire else None,
+                        exclude_cat_id=self.cat_id, child_birthday=cat.cat_birthday, props='')
+                    self.coi_label = ui.label('').classes('text-subtitle2 mt-2')
+                    if self.dam_select and self.sire_select:
+                        self.dam_select.on_value_change(lambda e: self.update_expected_coi())
+                        self.sire_select.on_value_change(lambda e: self.update_expected_coi())
             ui.separator().classes('my-6')
             ui.label('📸 Photos').classes('text-h6 mb-4')
             existing_photos = list(cat.cat_photos) if cat.cat_photos else []
@@ -424,22 +406,21 @@ class EditCatPage:
             existing_files = list(cat.cat_files) if cat.cat_files else []
             self.uploaded_files = []
             for file_path in existing_files:
-                if file_path and os.path.exists(file_path):
+                if file_path and os.path.exists(reference_path(file_path)):
                     self.uploaded_files.append(file_path)
                 else:
                     print(f"File does not exist, skipping: {file_path}")
             print(f"Loaded {len(self.uploaded_files)} existing files out of {len(existing_files)} in database")
             self.photo_container = ui.column().classes('w-full')
 
-            def handle_photo_upload(e):
+            async def handle_photo_upload(e):
                 """Handle photo upload"""
                 try:
                     is_valid, error_msg = PhotoService.is_valid_photo(e.name)
                     if not is_valid:
                         ui.notify(error_msg, color='negative', position='top')
                         return
-                    microchip = self.microchip_input.value if self.microchip_input.value else None
-                    photo_path = PhotoService.save_photo(e.content.read(), e.name, microchip)
+                    photo_path = await upload_photo(e.content.read(), e.name)
                     if photo_path:
                         self.uploaded_photos.append(photo_path)
                         self.update_photo_gallery()
@@ -447,6 +428,9 @@ class EditCatPage:
                     else:
                         ui.notify('Failed to save photo', color='negative', position='top')
 
+                except RuntimeError as ex:
+                    # Photo queue is full
+                    ui.notify(str(ex), type='warning', position='top')
                 except Exception as ex:
                     ui.notify(f'Error uploading photo: {str(ex)}', color='negative', position='top')
             ui.upload(
@@ -466,8 +450,7 @@ class EditCatPage:
                 if not is_valid:
                     ui.notify(error_msg, color='negative', position='top')
                     return
-                microchip = self.microchip_input.value if self.microchip_input.value else None
-                success, message, file_path = FileService.save_file(microchip, e)
+                success, message, file_path = FileService.save_file(e)
                 if success:
                     self.uploaded_files.append(file_path)
                     self.update_file_list()
@@ -531,7 +514,7 @@ class EditCatPage:
         with self.photo_container:
             if self.uploaded_photos:
                 ui.label(f'Photos ({len(self.uploaded_photos)}):').classes('text-subtitle2 q-mb-sm')
-                PhotoService.create_photo_gallery(self.uploaded_photos, "300px")
+                PhotoService.create_photo_gallery(self.uploaded_photos, "160px")
                 for i, photo_path in enumerate(self.uploaded_photos):
                     def delete_photo(index=i):
                         if index < len(self.uploaded_photos):
@@ -549,6 +532,14 @@ class EditCatPage:
             else:
                 ui.label('No photos uploaded yet').classes('text-grey-6')
 
+    async def update_expected_coi(self):
+        """Show the expected kitten COI for the selected dam and sire"""
+        if self.dam_select and self.dam_select.value and self.sire_select and self.sire_select.value:
+            _, pairs = await AsyncOrm.plan_matings([int(self.dam_select.value)], [int(self.sire_select.value)])
+            self.coi_label.text = f"Expected kitten COI: {pairs[0]['kinship'] * 100:.2f}%" if pairs else ''
+        else:
+            self.coi_label.text = ''
+
     async def handle_save(self):
         """Handle save button click"""
         try:
@@ -638,7 +629,7 @@ class EditCatPage:
                 'cat_photos': [photo for photo in self.uploaded_photos 
                               if photo and os.path.exists(photo)],
                 'cat_files': [file for file in self.uploaded_files 
-                             if file and os.path.exists(file)]
+                             if file and os.path.exists(reference_path(file))]
             }
             old_microchip = self.original_microchip
             new_microchip = data['microchip']
@@ -710,7 +701,7 @@ class EditCatPage:
 
 async def edit_cat_page_render(request: Request, cat_id: int):
     """Render edit cat page"""
-    get_header('✏️ Edit Cat', request)
+    await get_header('✏️ Edit Cat', request)
     page = EditCatPage(cat_id)
     if await page.load_data():
         page.create_form()
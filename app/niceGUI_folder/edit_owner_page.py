@@ -9,7 +9,7 @@ from fastapi import Request
 
 async def edit_owner_page_render(request: Request, owner_id: int):
     """Render the edit owner page"""
-    get_header('Edit Owner', request)
+    await get_header('Edit Owner', request)
     
     # Load owner data
     owner_data = await OwnerService.get_owner_data(owner_id)
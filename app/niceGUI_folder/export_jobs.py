@@ -0,0 +1,363 @@
+"""
+Background export jobs for the XLSX and PDF exports.
+
+Building a workbook or a PDF is CPU bound and used to run inside the UI
+event handler, freezing the event loop for every connected client. Pages now
+prepare plain rows and submit a job: the file is built in a small process
+pool (see worker_pool: workers are started by a forkserver and import the
+main module again, whose startup code checks in_worker_process()), progress
+is reported back through a queue, and the finished file is written to
+EXPORT_DIR and served by /exports/{filename} to the session that started the
+job. At most MAX_ACTIVE_JOBS jobs are queued or running, and finished jobs
+and their files are removed after EXPORT_TTL.
+
+XLSX exports of whole tables are streamed instead: rows come from a
+server-side cursor in chunks and are appended in openpyxl write-only mode by
+a writer thread, so memory stays bounded however many rows are exported.
+"""
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from app.niceGUI_folder.worker_pool import ProgressPool
+from app.niceGUI_folder.worker_tasks import run_export
+
+EXPORT_DIR = os.path.join(os.getcwd(), 'exports')
+EXPORT_WORKERS = 2
+MAX_ACTIVE_JOBS = 8
+EXPORT_TTL = 3600  # seconds a finished export stays downloadable
+
+HEADER_COLOR = "366092"
+MAX_COLUMN_WIDTH = 50
+WIDTH_SAMPLE_ROWS = 1000  # rows used to estimate the column widths of an XLSX export
+
+
+@dataclass
+class ExportJob:
+    id: str
+    kind: str
+    title: str
+    filename: str
+    # Session that started the job, the only one allowed to download its file
+    session_id: str | None = None
+    status: str = 'queued'  # queued, running, done or failed
+    progress: float = 0.0
+    rows: int = 0
+    streamed: bool = False
+    error: str | None = None
+    created_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+
+class XlsxStreamWriter:
+    """Writes a workbook row by row in openpyxl write-only mode, so memory does not grow with the row count
+
+    Column widths have to be set before the first row is written, so they are
+    estimated from the first WIDTH_SAMPLE_ROWS rows, which are held back until
+    the sample is complete (or the writer is closed).
+    """
+
+    def __init__(self, path: str, title: str, headers: list, sample_rows: int = WIDTH_SAMPLE_ROWS):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.headers = list(headers)
+        self.sample_rows = sample_rows
+        self.sample = []
+        self.rows = 0
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet(title[:31])
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.rows += 1
+            if self.sample is None:
+                self.ws.append(row)
+                continue
+            self.sample.append(row)
+            if len(self.sample) >= self.sample_rows:
+                self._flush_sample()
+
+    def _flush_sample(self):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Font, PatternFill
+        from openpyxl.utils import get_column_letter
+
+        widths = [len(str(header)) for header in self.headers]
+        for row in self.sample:
+            for col_idx, value in enumerate(row[:len(widths)]):
+                widths[col_idx] = max(widths[col_idx], len(str(value)))
+        for col_idx, width in enumerate(widths, 1):
+            self.ws.column_dimensions[get_column_letter(col_idx)].width = min(width + 2, MAX_COLUMN_WIDTH)
+
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color=HEADER_COLOR, end_color=HEADER_COLOR, fill_type="solid")
+        header_alignment = Alignment(horizontal="center", vertical="center")
+        header_cells = []
+        for header in self.headers:
+            cell = WriteOnlyCell(self.ws, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = header_alignment
+            header_cells.append(cell)
+        self.ws.append(header_cells)
+
+        for row in self.sample:
+            self.ws.append(row)
+        self.sample = None
+
+    def close(self):
+        if self.sample is not None:
+            self._flush_sample()
+        self.wb.save(self.path)
+
+
+def build_xlsx(path: str, title: str, headers: list, rows: list, report=None):
+    """Write rows to a workbook with a styled header row and fitted column widths"""
+    writer = XlsxStreamWriter(path, title, headers)
+    step = max(len(rows) // 100, 1)
+    for start in range(0, len(rows), step):
+        writer.write_rows(rows[start:start + step])
+        if report:
+            report(0.9 * min(start + step, len(rows)) / len(rows))
+    writer.close()
+
+
+def build_pdf(path: str, title: str, headers: list, rows: list, truncate: int = 15, report=None):
+    """Write rows to a landscape A4 table, shortening cells longer than truncate characters"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    doc = SimpleDocTemplate(path, pagesize=landscape(A4))
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=16, spaceAfter=30,
+                                 alignment=1)  # Center alignment
+    story = [Paragraph(title, title_style), Spacer(1, 12)]
+
+    table_data = [list(headers)]
+    for row in rows:
+        cells = []
+        for value in row:
+            value = '' if value is None else str(value)
+            if len(value) > truncate:
+                value = value[:truncate - 3] + "..."
+            cells.append(value)
+        table_data.append(cells)
+    if report:
+        report(0.3)
+
+    table = Table(table_data)
+    table.setStyle(TableStyle([
+        # Header row styling
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+        # Data rows styling
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('FONTSIZE', (0, 1), (-1, -1), 7),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+    ]))
+    story.append(table)
+    doc.build(story)
+
+
+class ExportJobManager:
+    """Runs export jobs in a process pool and keeps their state until they expire"""
+
+    def __init__(self, workers: int = EXPORT_WORKERS, max_active: int = MAX_ACTIVE_JOBS, ttl: float = EXPORT_TTL):
+        self.workers = workers
+        self.max_active = max_active
+        self.ttl = ttl
+        self.jobs = {}
+        self.pool = ProgressPool(workers, 'export', self._set_progress)
+        # Streamed exports hold a database connection each, so only `workers` of them run at a time
+        self._streams = asyncio.Semaphore(workers)
+        self._writers = ThreadPoolExecutor(workers, thread_name_prefix='export-writer')
+        # The event loop only keeps weak references to tasks, running jobs are kept here
+        self._tasks = set()
+
+    def _set_progress(self, job_id: str, progress: float):
+        job = self.jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.progress = progress
+
+    def _new_job(self, kind: str, title: str, prefix: str, session_id: str | None) -> ExportJob:
+        if sum(not job.finished for job in self.jobs.values()) >= self.max_active:
+            raise RuntimeError('Too many exports in progress, please try again shortly')
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        job = ExportJob(id=uuid.uuid4().hex, kind=kind, title=title,
+                        filename=f'{prefix}_{timestamp}_{uuid.uuid4().hex[:6]}.{kind}', session_id=session_id)
+        self.jobs[job.id] = job
+        return job
+
+    def submit(self, kind: str, title: str, headers: list, rows: list, prefix: str, session_id: str | None = None,
+               **options) -> ExportJob:
+        """Queue an export; raises RuntimeError when too many exports are already active"""
+        job = self._new_job(kind, title, prefix, session_id)
+        job.rows = len(rows)
+        self._start(self._run(job, self._build, headers, rows, options))
+        return job
+
+    def submit_stream(self, title: str, headers: list, chunks, prefix: str, session_id: str | None = None) -> ExportJob:
+        """Queue an XLSX export of an async iterator of row lists (see AsyncOrm.stream_rows)"""
+        job = self._new_job('xlsx', title, prefix, session_id)
+        job.streamed = True
+        self._start(self._run(job, self._write_stream, headers, chunks))
+        return job
+
+    def _start(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: ExportJob, build, *args):
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, job.filename)
+        job.status = 'running'
+        try:
+            await build(job, path, *args)
+            job.progress = 1.0
+            job.status = 'done'
+        except Exception as e:
+            print(f"Export job {job.filename} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        job.finished_at = time.monotonic()
+
+    async def _build(self, job: ExportJob, path: str, headers: list, rows: list, options: dict):
+        await self.pool.run(run_export, job.id, job.kind, path, job.title, headers, rows, options)
+
+    async def _write_stream(self, job: ExportJob, path: str, headers: list, chunks):
+        # Rows are fetched on the event loop and written in a thread, one chunk at a time
+        loop = asyncio.get_running_loop()
+        tmp_path = f"{path}.part"
+        try:
+            async with self._streams:
+                writer = await loop.run_in_executor(self._writers, XlsxStreamWriter, tmp_path, job.title, headers)
+                async for rows in chunks:
+                    await loop.run_in_executor(self._writers, writer.write_rows, rows)
+                    job.rows += len(rows)
+                await loop.run_in_executor(self._writers, writer.close)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            # Releases the database cursor when the export stops early
+            if hasattr(chunks, 'aclose'):
+                await chunks.aclose()
+
+    def is_available(self, filename: str, session_id: str | None) -> bool:
+        """Whether a finished export with this file name was started by this session and has not expired"""
+        return session_id is not None and any(
+            job.filename == filename and job.status == 'done' and job.session_id == session_id
+            for job in self.jobs.values())
+
+    def sweep(self) -> int:
+        """Remove expired jobs and their files, return how many were removed"""
+        now = time.monotonic()
+        expired = [job for job in self.jobs.values() if job.finished and now - job.finished_at > self.ttl]
+        for job in expired:
+            del self.jobs[job.id]
+            try:
+                os.remove(os.path.join(EXPORT_DIR, job.filename))
+            except FileNotFoundError:
+                pass
+        return len(expired)
+
+
+export_jobs = ExportJobManager()
+
+
+async def run_export_sweeper(interval: float = 300):
+    """Remove expired exports every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            export_jobs.sweep()
+        except Exception as e:
+            print(f"Export sweep failed: {e}")
+
+
+def _client_session_id() -> str | None:
+    """Session cookie of the page the current client was opened with"""
+    from nicegui import context
+
+    request = context.client.request
+    return request.cookies.get("session_id") if request is not None else None
+
+
+async def start_export(kind: str, title: str, headers: list, rows: list, prefix: str, **options):
+    """Run an export job for the current client, showing its progress and downloading the file when done"""
+    from nicegui import ui
+
+    if not rows:
+        ui.notify('No data to export', type='warning', position='top')
+        return
+    try:
+        job = export_jobs.submit(kind, title, headers, rows, prefix, _client_session_id(), **options)
+    except RuntimeError as e:
+        ui.notify(str(e), type='warning', position='top')
+        return
+    await follow_export(job)
+
+
+async def map_chunks(chunks, to_rows):
+    """Turn each chunk of database rows into export rows, closing the source when stopped early"""
+    try:
+        async for chunk in chunks:
+            yield to_rows(chunk)
+    finally:
+        await chunks.aclose()
+
+
+async def start_stream_export(title: str, headers: list, chunks, to_rows, prefix: str):
+    """Run a streamed XLSX export of the chunks of an AsyncOrm.stream_* method for the current client"""
+    from nicegui import ui
+
+    try:
+        job = export_jobs.submit_stream(title, headers, map_chunks(chunks, to_rows), prefix, _client_session_id())
+    except RuntimeError as e:
+        await chunks.aclose()
+        ui.notify(str(e), type='warning', position='top')
+        return
+    await follow_export(job)
+
+
+async def follow_export(job: ExportJob):
+    """Show the progress of a job and download its file when it is done"""
+    from nicegui import ui
+
+    notification = ui.notification(f'{job.title}: queued', position='top', spinner=True, timeout=None)
+    while not job.finished:
+        if job.status == 'running':
+            # Streamed exports do not know their size, so they show the rows written so far
+            notification.message = (f'{job.title}: {job.rows} rows' if job.streamed
+                                    else f'{job.title}: {int(job.progress * 100)}%')
+        await asyncio.sleep(0.5)
+    notification.dismiss()
+
+    if job.status == 'done' and not job.rows:
+        ui.notify('No data to export', type='warning', position='top')
+    elif job.status == 'done':
+        ui.download(f'/exports/{job.filename}', job.filename)
+        ui.notify(f'{job.kind.upper()} file ready for download', type='positive', position='top')
+    else:
+        ui.notify(f'Export failed: {job.error}', type='negative', position='top')
@@ -2,10 +2,11 @@
 File service for managing cat files
 """
 import os
-import uuid
 from pathlib import Path
 from nicegui import ui
 
+from app.database_folder.blob_store import display_name, is_blob, put_blob, put_blob_stream, reference_path
+
 
 class FileService:
     """Service class for file management"""
@@ -54,44 +55,28 @@ class FileService:
             return False, f"Error validating file: {str(e)}"
     
     @staticmethod
-    def save_file(microchip: str, upload_event) -> tuple[bool, str, str]:
-        """Save uploaded file to cat's directory"""
+    def save_file(upload_event) -> tuple[bool, str, str]:
+        """Save uploaded file in the blob store, the returned reference keeps the uploaded name"""
         try:
-            if not microchip:
-                return False, "Microchip is required", ""
-            
             # Validate file
             is_valid, error_msg = FileService.is_valid_file(upload_event)
             if not is_valid:
                 return False, error_msg, ""
             
-            # Create directory if it doesn't exist
-            files_dir = FileService.get_cat_files_dir(microchip)
-            files_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Generate unique filename while preserving original name
             original_filename = upload_event.name
-            file_stem = Path(original_filename).stem
             file_ext = Path(original_filename).suffix
             
-            # Create unique filename: original_name_uuid.ext
-            unique_filename = f"{file_stem}_{uuid.uuid4().hex[:8]}{file_ext}"
-            file_path = files_dir / unique_filename
+            # Save file, a file that is already stored is reused
+            content = upload_event.content
+            if hasattr(content, 'read'):
+                # For SpooledTemporaryFile, read the content
+                content.seek(0)  # Reset to beginning
+                blob = put_blob_stream(content, file_ext)
+            else:
+                # For other types, write directly
+                blob = put_blob(content, file_ext)
             
-            # Save file
-            with open(file_path, 'wb') as f:
-                content = upload_event.content
-                if hasattr(content, 'read'):
-                    # For SpooledTemporaryFile, read the content
-                    content.seek(0)  # Reset to beginning
-                    f.write(content.read())
-                else:
-                    # For other types, write directly
-                    f.write(content)
-            
-            # Return relative path for database storage
-            relative_path = f"{FileService.FILES_DIR}/{microchip}/{unique_filename}"
-            return True, "File saved successfully", relative_path
+            return True, "File saved successfully", f"{blob}#{original_filename}"
             
         except Exception as e:
             return False, f"Error saving file: {str(e)}", ""
@@ -100,6 +85,10 @@ class FileService:
     def delete_file(file_path: str) -> bool:
         """Delete a file from disk"""
         try:
+            if is_blob(file_path):
+                # Other cats may share the blob, blob garbage collection removes it once unreferenced
+                return True
+            
             # Normalize path for file system
             normalized_path = file_path.replace('/', '\\') if os.name == 'nt' else file_path
             full_path = Path(normalized_path)
@@ -170,7 +159,7 @@ class FileService:
     def get_file_url(file_path: str) -> str:
         """Get URL for serving file"""
         # Normalize path for web serving (forward slashes)
-        web_path = file_path.replace('\\', '/')
+        web_path = reference_path(file_path).replace('\\', '/')
         return f"/static/{web_path}"
     
     @staticmethod
@@ -187,31 +176,14 @@ class FileService:
                 if not file_path:
                     continue
                     
-                # Get filename from path and extract original name
-                full_filename = Path(file_path).name
-                # Remove UUID part to show original filename
-                if '_' in full_filename:
-                    parts = full_filename.split('_')
-                    if len(parts) >= 2:
-                        # Check if last part looks like UUID (8 hex characters)
-                        last_part = parts[-1]
-                        file_ext = Path(last_part).suffix
-                        uuid_part = last_part.replace(file_ext, '')
-                        if len(uuid_part) == 8 and all(c in '0123456789abcdef' for c in uuid_part.lower()):
-                            # Remove the UUID part and rejoin
-                            original_name = '_'.join(parts[:-1]) + file_ext
-                        else:
-                            original_name = full_filename
-                    else:
-                        original_name = full_filename
-                else:
-                    original_name = full_filename
+                # Name the file was uploaded under
+                original_name = display_name(file_path)
                     
                 file_url = FileService.get_file_url(file_path)
                 
                 with ui.row().classes('items-center gap-2 mb-1'):
                     # File icon based on extension
-                    file_ext = Path(file_path).suffix.lower()
+                    file_ext = Path(original_name).suffix.lower()
                     if file_ext in ['.pdf']:
                         icon = '📄'
                     elif file_ext in ['.doc', '.docx']:
@@ -229,5 +201,5 @@ class FileService:
                     
                     # Download button
                     ui.button('Download', 
-                             on_click=lambda url=file_url: ui.download(url)
+                             on_click=lambda url=file_url, name=original_name: ui.download(url, name)
                              ).props('size=sm color=primary flat')
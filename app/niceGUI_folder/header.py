@@ -3,7 +3,7 @@ from fastapi import Request
 from app.niceGUI_folder.session_manager import SessionManager
 
 
-def get_header(label_text: str, request: Request):
+async def get_header(label_text: str, request: Request):
     with ui.header().classes('bg-blue-500 text-white'):
         ui.label(label_text).classes('text-h6 q-ml-md')
         
@@ -11,7 +11,7 @@ def get_header(label_text: str, request: Request):
         session_id = request.cookies.get("session_id")
         current_user = None
         if session_id:
-            current_user = SessionManager.get_current_user(session_id)
+            current_user = await SessionManager.get_current_user(session_id)
         
         with ui.row().classes('q-ml-auto q-mr-md items-center'):
             # Navigation buttons (only for authenticated users)
@@ -8,7 +8,7 @@ from fastapi import Request
 
 async def history_page_render(request: Request):
     """Render the history page"""
-    get_header('History Page', request)
+    await get_header('History Page', request)
     
     with ui.column().classes('w-full p-4'):
         ui.label('User Action History').classes('text-h4 q-mb-md')
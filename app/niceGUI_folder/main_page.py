@@ -4,28 +4,53 @@ from fastapi import Request
 from app.database_folder.orm import AsyncOrm
 
 
+def breakdown_card(title: str, counts: dict, labels: dict | None = None, limit: int = 10):
+    """Card listing the largest counts of a breakdown"""
+    with ui.card().classes('q-pa-md'):
+        ui.label(title).classes('text-h6')
+        for value, count in sorted(counts.items(), key=lambda item: -item[1])[:limit]:
+            label = (labels or {}).get(value, value)
+            with ui.row().classes('justify-between w-full'):
+                ui.label(str(label) if label not in (None, '') else 'Unknown')
+                ui.label(str(count)).classes('text-weight-bold')
+
+
 async def main_page_render(request: Request):
-    len_owners, owners = await AsyncOrm.get_owner()
-    len_cats, cats = await AsyncOrm.get_cat()
-    len_breeds = await AsyncOrm.get_breed_count()
+    statistics = await AsyncOrm.get_statistics()
+    _, breeders = await AsyncOrm.get_breed_list()
+    breeder_names = {b['breed_id']: f"{b['breed_firstname']} {b['breed_surname']}" for b in breeders}
     # Header
-    get_header('Cat Database Management System', request)
+    await get_header('Cat Database Management System', request)
 
     with ui.column().classes('q-pa-md'):
         ui.label('Welcome to Cat Database Management System').classes('text-h4 q-mb-lg')
         with ui.row().classes('q-gutter-md'):
             with ui.card().classes('q-pa-md'):
                 ui.label('🐱 Total Cats').classes('text-h6')
-                ui.label(len_cats).classes('text-h4 text-blue')
+                ui.label(statistics['cats']).classes('text-h4 text-blue')
 
             with ui.card().classes('q-pa-md'):
                 ui.label('👤 Total Owners').classes('text-h6')
-                ui.label(len_owners).classes('text-h4 text-green')
+                ui.label(statistics['owners']).classes('text-h4 text-green')
 
             with ui.card().classes('q-pa-md'):
                 ui.label('🐱 Total Breeds').classes('text-h6')
-                ui.label(len_breeds).classes('text-h4 text-orange')
+                ui.label(statistics['breeds']).classes('text-h4 text-orange')
+
+            with ui.card().classes('q-pa-md'):
+                ui.label('🧬 Breeding Animals').classes('text-h6')
+                ui.label(statistics['by_breeding_animal'].get(True, 0)).classes('text-h4 text-purple')
+
+            with ui.card().classes('q-pa-md'):
+                ui.label('🔒 Breeding Locked').classes('text-h6')
+                ui.label(statistics['by_breeding_lock'].get(True, 0)).classes('text-h4 text-red')
 
             with ui.card().classes('q-pa-md'):
                 ui.label('📊 Database Status').classes('text-h6')
-                ui.label('Connected').classes('text-h4 text-positive')
\ No newline at end of file
+                ui.label('Connected').classes('text-h4 text-positive')
+
+        with ui.row().classes('q-gutter-md q-mt-md'):
+            breakdown_card('Gender', statistics['by_gender'])
+            breakdown_card('Status', statistics['by_status'])
+            breakdown_card('Breeders', statistics['by_breed'], breeder_names)
+            breakdown_card('Birth Year', statistics['by_birth_year'])
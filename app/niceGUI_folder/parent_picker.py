@@ -0,0 +1,86 @@
+"""
+Dam/sire picker backed by the server-side parent search.
+
+Instead of shipping every cat of a gender to the browser, the picker shows
+one page of candidates matching the typed name or microchip number, loads
+further pages on demand and keeps the selected parent selectable.
+"""
+from datetime import date
+
+from nicegui import ui
+
+from app.database_folder.orm import AsyncOrm
+from app.database_folder.parent_search import parent_label
+from app.niceGUI_folder.search_pipeline import SearchPipeline
+
+
+class ParentPicker:
+    """Search input and select for the dam or sire of a cat"""
+
+    def __init__(self, gender: str, label: str, value: int | None = None, value_label: str | None = None,
+                 exclude_cat_id: int | None = None, child_birthday: date | None = None,
+                 props: str = 'outlined dense'):
+        self.gender = gender
+        self.exclude_cat_id = exclude_cat_id
+        self.child_birthday = child_birthday
+        self.options = {value: value_label or str(value)} if value is not None else {}
+        self.next_cursor = None
+        self.pipeline = SearchPipeline(self.show_first_page)
+
+        with ui.column().classes('w-full gap-1'):
+            self.search_input = ui.input(label=f'Search {label}', placeholder='Name or microchip') \
+                .props(f'{props} clearable').classes('w-full')
+            self.select = ui.select(dict(self.options), label=label, value=value, clearable=True) \
+                .props(props).classes('w-full')
+            with ui.row().classes('items-center gap-2'):
+                # Active breeders: breeding animals that are alive and not breeding-locked
+                self.active_only = ui.checkbox('Active breeders only')
+                self.more_button = ui.button('More results', on_click=self.load_more).props('flat dense')
+        self.more_button.set_visibility(False)
+
+        self.search_input.on_value_change(lambda e: self.refresh())
+        self.active_only.on_value_change(lambda e: self.refresh(delay=0))
+        self.refresh(delay=0)
+
+    @property
+    def value(self) -> int | None:
+        return self.select.value
+
+    def on_value_change(self, handler):
+        self.select.on_value_change(handler)
+
+    def set_child_birthday(self, child_birthday: date | None):
+        """Only offer parents of a plausible age for a kitten born on this day"""
+        if child_birthday != self.child_birthday:
+            self.child_birthday = child_birthday
+            self.refresh(delay=0)
+
+    async def fetch(self, cursor: str | None = None):
+        active = self.active_only.value
+        return await AsyncOrm.search_parents(self.gender, self.search_input.value, cursor,
+                                             breeding_animal=active, alive=active, unlocked=active,
+                                             child_birthday=self.child_birthday,
+                                             exclude_cat_id=self.exclude_cat_id)
+
+    def refresh(self, delay: float | None = None):
+        key = (self.search_input.value or '', self.active_only.value, self.child_birthday)
+        self.pipeline.submit(key, self.fetch, delay)
+
+    def _show(self, options: dict):
+        # The current parent stays selectable even when it does not match the search
+        selected = self.select.value
+        if selected is not None and selected not in options:
+            options[selected] = self.options.get(selected, str(selected))
+        self.options = options
+        self.select.set_options(dict(options), value=selected)
+        self.more_button.set_visibility(self.next_cursor is not None)
+
+    async def show_first_page(self, result):
+        _, rows, self.next_cursor = result
+        self._show({row['id']: parent_label(row) for row in rows})
+
+    async def load_more(self):
+        if self.next_cursor is None or self.pipeline.pending:
+            return
+        _, rows, self.next_cursor = await self.fetch(self.next_cursor)
+        self._show({**self.options, **{row['id']: parent_label(row) for row in rows}})
@@ -0,0 +1,70 @@
+"""
+Password hashing with scrypt.
+
+Hashes are stored as "scrypt$n$r$p$salt$hash" (base64 salt and hash). Legacy
+unsalted SHA-256 hex digests are still accepted and can be recognised with
+needs_rehash so they are replaced after the next successful login. The KDF is
+deliberately slow, so the async helpers run it on a small dedicated thread
+pool (hashlib releases the GIL) and never block the event loop.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+# Bounds the memory (about 16 MB per hash) and CPU spent on concurrent logins
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='password-kdf')
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=HASH_BYTES)
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with a random salt"""
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return "$".join(("scrypt", str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+                     base64.b64encode(salt).decode(), base64.b64encode(digest).decode()))
+
+
+def verify_password(password: str, stored_hash: str | None) -> bool:
+    """Check a password against a stored scrypt or legacy SHA-256 hash"""
+    if not stored_hash:
+        return False
+    if stored_hash.startswith("scrypt$"):
+        try:
+            _, n, r, p, salt, digest = stored_hash.split("$")
+            expected = base64.b64decode(digest)
+            actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+        except ValueError:
+            return False
+        return hmac.compare_digest(actual, expected)
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+
+
+def needs_rehash(stored_hash: str | None) -> bool:
+    """Whether a stored hash is legacy SHA-256 or uses weaker scrypt parameters"""
+    if not stored_hash or not stored_hash.startswith("scrypt$"):
+        return True
+    return stored_hash.split("$")[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password, password)
+
+
+async def verify_password_async(password: str, stored_hash: str | None) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_executor, verify_password, password, stored_hash)
+
+
+# Verified when the email is unknown, so a failed lookup takes as long as a wrong password
+DUMMY_HASH = hash_password(os.urandom(8).hex())
@@ -8,6 +8,9 @@ from reportlab.lib.enums import TA_CENTER
 from datetime import datetime
 import os
 
+from app.database_folder.blob_store import display_name, reference_path
+from app.niceGUI_folder.photo_service import PhotoService
+
 
 class CatPDFGenerator:
     def __init__(self):
@@ -243,6 +246,8 @@ class CatPDFGenerator:
                         photo_path = photos[i + j]
                         # Normalize path separators for file system check
                         normalized_path = photo_path.replace('/', '\\') if os.name == 'nt' else photo_path
+                        # 2 inch at 150 dpi
+                        normalized_path = PhotoService.find_variant(normalized_path, 300) or normalized_path
                         if os.path.exists(normalized_path):
                             try:
                                 # Create image with max size constraints
@@ -279,28 +284,12 @@ class CatPDFGenerator:
             for i, file_path in enumerate(files):
                 try:
                     if file_path:
-                        # Get filename from path and extract original name
-                        full_filename = os.path.basename(file_path)
-                        # Remove UUID part to show original filename
-                        if '_' in full_filename:
-                            parts = full_filename.split('_')
-                            if len(parts) >= 2:
-                                # Check if last part looks like UUID (8 hex characters)
-                                last_part = parts[-1]
-                                file_ext = os.path.splitext(last_part)[1]
-                                uuid_part = last_part.replace(file_ext, '')
-                                if len(uuid_part) == 8 and all(c in '0123456789abcdef' for c in uuid_part.lower()):
-                                    # Remove the UUID part and rejoin
-                                    original_name = '_'.join(parts[:-1]) + file_ext
-                                else:
-                                    original_name = full_filename
-                            else:
-                                original_name = full_filename
-                        else:
-                            original_name = full_filename
+                        # Name the file was uploaded under
+                        original_name = display_name(file_path)
                         
                         # Normalize path separators for file system check
-                        normalized_path = file_path.replace('/', '\\') if os.name == 'nt' else file_path
+                        normalized_path = reference_path(file_path)
+                        normalized_path = normalized_path.replace('/', '\\') if os.name == 'nt' else normalized_path
                         if os.path.exists(normalized_path):
                             story.append(Paragraph(f"📎 {original_name}", self.styles['Normal']))
                         else:
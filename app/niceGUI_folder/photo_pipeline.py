@@ -0,0 +1,131 @@
+"""
+Photo upload pipeline.
+
+Standardizing a photo (decode, LANCZOS resize, JPEG re-encoding until it is
+small enough) is CPU bound and used to run in the upload callback on the
+event loop, so a batch of uploads stalled every client. Uploads are now put
+on a bounded queue that PHOTO_WORKERS tasks drain into a process pool. When
+MAX_QUEUED_PHOTOS uploads are waiting, further uploads are rejected and the
+client is told to try again, so the upload bytes held in memory stay capped
+at the queued and processing jobs. Every job reports its progress, and
+upload_photo shows it to the uploading client.
+"""
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from app.database_folder.metrics import registry as metrics_registry
+from logger import logger
+from app.niceGUI_folder.worker_pool import ProgressPool
+from app.niceGUI_folder.worker_tasks import process_photo
+
+PHOTO_WORKERS = 2
+MAX_QUEUED_PHOTOS = 16
+
+
+@dataclass
+class PhotoJob:
+    id: str
+    filename: str
+    content: bytes | None
+    status: str = 'queued'  # queued, processing, done or failed
+    progress: float = 0.0
+    path: str | None = None
+    error: str | None = None
+    created_at: float = field(default_factory=time.monotonic)
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+
+class PhotoPipeline:
+    """Bounded queue of photo uploads processed in a process pool"""
+
+    def __init__(self, workers: int = PHOTO_WORKERS, max_queued: int = MAX_QUEUED_PHOTOS):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.jobs = {}
+        self.pool = ProgressPool(workers, 'photo', self._set_progress)
+        self._queue = None
+        self._tasks = []
+
+    def _set_progress(self, job_id: str, progress: float):
+        job = self.jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.progress = progress
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_queued)
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, content: bytes, filename: str) -> PhotoJob:
+        """Queue a photo; the job's done event is set when it finishes. Raises RuntimeError when the queue is full"""
+        self._start()
+        job = PhotoJob(id=uuid.uuid4().hex, filename=filename, content=content)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise RuntimeError('Too many photos are being processed, please try again shortly')
+        self.jobs[job.id] = job
+        return job
+
+    async def process(self, content: bytes, filename: str) -> str | None:
+        """Saved path of a standardized photo, None when it could not be processed; raises RuntimeError when busy"""
+        job = await self.submit(content, filename)
+        await job.done.wait()
+        return job.path
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            job.status = 'processing'
+            try:
+                job.path, stats = await self.pool.run(process_photo, job.id, job.content, job.filename)
+                # Workers are separate processes, so their statistics are recorded here
+                if stats:
+                    metrics_registry.observe_photo_encode(stats['passes'], stats['seconds'])
+                job.status = 'done' if job.path else 'failed'
+                if not job.path:
+                    job.error = 'Failed to save photo'
+            except Exception as e:
+                logger.error("Photo job %s failed: %s", job.filename, e)
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.content = None
+                del self.jobs[job.id]
+                job.done.set()
+                self._queue.task_done()
+
+
+photo_pipeline = PhotoPipeline()
+
+
+async def upload_photo(content: bytes, filename: str) -> str | None:
+    """
+    Process an uploaded photo for the current client, showing its progress; returns the saved path
+    Raises RuntimeError when too many photos are queued
+    """
+    from nicegui import ui
+
+    job = await photo_pipeline.submit(content, filename)
+    notification = ui.notification(f'{filename}: waiting', position='top', spinner=True, timeout=None)
+    try:
+        while not job.done.is_set():
+            notification.message = (f'{filename}: {int(job.progress * 100)}%' if job.status == 'processing'
+                                    else f'{filename}: queued')
+            try:
+                await asyncio.wait_for(job.done.wait(), 0.3)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        notification.dismiss()
+    return job.path
@@ -3,13 +3,17 @@ Photo Service for handling cat photos
 Following SOLID principles - Single Responsibility Principle
 """
 import os
-import uuid
+import re
+import time
 from typing import List, Optional
 from nicegui import ui
 import shutil
-from PIL import Image as PILImage
+from PIL import Image as PILImage, features as pil_features
 import io
 
+from app.database_folder.blob_store import is_blob, put_blob
+from app.database_folder.db_setting import settings
+
 
 class PhotoService:
     """Service for managing cat photos"""
@@ -18,6 +22,18 @@ class PhotoService:
     ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
     MAX_FILE_SIZE = 2 * 1024 * 1024  # 2MB
     STANDARD_SIZE = (400, 400)  # Standard square size for all photos
+    JPEG_MAX_QUALITY = 95
+    JPEG_MIN_QUALITY = 15
+    JPEG_QUALITY_TOLERANCE = 2  # stop once the best fitting quality is known within this many steps
+    JPEG_SIZE_SLACK = 0.2  # a fit using at least 80% of the target size is good enough
+    # Fitted on the generated corpus of benchmarks/photo_encoding.py; JPEG_ESTIMATE_MARGIN limits the damage
+    JPEG_RATIO_OFFSET = 34  # the full/trial size ratio grows about in proportion to quality + offset
+    JPEG_ESTIMATE_MARGIN = 1.5  # a first estimated encode missing by more than this factor switches to bisection
+    VARIANT_SIZES = (64, 160, 400)  # square renditions saved next to every photo, as <name>_<size>.<ext>
+    VARIANT_FORMATS = ('jpeg', 'webp')  # 'avif' can be added, formats Pillow cannot encode are skipped
+    VARIANT_QUALITY = {'jpeg': 85, 'webp': 80, 'avif': 60}
+    VARIANT_EXTENSIONS = {'jpeg': '.jpg', 'webp': '.webp', 'avif': '.avif'}
+    VARIANT_PATTERN = re.compile(r'_(\d+)\.(jpg|webp|avif)$')
     
     @classmethod
     def ensure_photos_dir(cls) -> str:
@@ -133,14 +149,19 @@ class PhotoService:
         return True, ""
     
     @classmethod
-    def standardize_image(cls, file_content: bytes, target_size_kb: int = 500) -> bytes:
+    def standardize_image(cls, file_content: bytes, target_size_kb: int = 500, report=None,
+                          stats: dict = None) -> bytes:
         """
         Standardize image to 400x400 square format and compress to target size
+        report(progress) is called after each step and stats receives the encoder statistics when given
         Returns: standardized and compressed image bytes
         """
         try:
             # Open image
             image = PILImage.open(io.BytesIO(file_content))
+            image.load()
+            if report:
+                report(0.2)
             
             # Convert to RGB if necessary (for JPEG)
             if image.mode in ('RGBA', 'LA', 'P'):
@@ -148,28 +169,125 @@ class PhotoService:
             
             # Resize to standard square size (400x400) with smart cropping
             image = cls._resize_to_square(image, cls.STANDARD_SIZE)
+            if report:
+                report(0.5)
             
             # Compress to target size
-            quality = 95
-            target_size_bytes = target_size_kb * 1024
-            
-            while quality > 10:
-                output = io.BytesIO()
-                image.save(output, format='JPEG', quality=quality, optimize=True)
-                compressed_size = len(output.getvalue())
-                
-                if compressed_size <= target_size_bytes:
-                    return output.getvalue()
-                
-                quality -= 10
-            
-            # Final fallback - return the last attempt
-            return output.getvalue()
+            return cls.encode_jpeg_to_size(image, target_size_kb * 1024, stats)
             
         except Exception as e:
             print(f"Error standardizing image: {e}")
             return file_content
     
+    @classmethod
+    def encode_jpeg_to_size(cls, image: PILImage.Image, target_size_bytes: int, stats: dict = None) -> bytes:
+        """
+        Encode image as JPEG with about the highest quality that fits target_size_bytes
+        Maximum quality is encoded first, which is all a photo needs at the 500 KB of standardize_image.
+        When that is too large the quality is searched on a quarter-scale trial copy, whose encodes cost
+        about 1/16 of a full one: a full encode is estimated as the trial size times the full/trial size
+        ratio, interpolated between the full encodes done so far, so one or two more full passes are usual.
+        When the first estimated encode misses by more than JPEG_ESTIMATE_MARGIN the rest is a plain bisection.
+        stats receives the number of full encode passes, the chosen quality, size and time.
+        """
+        started = time.perf_counter()
+        buffer = io.BytesIO()
+        
+        def encode(source: PILImage.Image, quality: int, optimize: bool) -> int:
+            buffer.seek(0)
+            buffer.truncate()
+            source.save(buffer, format='JPEG', quality=quality, optimize=optimize)
+            return buffer.tell()
+        
+        # Most photos fit at maximum quality
+        size = encode(image, cls.JPEG_MAX_QUALITY, True)
+        passes = 1
+        if size <= target_size_bytes:
+            best_quality, best = cls.JPEG_MAX_QUALITY, buffer.getvalue()
+        else:
+            best_quality, best = None, None
+            smallest = cls.JPEG_MAX_QUALITY, buffer.getvalue()
+        
+        trial = None
+        trial_sizes = {}
+        # Full/trial size ratio of each full encode; it grows with the quality
+        ratios = {}
+        
+        def estimate(quality: int) -> float:
+            if quality not in trial_sizes:
+                trial_sizes[quality] = encode(trial, quality, False)
+            below = max((q for q in ratios if q <= quality), default=None)
+            above = min((q for q in ratios if q >= quality), default=None)
+            if below is not None and above is not None and below != above:
+                ratio = ratios[below] + (ratios[above] - ratios[below]) * (quality - below) / (above - below)
+            elif len(ratios) > 1:
+                # Outside the full encodes the ratio follows the line through the two nearest ones
+                first, second = sorted(ratios, key=lambda q: abs(q - quality))[:2]
+                ratio = ratios[first] + (ratios[second] - ratios[first]) * (quality - first) / (second - first)
+            else:
+                # With one full encode the ratio is taken to grow in proportion to quality + offset
+                known = below if below is not None else above
+                ratio = ratios[known] * (quality + cls.JPEG_RATIO_OFFSET) / (known + cls.JPEG_RATIO_OFFSET)
+            return trial_sizes[quality] * ratio
+        
+        def predict(low: int, high: int) -> int | None:
+            """Highest quality in (low, high) estimated to fit, None if none is"""
+            if low + 1 >= high or estimate(low + 1) > target_size_bytes:
+                return None
+            if estimate(high - 1) <= target_size_bytes:
+                return high - 1
+            low, high = low + 1, high - 1
+            while high - low > 1:
+                middle = (low + high) // 2
+                if estimate(middle) <= target_size_bytes:
+                    low = middle
+                else:
+                    high = middle
+            return low
+        
+        if best is None:
+            trial = image.reduce(4) if min(image.size) >= 64 else image
+            trial_sizes[cls.JPEG_MAX_QUALITY] = encode(trial, cls.JPEG_MAX_QUALITY, False)
+            ratios[cls.JPEG_MAX_QUALITY] = size / trial_sizes[cls.JPEG_MAX_QUALITY]
+            low, high = cls.JPEG_MIN_QUALITY - 1, cls.JPEG_MAX_QUALITY  # fits at low, too large at high
+            bisect = False
+            while True:
+                if bisect:
+                    quality = (low + high) // 2 if low + 1 < high else None
+                else:
+                    quality = predict(low, high)
+                if quality is None:
+                    if best is not None or low + 1 >= high:
+                        break
+                    # Nothing is estimated to fit, test the lowest untested quality anyway
+                    quality = low + 1
+                estimated = None if bisect else estimate(quality)
+                size = encode(image, quality, True)
+                if passes == 1:
+                    # The estimate does not fit this photo, search the remaining qualities by plain bisection
+                    bisect = not 1 / cls.JPEG_ESTIMATE_MARGIN <= size / estimated <= cls.JPEG_ESTIMATE_MARGIN
+                passes += 1
+                if not bisect:
+                    ratios[quality] = size / trial_sizes[quality]
+                if size <= target_size_bytes:
+                    best_quality, best = quality, buffer.getvalue()
+                    low = quality
+                else:
+                    high = quality
+                    if best is None:
+                        smallest = quality, buffer.getvalue()
+                if best is not None and (high - low <= cls.JPEG_QUALITY_TOLERANCE
+                                         or len(best) >= target_size_bytes * (1 - cls.JPEG_SIZE_SLACK)):
+                    break
+        
+        if best is None:
+            # Nothing fits, keep the smallest attempt
+            best_quality, best = smallest
+        if stats is not None:
+            stats.update(passes=passes, quality=best_quality, size=len(best),
+                         seconds=time.perf_counter() - started)
+        return best
+    
     @classmethod
     def _resize_to_square(cls, image: PILImage.Image, target_size: tuple) -> PILImage.Image:
         """
@@ -201,32 +319,25 @@ class PhotoService:
         return square_image
 
     @classmethod
-    def save_photo(cls, file_content: bytes, original_filename: str, microchip: str = None) -> Optional[str]:
+    def save_photo(cls, file_content: bytes, original_filename: str,
+                   report=None, stats: dict = None) -> Optional[str]:
         """
-        Save photo file and return the saved path
+        Save photo in the blob store and return its path
+        CPU heavy, uploads go through photo_pipeline so this runs in a worker process
         Returns: saved_path or None if failed
         """
         try:
-            # Generate unique filename (always use .jpg for compressed images)
-            unique_filename = f"{uuid.uuid4()}.jpg"
-            
-            # Get cat-specific directory
-            cat_photos_dir = cls.get_cat_photos_dir(microchip)
-            file_path = os.path.join(cat_photos_dir, unique_filename)
-            
             # Standardize and compress image
             original_size = len(file_content)
-            file_content = cls.standardize_image(file_content, 500)
+            file_content = cls.standardize_image(file_content, 500, report, stats)
             print(f"Standardized image from {original_size // 1024}KB to {len(file_content) // 1024}KB")
             
-            # Save file
-            with open(file_path, 'wb') as f:
-                f.write(file_content)
+            # Save file (always .jpg for compressed images), a photo that is already stored is reused
+            file_path = put_blob(file_content, '.jpg')
             
             print(f"Photo saved to: {file_path}")
-            # Return relative path for database storage with normalized separators
-            normalized_path = file_path.replace('\\', '/')
-            return normalized_path
+            cls.save_variants(file_path)
+            return file_path
             
         except Exception as e:
             print(f"Error saving photo: {e}")
@@ -234,10 +345,18 @@ class PhotoService:
     
     @classmethod
     def delete_photo(cls, photo_path: str) -> bool:
-        """Delete photo file"""
+        """Delete photo file and its variants"""
         try:
+            if is_blob(photo_path):
+                # Other cats may share the blob, blob garbage collection removes it once unreferenced
+                return True
             if os.path.exists(photo_path):
                 os.remove(photo_path)
+                for size in cls.VARIANT_SIZES:
+                    for fmt in cls.VARIANT_EXTENSIONS:
+                        variant = cls.variant_path(photo_path, size, fmt)
+                        if os.path.exists(variant):
+                            os.remove(variant)
                 return True
         except Exception as e:
             print(f"Error deleting photo: {e}")
@@ -253,13 +372,117 @@ class PhotoService:
         return success
     
     @classmethod
-    def get_photo_url(cls, photo_path: str) -> str:
-        """Get URL for photo display"""
+    def variant_formats(cls) -> List[str]:
+        """Variant formats this Pillow build can encode"""
+        return [fmt for fmt in cls.VARIANT_FORMATS if fmt == 'jpeg' or pil_features.check(fmt)]
+    
+    @classmethod
+    def variant_path(cls, photo_path: str, size: int, fmt: str = 'jpeg') -> str:
+        """Path of the size pixel rendition of a photo in a VARIANT_FORMATS format"""
+        return f"{os.path.splitext(photo_path)[0]}_{size}{cls.VARIANT_EXTENSIONS[fmt]}"
+    
+    @classmethod
+    def is_variant(cls, photo_path: str) -> bool:
+        """Whether a file is a rendition written by save_variants rather than an uploaded photo"""
+        match = cls.VARIANT_PATTERN.search(photo_path)
+        return bool(match) and int(match.group(1)) in cls.VARIANT_SIZES
+    
+    @classmethod
+    def save_variants(cls, photo_path: str, overwrite: bool = False) -> List[str]:
+        """
+        Write the VARIANT_SIZES renditions of a photo in every available format, return the written paths
+        A standardized JPEG is its own STANDARD_SIZE rendition, so that one is only written for other photos
+        """
+        written = []
+        try:
+            with PILImage.open(photo_path) as image:
+                is_standard = image.format == 'JPEG' and image.size == cls.STANDARD_SIZE
+                image = image.convert('RGB')
+            if image.size != cls.STANDARD_SIZE:
+                image = cls._resize_to_square(image, cls.STANDARD_SIZE)
+            for size in sorted(cls.VARIANT_SIZES, reverse=True):
+                # Each rendition is resized from the previous, larger one
+                if image.width != size:
+                    image = image.resize((size, size), PILImage.Resampling.LANCZOS)
+                for fmt in cls.variant_formats():
+                    if fmt == 'jpeg' and is_standard and size == cls.STANDARD_SIZE[0]:
+                        continue
+                    path = cls.variant_path(photo_path, size, fmt)
+                    if not overwrite and os.path.exists(path):
+                        continue
+                    # Write next to the final path and rename, so a rendition is never served half written
+                    temp_path = f"{path}.part"
+                    image.save(temp_path, format=fmt.upper(), quality=cls.VARIANT_QUALITY[fmt], optimize=True)
+                    os.replace(temp_path, path)
+                    written.append(path)
+        except Exception as e:
+            print(f"Error saving variants of {photo_path}: {e}")
+        return written
+    
+    @classmethod
+    def backfill_variants(cls, overwrite: bool = False, workers: int = None) -> tuple:
+        """Write the missing renditions of all photos and image blobs, return (photos, written files)"""
+        from concurrent.futures import ProcessPoolExecutor
+        from functools import partial
+
+        photo_paths = [os.path.join(root, name)
+                       for directory in (cls.PHOTOS_DIR, settings.BLOB_DIR)
+                       for root, _, files in os.walk(directory) for name in sorted(files)
+                       if os.path.splitext(name)[1].lower() in cls.ALLOWED_EXTENSIONS and not cls.is_variant(name)]
+        written = 0
+        with ProcessPoolExecutor(workers) as pool:
+            for paths in pool.map(partial(cls.save_variants, overwrite=overwrite), photo_paths, chunksize=8):
+                written += len(paths)
+        return len(photo_paths), written
+    
+    @classmethod
+    def existing_variant(cls, photo_path: str, size: int, fmt: str = 'jpeg') -> Optional[str]:
+        """Path of the size pixel rendition of a photo when it exists"""
+        standard = fmt == 'jpeg' and size == cls.STANDARD_SIZE[0] and photo_path.lower().endswith('.jpg')
+        if is_blob(photo_path):
+            # Blobs get all their renditions when stored (save_photo, blob_store import), so nothing is checked
+            return photo_path if standard else cls.variant_path(photo_path, size, fmt)
+        path = cls.variant_path(photo_path, size, fmt)
+        if os.path.exists(path):
+            return path
+        if standard:
+            # Standardized photos are their own STANDARD_SIZE JPEG rendition
+            return photo_path if os.path.exists(photo_path) else None
+        return None
+    
+    @classmethod
+    def find_variant(cls, photo_path: str, size: int, fmt: str = 'jpeg') -> Optional[str]:
+        """Smallest existing rendition at least size pixels wide, None when there is none"""
+        for variant_size in sorted(cls.VARIANT_SIZES):
+            if variant_size >= size:
+                path = cls.existing_variant(photo_path, variant_size, fmt)
+                if path:
+                    return path
+        return None
+    
+    @classmethod
+    def get_photo_srcset(cls, photo_path: str, fmt: str = 'jpeg') -> str:
+        """srcset attribute value listing the existing renditions of a photo"""
+        entries = []
+        for size in sorted(cls.VARIANT_SIZES):
+            path = cls.existing_variant(photo_path, size, fmt)
+            if path:
+                normalized_path = path.replace('\\', '/')
+                entries.append(f"/static/{normalized_path} {size}w")
+        return ", ".join(entries)
+    
+    @classmethod
+    def get_photo_url(cls, photo_path: str, size: int = None) -> str:
+        """Get URL for photo display, of the smallest rendition at least size pixels wide when size is given"""
         if not photo_path:
             return ""
         
-        # Check if file exists
-        if not os.path.exists(photo_path):
+        blob = is_blob(photo_path)
+        if size is not None:
+            photo_path = cls.find_variant(photo_path, size) or photo_path
+        
+        # Check if file exists, blobs referenced by a cat are kept by the blob store
+        if not blob and not os.path.exists(photo_path):
             print(f"Photo file does not exist: {photo_path}")
             return ""
         
@@ -287,20 +510,28 @@ class PhotoService:
         """Create photo gallery display"""
         print(f"Creating photo gallery with {len(photo_paths)} photos: {photo_paths}")
         gallery = ui.row().classes('flex-wrap gap-4 p-2 w-full')
+        display_size = int(max_width[:-2]) if max_width.endswith('px') and max_width[:-2].isdigit() else None
+        formats = cls.variant_formats()
         
         for i, photo_path in enumerate(photo_paths):
             print(f"Processing photo {i+1}: {photo_path}")
-            if photo_path and os.path.exists(photo_path):
+            if photo_path and (is_blob(photo_path) or os.path.exists(photo_path)):
                 print(f"Photo {i+1} exists, adding to gallery")
                 with gallery:
-                    # Convert local path to URL for web display
-                    photo_url = cls.get_photo_url(photo_path)
+                    # Convert local path to URL for web display, of the rendition that fits max_width
+                    photo_url = cls.get_photo_url(photo_path, display_size)
                     print(f"Displaying photo: {photo_path} -> {photo_url}")
                     if photo_url:
                         # Try using ui.image with proper URL
                         try:
+                            # The browser picks the smallest rendition for the display density, WebP when supported
+                            srcset = cls.get_photo_srcset(photo_path)
+                            webp_srcset = cls.get_photo_srcset(photo_path, 'webp') if 'webp' in formats else ''
+                            source = (f'<source type="image/webp" srcset="{webp_srcset}" sizes="{max_width}" />'
+                                      if webp_srcset else '')
+                            srcset = f' srcset="{srcset}" sizes="{max_width}"' if srcset else ''
                             # Use direct CSS styles for better control
-                            ui.html(f'<img src="{photo_url}" style="max-width: 400px; width: 100%; height: auto; border-radius: 12px; box-shadow: 0 4px 8px rgba(0,0,0,0.15); transition: box-shadow 0.3s ease; cursor: pointer; margin: 8px;" onmouseover="this.style.boxShadow=\'0 8px 16px rgba(0,0,0,0.2)\'" onmouseout="this.style.boxShadow=\'0 4px 8px rgba(0,0,0,0.15)\'" />')
+                            ui.html(f'<picture>{source}<img src="{photo_url}"{srcset} loading="lazy" style="max-width: {max_width}; width: 100%; height: auto; border-radius: 12px; box-shadow: 0 4px 8px rgba(0,0,0,0.15); transition: box-shadow 0.3s ease; cursor: pointer; margin: 8px;" onmouseover="this.style.boxShadow=\'0 8px 16px rgba(0,0,0,0.2)\'" onmouseout="this.style.boxShadow=\'0 4px 8px rgba(0,0,0,0.15)\'" /></picture>')
                             print(f"Successfully added photo {i+1} with direct HTML")
                         except Exception as e:
                             print(f"Error displaying image: {e}")
@@ -332,7 +563,7 @@ class PhotoService:
             new_paths = []
             for i, old_path in enumerate(old_photo_paths):
                 print(f"Processing photo {i+1}: {old_path}")
-                if old_path and os.path.exists(old_path):
+                if old_path and not is_blob(old_path) and os.path.exists(old_path):
                     # Extract filename from old path
                     filename = os.path.basename(old_path)
                     print(f"  Filename: {filename}")
@@ -423,7 +654,7 @@ class PhotoService:
             for i, old_path in enumerate(old_photo_paths):
                 print(f"Processing path {i+1}: {old_path}")
                 
-                if old_path and old_clean in old_path:
+                if old_path and not is_blob(old_path) and old_clean in old_path:
                     # Replace old microchip directory with new one in the path
                     new_path = old_path.replace(old_clean, new_clean)
                     print(f"  Updated path: {old_path} -> {new_path}")
@@ -440,3 +671,10 @@ class PhotoService:
             import traceback
             traceback.print_exc()
             return old_photo_paths
+
+
+if __name__ == "__main__":
+    import sys
+
+    photos, written = PhotoService.backfill_variants(overwrite='--overwrite' in sys.argv[1:])
+    print(f"Photo variants: {written} files written for {photos} photos")
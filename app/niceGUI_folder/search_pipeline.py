@@ -0,0 +1,111 @@
+"""
+Debounced, cancellable search pipeline for typeahead inputs.
+
+Each client page owns one SearchPipeline. A new input cancels the previous
+request, whether it is still waiting out the debounce delay or already
+querying: cancelling the task makes asyncpg send a cancel request for the
+running statement, so superseded queries neither hold a pool connection nor
+deliver late, out-of-order results. Results are kept per browser session in
+a small LRU cache with a TTL, so going back to an earlier prefix (e.g. with
+backspace) costs no query. Writes to cats call invalidate_search_caches,
+which makes every cached result stale.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+SEARCH_DEBOUNCE = 0.3  # seconds of typing pause before a query is sent
+
+# Bumped by invalidate_search_caches; results cached under an older version are not used
+_cache_version = 0
+
+
+def invalidate_search_caches():
+    """Drop the cached search results of all sessions after a cat was added, changed or deleted"""
+    global _cache_version
+    _cache_version += 1
+
+
+class SearchCache:
+    """LRU cache of recent search results with a time to live"""
+
+    def __init__(self, max_entries: int = 32, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, version, value = entry
+        if time.monotonic() - stored_at > self.ttl or version != _cache_version:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, version: int | None = None):
+        """Cache a result; version is the cache version read before it was fetched"""
+        self._entries[key] = (time.monotonic(), _cache_version if version is None else version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# One cache per browser session, the least recently used session is dropped first
+MAX_CACHED_SESSIONS = 256
+_session_caches = OrderedDict()
+
+
+def session_search_cache(session_id: str | None) -> SearchCache:
+    """Search cache shared by all pages of a browser session"""
+    if session_id is None:
+        return SearchCache()
+    cache = _session_caches.get(session_id)
+    if cache is None:
+        cache = _session_caches[session_id] = SearchCache()
+        while len(_session_caches) > MAX_CACHED_SESSIONS:
+            _session_caches.popitem(last=False)
+    _session_caches.move_to_end(session_id)
+    return cache
+
+
+class SearchPipeline:
+    """Runs only the latest submitted query and hands its result to on_result"""
+
+    def __init__(self, on_result, cache: SearchCache | None = None, delay: float = SEARCH_DEBOUNCE):
+        self.on_result = on_result
+        self.cache = cache if cache is not None else SearchCache()
+        self.delay = delay
+        self._task = None
+
+    @property
+    def pending(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def submit(self, key, fetch, delay: float | None = None):
+        """Schedule fetch() for a hashable key, superseding any earlier request"""
+        self.cancel()
+        self._task = asyncio.create_task(self._run(key, fetch, self.delay if delay is None else delay))
+
+    def cancel(self):
+        if self.pending:
+            self._task.cancel()
+
+    async def _run(self, key, fetch, delay):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            result = self.cache.get(key)
+            if result is None:
+                # A write during the query makes the result stale, the version check keeps it from being used
+                version = _cache_version
+                result = await fetch()
+                self.cache.put(key, result, version)
+            await self.on_result(result)
+        except Exception as e:
+            print(f"Search pipeline error: {e}")
@@ -0,0 +1,292 @@
+"""
+Session stores for logged-in users.
+
+All stores keep sessions for a sliding TTL: every read pushes the expiry
+forward, and a background sweeper removes expired sessions. The backend is
+chosen with the SESSION_BACKEND setting:
+
+- memory: in-process LRU dict, fastest, lost on restart and not shared
+- file: one file per session in SESSION_DIR, shared by workers on one host
+- postgres: the user_session table, shared by workers on any host
+
+The shared backends sit behind a short-lived in-process cache so repeated
+lookups within a request (header and page) cost a dict lookup. Store calls
+are coroutines: the file backend does its I/O in a worker thread and the
+postgres backend goes through the application's asyncpg engine, so a
+session lookup never blocks the event loop.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+from app.database_folder.db_setting import settings
+
+
+class SessionStore(ABC):
+    """Interface of a session store; every call is awaited so no backend blocks the event loop"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """User data of a live session, extending its expiry"""
+
+    @abstractmethod
+    async def set(self, session_id: str, user_data: Dict[str, Any]):
+        """Store a session, replacing an existing one with the same id"""
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        """Remove a session"""
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Remove expired sessions and return how many were removed"""
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU store, the least recently used session is evicted when full"""
+
+    def __init__(self, ttl: float, max_sessions: int = 10000, sliding: bool = True):
+        super().__init__(ttl)
+        self.max_sessions = max_sessions
+        self.sliding = sliding
+        self._sessions = OrderedDict()
+
+    def get_nowait(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        expires_at, user_data = entry
+        now = time.monotonic()
+        if expires_at < now:
+            del self._sessions[session_id]
+            return None
+        if self.sliding:
+            self._sessions[session_id] = (now + self.ttl, user_data)
+        self._sessions.move_to_end(session_id)
+        return user_data
+
+    def set_nowait(self, session_id, user_data):
+        self._sessions[session_id] = (time.monotonic() + self.ttl, user_data)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def delete_nowait(self, session_id):
+        self._sessions.pop(session_id, None)
+
+    async def get(self, session_id):
+        return self.get_nowait(session_id)
+
+    async def set(self, session_id, user_data):
+        self.set_nowait(session_id, user_data)
+
+    async def delete(self, session_id):
+        self.delete_nowait(session_id)
+
+    async def sweep(self):
+        now = time.monotonic()
+        expired = [session_id for session_id, (expires_at, _) in self._sessions.items() if expires_at < now]
+        for session_id in expired:
+            del self._sessions[session_id]
+        return len(expired)
+
+
+def _encode_json(value):
+    # JSON has no datetime type: tag it so it is read back as a datetime
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    return str(value)
+
+
+def _decode_json(value: dict):
+    if value.keys() == {"__datetime__"}:
+        return datetime.fromisoformat(value["__datetime__"])
+    return value
+
+
+class FileSessionStore(SessionStore):
+    """One JSON file per session, accessed in a worker thread; the file modification time is the last access"""
+
+    # Reads refresh the modification time at most this often
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, ttl: float, directory: str):
+        super().__init__(ttl)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        # Hashing keeps arbitrary cookie values out of the file system
+        return os.path.join(self.directory, hashlib.sha256(session_id.encode()).hexdigest() + ".session")
+
+    def _read(self, session_id):
+        path = self._path(session_id)
+        try:
+            last_access = os.path.getmtime(path)
+            now = time.time()
+            if last_access + self.ttl < now:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                user_data = json.load(f, object_hook=_decode_json)
+            if now - last_access > self.TOUCH_INTERVAL:
+                os.utime(path)
+            return user_data
+        except (FileNotFoundError, ValueError):
+            # A partial or foreign file (such as a pickle of an older version) is no session
+            return None
+
+    def _write(self, session_id, user_data):
+        # Write to a temporary file and rename so other workers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(user_data, f, default=_encode_json)
+        os.replace(tmp_path, self._path(session_id))
+
+    def _remove(self, session_id):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def _sweep(self):
+        removed = 0
+        deadline = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith(".session") and entry.stat().st_mtime < deadline:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    async def get(self, session_id):
+        return await asyncio.to_thread(self._read, session_id)
+
+    async def set(self, session_id, user_data):
+        await asyncio.to_thread(self._write, session_id, user_data)
+
+    async def delete(self, session_id):
+        await asyncio.to_thread(self._remove, session_id)
+
+    async def sweep(self):
+        return await asyncio.to_thread(self._sweep)
+
+
+class PostgresSessionStore(SessionStore):
+    """Sessions in the user_session table, through the application's asyncpg engine"""
+
+    # Reads push expires_at forward at most this often
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, ttl: float):
+        super().__init__(ttl)
+        from app.database_folder.postgres import async_session
+        self.session_factory = async_session
+
+    async def get(self, session_id):
+        async with self.session_factory() as session:
+            # As text, so user_data is decoded here with its datetimes
+            row = (await session.execute(
+                text("SELECT user_data::text, expires_at FROM user_session "
+                     "WHERE session_id = :session_id AND expires_at > now()"),
+                {"session_id": session_id})).first()
+            if row is None:
+                return None
+            user_data, expires_at = row
+            if expires_at - datetime.now(timezone.utc) < timedelta(seconds=self.ttl - self.TOUCH_INTERVAL):
+                await session.execute(
+                    text("UPDATE user_session SET expires_at = now() + make_interval(secs => :ttl) "
+                         "WHERE session_id = :session_id"),
+                    {"session_id": session_id, "ttl": self.ttl})
+                await session.commit()
+            return json.loads(user_data, object_hook=_decode_json)
+
+    async def set(self, session_id, user_data):
+        async with self.session_factory() as session:
+            await session.execute(
+                text("INSERT INTO user_session (session_id, user_data, expires_at) "
+                     "VALUES (:session_id, CAST(:user_data AS JSONB), now() + make_interval(secs => :ttl)) "
+                     "ON CONFLICT (session_id) DO UPDATE "
+                     "SET user_data = EXCLUDED.user_data, expires_at = EXCLUDED.expires_at"),
+                {"session_id": session_id, "user_data": json.dumps(user_data, default=_encode_json),
+                 "ttl": self.ttl})
+            await session.commit()
+
+    async def delete(self, session_id):
+        async with self.session_factory() as session:
+            await session.execute(text("DELETE FROM user_session WHERE session_id = :session_id"),
+                                  {"session_id": session_id})
+            await session.commit()
+
+    async def sweep(self):
+        async with self.session_factory() as session:
+            removed = (await session.execute(text("DELETE FROM user_session WHERE expires_at <= now()"))).rowcount
+            await session.commit()
+            return removed
+
+
+class CachedSessionStore(SessionStore):
+    """Short-lived in-process cache in front of a shared store"""
+
+    def __init__(self, backend: SessionStore, cache_ttl: float = 5.0):
+        super().__init__(backend.ttl)
+        self.backend = backend
+        # Fixed expiry, so a logout in another worker is seen within cache_ttl
+        self._cache = MemorySessionStore(cache_ttl, sliding=False)
+
+    async def get(self, session_id):
+        user_data = self._cache.get_nowait(session_id)
+        if user_data is None:
+            user_data = await self.backend.get(session_id)
+            if user_data is not None:
+                self._cache.set_nowait(session_id, user_data)
+        return user_data
+
+    async def set(self, session_id, user_data):
+        await self.backend.set(session_id, user_data)
+        self._cache.set_nowait(session_id, user_data)
+
+    async def delete(self, session_id):
+        self._cache.delete_nowait(session_id)
+        await self.backend.delete(session_id)
+
+    async def sweep(self):
+        # Cached entries expire on their own within cache_ttl
+        return await self.backend.sweep()
+
+
+def create_session_store() -> SessionStore:
+    """Session store selected by the SESSION_BACKEND setting"""
+    backend = settings.SESSION_BACKEND.lower()
+    ttl = settings.SESSION_TTL_SECONDS
+    if backend == "memory":
+        return MemorySessionStore(ttl)
+    if backend == "file":
+        return CachedSessionStore(FileSessionStore(ttl, settings.SESSION_DIR))
+    if backend == "postgres":
+        return CachedSessionStore(PostgresSessionStore(ttl))
+    raise ValueError(f"Unknown SESSION_BACKEND: {settings.SESSION_BACKEND}")
+
+
+async def run_session_sweeper(store: SessionStore, interval: float = 300):
+    """Remove expired sessions every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await store.sweep()
+        except Exception as e:
+            print(f"Session sweep failed: {e}")
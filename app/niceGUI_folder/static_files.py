@@ -0,0 +1,257 @@
+"""
+Serving of cat photos and files under /static.
+
+Only paths inside STATIC_ROOTS are served; the resolver rejects empty, '.'
+and '..' segments, and a cached entry is only created once the real path is
+known to stay inside its root, so symlinks cannot leave it either.
+
+StatCache keeps the stat result, strong ETag and precompressed variants of
+every served file and checks the file again at most every STAT_TTL seconds,
+so a page full of thumbnails costs no file system calls. The ETag is the
+SHA-256 of the content: blobs of the content-addressed store are named by
+it, other files are hashed once per change. Blob URLs never change content,
+so they are cached by browsers for a year without revalidation; other files
+are revalidated after STATIC_MAX_AGE with If-None-Match / If-Modified-Since
+and answered with 304 when unchanged.
+
+Range and If-Range requests are answered by FileResponse with the cached
+stat result and our ETag. When <file>.br or <file>.gz exists (written by
+running this module) and the client accepts that encoding, it is sent
+instead of the file, except for range requests.
+"""
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from stat import S_ISREG
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from app.database_folder.db_setting import settings
+from app.niceGUI_folder.file_service import FileService
+from app.niceGUI_folder.photo_service import PhotoService
+
+STATIC_ROOTS = (PhotoService.PHOTOS_DIR, FileService.FILES_DIR, settings.BLOB_DIR)
+# (absolute path, real path) of each root; a nested root comes before the root it is in
+_ROOTS = sorted(((os.path.abspath(root), os.path.realpath(root)) for root in STATIC_ROOTS),
+                key=lambda root: len(root[0]), reverse=True)
+STAT_TTL = 2.0  # seconds a cached stat result is trusted
+STAT_CACHE_SIZE = 10000
+STATIC_MAX_AGE = 3600  # browser cache lifetime of files whose content may change
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Precompressed variants by preference, and the file types worth compressing
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+PRECOMPRESS_EXTENSIONS = {'.txt', '.csv', '.json', '.xml', '.svg', '.html', '.css', '.js', '.doc', '.rtf'}
+PRECOMPRESS_MIN_SIZE = 1024
+
+READ_CHUNK_SIZE = 1024 * 1024
+_BLOB_ROOT = os.path.realpath(settings.BLOB_DIR)
+
+_BLOB_NAME = re.compile(r'^[0-9a-f]{64}(\.[a-z0-9]+)?$')
+
+
+def _static_root(path: str) -> str | None:
+    """Real path of the STATIC_ROOTS directory a path is inside, None when it is inside none of them"""
+    absolute = os.path.abspath(path)
+    for root, real_root in _ROOTS:
+        if absolute != root and os.path.commonpath([root, absolute]) == root:
+            return real_root
+    return None
+
+
+def resolve_static_path(url_path: str) -> str | None:
+    """Local path of a /static URL path inside STATIC_ROOTS, None when it may not be served"""
+    # The URL path of a file under an absolute root, such as BLOB_DIR=/srv/blobs, starts with '/'
+    parts = url_path.split('/')
+    segments = parts[1:] if parts[0] == '' else parts
+    if not segments or any(part in ('', '.', '..') or '\\' in part or '\0' in part for part in segments):
+        return None
+    if parts[-1].endswith('.part'):
+        return None
+    path = os.path.join(*segments) if parts[0] else os.sep + os.path.join(*segments)
+    return path if _static_root(path) else None
+
+
+@dataclass
+class StaticFile:
+    path: str
+    stat: os.stat_result
+    etag: str
+    immutable: bool
+    media_type: str
+    # encoding: (path, stat result) of the precompressed variants
+    encodings: dict = field(default_factory=dict)
+    checked_at: float = field(default_factory=time.monotonic)
+
+    def unchanged(self, stat_result: os.stat_result) -> bool:
+        return (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino) == \
+            (self.stat.st_mtime_ns, self.stat.st_size, self.stat.st_ino)
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _inside_root(path: str) -> bool:
+    """Whether the real path of a file, after following symlinks, is inside the root its path is under"""
+    root = _static_root(path)
+    return root is not None and os.path.commonpath([root, os.path.realpath(path)]) == root
+
+
+def _stat_file(path: str) -> os.stat_result | None:
+    try:
+        stat_result = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return stat_result if S_ISREG(stat_result.st_mode) else None
+
+
+class StatCache:
+    """LRU cache of served files, each checked against the file system at most every ttl seconds"""
+
+    def __init__(self, ttl: float = STAT_TTL, max_entries: int = STAT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # path: StaticFile, or (None, checked_at) for a missing file
+        self._entries = OrderedDict()
+
+    async def get(self, path: str) -> StaticFile | None:
+        entry = self._entries.get(path)
+        now = time.monotonic()
+        if entry is not None:
+            checked_at = entry.checked_at if isinstance(entry, StaticFile) else entry[1]
+            if now - checked_at < self.ttl:
+                self._entries.move_to_end(path)
+                return entry if isinstance(entry, StaticFile) else None
+        stat_result = _stat_file(path)
+        if isinstance(entry, StaticFile) and stat_result is not None and entry.unchanged(stat_result):
+            entry.encodings = self._encodings(path, stat_result)
+            entry.checked_at = now
+        else:
+            entry = await self._load(path, stat_result) if stat_result is not None else None
+            if entry is None:
+                entry = (None, now)
+        self._entries[path] = entry
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry if isinstance(entry, StaticFile) else None
+
+    @staticmethod
+    def _encodings(path: str, stat_result: os.stat_result) -> dict:
+        if os.path.splitext(path)[1].lower() not in PRECOMPRESS_EXTENSIONS:
+            return {}
+        encodings = {}
+        for encoding, suffix in ENCODINGS:
+            variant_stat = _stat_file(path + suffix)
+            # A variant older than the file was compressed from a previous version
+            if variant_stat is not None and variant_stat.st_mtime_ns >= stat_result.st_mtime_ns \
+                    and _inside_root(path + suffix):
+                encodings[encoding] = (path + suffix, variant_stat)
+        return encodings
+
+    async def _load(self, path: str, stat_result: os.stat_result) -> StaticFile | None:
+        if not _inside_root(path):
+            return None
+        name = os.path.basename(path)
+        immutable = _static_root(path) == _BLOB_ROOT and bool(_BLOB_NAME.match(name))
+        digest = name[:64] if immutable else await asyncio.to_thread(_file_digest, path)
+        return StaticFile(path=path, stat=stat_result, etag=f'"{digest}"', immutable=immutable,
+                          media_type=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                          encodings=self._encodings(path, stat_result))
+
+
+stat_cache = StatCache()
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    accepted = set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def static_response(request: Request, url_path: str) -> Response:
+    """Response for a GET or HEAD of a /static URL path"""
+    path = resolve_static_path(url_path)
+    entry = await stat_cache.get(path) if path else None
+    if entry is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    file_path, stat_result, etag = entry.path, entry.stat, entry.etag
+    headers = {
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if entry.immutable else f'public, max-age={STATIC_MAX_AGE}',
+        'Last-Modified': formatdate(entry.stat.st_mtime, usegmt=True),
+    }
+    if entry.encodings:
+        headers['Vary'] = 'Accept-Encoding'
+        # Ranges refer to the bytes of the file itself
+        if 'range' not in request.headers:
+            accepted = _accepted_encodings(request.headers.get('accept-encoding', ''))
+            for encoding, (variant_path, variant_stat) in entry.encodings.items():
+                if encoding in accepted:
+                    file_path, stat_result, etag = variant_path, variant_stat, f'"{etag[1:-1]}-{encoding}"'
+                    headers['Content-Encoding'] = encoding
+                    break
+    headers['ETag'] = etag
+
+    if _not_modified(request, etag, entry.stat.st_mtime):
+        headers.pop('Content-Encoding', None)
+        return Response(status_code=304, headers=headers)
+    return FileResponse(file_path, headers=headers, media_type=entry.media_type, stat_result=stat_result)
+
+
+def precompress(level: int = 9) -> int:
+    """Write <file>.gz next to the compressible files of STATIC_ROOTS where that saves at least 10%"""
+    written = 0
+    for root in STATIC_ROOTS:
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS or not _inside_root(path):
+                    continue
+                size = os.path.getsize(path)
+                variant = path + '.gz'
+                if size < PRECOMPRESS_MIN_SIZE or (os.path.exists(variant)
+                                                   and os.path.getmtime(variant) >= os.path.getmtime(path)):
+                    continue
+                with open(path, 'rb') as source, gzip.open(variant + '.part', 'wb', level) as target:
+                    shutil.copyfileobj(source, target)
+                if os.path.getsize(variant + '.part') <= size * 0.9:
+                    os.replace(variant + '.part', variant)
+                    written += 1
+                else:
+                    os.remove(variant + '.part')
+    return written
+
+
+if __name__ == "__main__":
+    print(f"Precompressed {precompress()} static files")
@@ -1,18 +1,12 @@
 from datetime import datetime
-import tempfile
-import os
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from app.niceGUI_folder.header import get_header
 from app.niceGUI_folder.auth_service import AuthService
 from fastapi import Request
 from nicegui import ui
 from app.database_folder.orm import AsyncOrm
+from app.database_folder.pagination import encode_cursor
 from app.niceGUI_folder.session_manager import SessionManager
+from app.niceGUI_folder.export_jobs import start_export, start_stream_export
 
 
 studbook_table_columns = [
@@ -28,6 +22,7 @@ studbook_table_columns = [
     {'name': 'besitzer', 'label': 'Besitzer', 'field': 'besitzer', 'align': 'left', 'sortable': True},
     {'name': 'kommentar', 'label': 'Kommentar', 'field': 'kommentar', 'align': 'left', 'sortable': True},
     {'name': 'wcf_sticker', 'label': 'WCF Sticker', 'field': 'wcf_sticker', 'align': 'center', 'sortable': True},
+    {'name': 'ik', 'label': 'IK', 'field': 'ik', 'align': 'center', 'sortable': True},
 ]
 
 
@@ -36,15 +31,15 @@ async def studbook_page_render(request: Request):
     session_id = request.cookies.get("session_id")
     current_user = None
     if session_id:
-        current_user = SessionManager.get_current_user(session_id)
+        current_user = await SessionManager.get_current_user(session_id)
 
     # Load metadata for filters
-    _, owners_data = await AsyncOrm.get_owner()
-    _, breeds_data = await AsyncOrm.get_breed()
+    _, owners_data = await AsyncOrm.get_owner_list()
+    _, breeds_data = await AsyncOrm.get_breed_list()
 
     # Pagination settings
     PAGE_SIZE = 100
-    current_offset = 0
+    next_cursor = None
     all_cats_data = []
     loading_more = False
     has_more_data = True
@@ -56,9 +51,9 @@ async def studbook_page_render(request: Request):
     else:
         cats_data = []
 
-    async def load_cats_data(offset=0, limit=PAGE_SIZE, reset=False):
-        """Load cats data with pagination"""
-        nonlocal all_cats_data, has_more_data, loading_more
+    async def load_cats_data(cursor=None, limit=PAGE_SIZE, reset=False):
+        """Load cats data with keyset pagination"""
+        nonlocal all_cats_data, has_more_data, loading_more, next_cursor
         
         if loading_more:
             return []
@@ -67,7 +62,12 @@ async def studbook_page_render(request: Request):
         
         try:
             # Load data from database with pagination
-            _, new_cats = await AsyncOrm.get_cat_info(limit=limit, offset=offset)
+            _, new_cats = await AsyncOrm.get_cat_info(fields='studbook', limit=limit, cursor=cursor)
+            
+            # Check if there's more data (before filtering, the cursor follows the database rows)
+            has_more_data = len(new_cats) == limit
+            if new_cats:
+                next_cursor = encode_cursor(new_cats[-1]['id'])
             
             # Apply user permission filter
             if owner_filter is not None and owner_filter != -1:
@@ -78,9 +78,6 @@ async def studbook_page_render(request: Request):
             else:
                 all_cats_data.extend(new_cats)
             
-            # Check if there's more data
-            has_more_data = len(new_cats) == limit
-            
             return new_cats
         finally:
             loading_more = False
@@ -94,8 +91,9 @@ async def studbook_page_render(request: Request):
         for owner in owners_data
         if owner['owner_firstname'] and owner['owner_surname']
     }
-    ems_color_options = list(set([cat.get('colour') for cat in cats_data if cat.get('colour')]))
-    status_options = list(set([cat.get('status') for cat in cats_data if cat.get('status')]))
+    facets = await AsyncOrm.get_cat_facets(['colour', 'status'], owner_id=owner_filter)
+    ems_color_options = [value for value, _ in facets['colour']]
+    status_options = [value for value, _ in facets['status']]
 
     filter_inputs = {}
     results_label = None
@@ -103,15 +101,15 @@ async def studbook_page_render(request: Request):
 
     async def apply_filters(reset_pagination=True):
         """Apply all filters to the data with pagination support"""
-        nonlocal current_offset, all_cats_data
         
         if reset_pagination:
-            current_offset = 0
             # Load first batch with filters applied
-            await load_cats_data(offset=0, limit=PAGE_SIZE, reset=True)
+            await load_cats_data(limit=PAGE_SIZE, reset=True)
         
-        filtered_cats = all_cats_data.copy()
+        return filter_cats(all_cats_data.copy())
 
+    def filter_cats(filtered_cats):
+        """Cats of a loaded page or export chunk that match the filter inputs"""
         if filter_inputs.get('search_input') and filter_inputs['search_input'].value:
             search_term = filter_inputs['search_input'].value.lower()
             filtered_cats = [
@@ -170,13 +168,11 @@ async def studbook_page_render(request: Request):
 
     async def load_more_data():
         """Load more data when button is clicked"""
-        nonlocal current_offset, loading_more
         
         if loading_more or not has_more_data:
             return
             
-        current_offset += PAGE_SIZE
-        new_cats = await load_cats_data(offset=current_offset, limit=PAGE_SIZE, reset=False)
+        new_cats = await load_cats_data(cursor=next_cursor, limit=PAGE_SIZE, reset=False)
         
         if new_cats:
             # Apply current filters to new data
@@ -245,6 +241,10 @@ async def studbook_page_render(request: Request):
         # WCF Sticker (now a string field)
         wcf_sticker = cat.get('wcf_sticker', '') or ''
 
+        # Inbreeding coefficient (Inzuchtkoeffizient) in percent
+        coi = cat.get('inbreeding_coefficient')
+        ik = f"{coi * 100:.2f}%" if coi is not None else ''
+
         return {
             'lfd_nr': lfd_nr,
             'datum': datetime.now().strftime('%Y-%m-%d'),
@@ -258,6 +258,7 @@ async def studbook_page_render(request: Request):
             'besitzer': besitzer or 'Not specified',
             'kommentar': kommentar,
             'wcf_sticker': wcf_sticker,
+            'ik': ik,
             'raw_data': cat  # Store full data for detail view
         }
 
@@ -290,6 +291,8 @@ async def studbook_page_render(request: Request):
                     ui.label(f"Status: {cat.get('status', 'Not specified')}")
                     ui.label(f"Document Type: {'Stammbaum' if cat.get('breeding_animal') else 'Abschrift'}")
                     ui.label(f"WCF Sticker: {cat.get('wcf_sticker', 'Not specified')}")
+                    coi = cat.get('inbreeding_coefficient')
+                    ui.label(f"Inbreeding Coefficient: {f'{coi * 100:.2f}%' if coi is not None else 'Not specified'}")
 
                 with ui.card():
                     ui.markdown("### 👨‍🌾 Breeder Information")
@@ -368,182 +371,33 @@ async def studbook_page_render(request: Request):
             with ui.row().classes('q-pa-md justify-center'):
                 ui.label('All records loaded').classes('text-grey-6')
 
+    def export_rows(cats, start=1):
+        """Header labels and cell values of the studbook columns for an export, numbered from start"""
+        rows = []
+        for number, cat in enumerate(cats, start):
+            studbook_row = create_studbook_row(cat, number)
+            rows.append([studbook_row.get(col['field'], '') for col in studbook_table_columns])
+        return [col['label'] for col in studbook_table_columns], rows
+
     async def export_to_xlsx():
-        """Export filtered studbook data to XLSX file"""
-        try:
-            ui.notify('Export started...', type='info', position='top')
-            
-            # Get current filtered data
-            filtered_cats = await apply_filters(reset_pagination=False)
-            
-            if not filtered_cats:
-                ui.notify('No data to export', type='warning', position='top')
-                return
-            
-            # Create workbook and worksheet
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Studbook Export"
-            
-            # Define headers based on studbook_table_columns
-            headers = [col['label'] for col in studbook_table_columns]
-            
-            # Style for headers
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_alignment = Alignment(horizontal="center", vertical="center")
-            
-            # Write headers
-            for col_idx, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col_idx, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-            
-            # Write data rows
-            for row_idx, cat in enumerate(filtered_cats, 2):
-                # Create studbook row data
-                studbook_row = create_studbook_row(cat, row_idx - 1)
-                
-                # Write each column value
-                for col_idx, col_def in enumerate(studbook_table_columns, 1):
-                    field_name = col_def['field']
-                    value = studbook_row.get(field_name, '')
-                    ws.cell(row=row_idx, column=col_idx, value=value)
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except Exception:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'studbook_export_{timestamp}.xlsx'
-            
-            # Save to temporary file and read content
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-                wb.save(tmp_file.name)
-                temp_path = tmp_file.name
-            
-            # Read file content
-            with open(temp_path, 'rb') as f:
-                file_content = f.read()
-            
-            # Clean up temporary file
-            os.unlink(temp_path)
-            
-            # Download the file using ui.download with content
-            ui.download(file_content, filename)
-            
-            ui.notify('XLSX file ready for download', type='positive', position='top')
-            
-        except Exception as e:
-            print(f"Export error: {e}")
-            ui.notify(f'Export failed: {str(e)}', type='negative', position='top')
+        """Export all studbook entries matching the filters to an XLSX file, streamed from the database"""
+        headers, _ = export_rows([])
+        written = 0
+
+        def to_rows(cats):
+            nonlocal written
+            _, rows = export_rows(filter_cats(cats), start=written + 1)
+            written += len(rows)
+            return rows
+
+        # Same permission filter as load_cats_data
+        chunks = AsyncOrm.stream_cat_info(owner_id=owner_filter if owner_filter != -1 else None, fields='studbook')
+        await start_stream_export('Studbook Export', headers, chunks, to_rows, 'studbook_export')
 
     async def export_to_pdf():
         """Export filtered studbook data to PDF file"""
-        try:
-            ui.notify('PDF export started...', type='info', position='top')
-            
-            # Get current filtered data
-            filtered_cats = await apply_filters(reset_pagination=False)
-            
-            if not filtered_cats:
-                ui.notify('No data to export', type='warning', position='top')
-                return
-            
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'studbook_export_{timestamp}.pdf'
-            
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                temp_path = tmp_file.name
-            
-            # Create PDF document
-            doc = SimpleDocTemplate(temp_path, pagesize=landscape(A4))
-            story = []
-            
-            # Define styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=16,
-                spaceAfter=30,
-                alignment=1  # Center alignment
-            )
-            
-            # Add title
-            title = Paragraph("Studbook Export", title_style)
-            story.append(title)
-            story.append(Spacer(1, 12))
-            
-            # Prepare table data
-            headers = [col['label'] for col in studbook_table_columns]
-            table_data = [headers]
-            
-            # Add data rows
-            for cat in filtered_cats:
-                studbook_row = create_studbook_row(cat, len(table_data))
-                row_data = []
-                for col_def in studbook_table_columns:
-                    field_name = col_def['field']
-                    value = str(studbook_row.get(field_name, ''))
-                    # Truncate long text for PDF display
-                    if len(value) > 20:
-                        value = value[:17] + "..."
-                    row_data.append(value)
-                table_data.append(row_data)
-            
-            # Create table
-            table = Table(table_data)
-            table.setStyle(TableStyle([
-                # Header row styling
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                
-                # Data rows styling
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-            ]))
-            
-            story.append(table)
-            
-            # Build PDF
-            doc.build(story)
-            
-            # Read file content
-            with open(temp_path, 'rb') as f:
-                file_content = f.read()
-            
-            # Clean up temporary file
-            os.unlink(temp_path)
-            
-            # Download the file
-            ui.download(file_content, filename)
-            
-            ui.notify('PDF file ready for download', type='positive', position='top')
-            
-        except Exception as e:
-            print(f"PDF export error: {e}")
-            ui.notify(f'PDF export failed: {str(e)}', type='negative', position='top')
+        headers, rows = export_rows(await apply_filters(reset_pagination=False))
+        await start_export('pdf', 'Studbook Export', headers, rows, 'studbook_export', truncate=20)
 
     async def clear_all_filters():
         """Clear all filter inputs"""
@@ -555,7 +409,7 @@ async def studbook_page_render(request: Request):
     async def render_page_content():
         """Render the main page content"""
         # Render page
-        get_header("Studbook", request)
+        await get_header("Studbook", request)
 
         ui.markdown("## 📚 Studbook")
         ui.markdown("Registry of registered cats and their litters")
@@ -626,7 +480,7 @@ async def studbook_page_render(request: Request):
         studbook_container = ui.column().classes('w-full')
 
         # Initial load
-        await load_cats_data(offset=0, limit=PAGE_SIZE, reset=True)
+        await load_cats_data(limit=PAGE_SIZE, reset=True)
         await update_studbook_display()
 
     async def update_studbook_display():
@@ -0,0 +1,84 @@
+"""
+Process pool with progress reporting, shared by the export jobs and the photo pipeline.
+
+The server runs threads (the event loop's executors, the database pool), and
+forking a multithreaded process can leave a lock held forever in the child.
+Workers are therefore started by a forkserver: a clean single-threaded
+process that preloads only the lightweight worker_tasks module. The main
+module is imported again in every worker, where in_worker_process() tells
+its startup code not to run. A job calls report_progress(job_id, progress)
+in the worker; a thread in the parent reads those messages and passes them
+to on_progress. When a worker dies the pool is broken: it is dropped, the
+jobs it held fail, and the next job starts a new pool. Where forkserver is
+not available the jobs run in threads instead, which still keeps the event
+loop free.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+WORKER_MODULES = ['app.niceGUI_folder.worker_tasks']
+
+# Progress queue of a worker process, set by _init_worker
+_worker_progress = None
+
+
+def _init_worker(progress_queue):
+    global _worker_progress
+    _worker_progress = progress_queue
+
+
+def in_worker_process() -> bool:
+    """Whether this process is a pool worker, which imports the main module again as __mp_main__"""
+    return multiprocessing.current_process().name.startswith('ForkServerProcess')
+
+
+def report_progress(job_id: str, progress: float):
+    """Send the progress (0 to 1) of a job from a worker to the parent"""
+    if _worker_progress is not None:
+        _worker_progress.put((job_id, progress))
+
+
+class ProgressPool:
+    """Lazily started process pool whose workers report progress to on_progress(job_id, progress)"""
+
+    def __init__(self, workers: int, name: str, on_progress):
+        self.workers = workers
+        self.name = name
+        self.on_progress = on_progress
+        self._pool = None
+        self._progress = None
+
+    def executor(self):
+        if self._pool is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                # The default preload is __main__, which would start the server in the forkserver
+                context.set_forkserver_preload(WORKER_MODULES)
+                if self._progress is None:
+                    self._progress = context.Queue()
+                    threading.Thread(target=self._read_progress, name=f'{self.name}-progress', daemon=True).start()
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=context,
+                                                 initializer=_init_worker, initargs=(self._progress,))
+            else:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix=self.name)
+        return self._pool
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool; raises BrokenProcessPool after dropping a pool whose worker died"""
+        pool = self.executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # Jobs failing together share the broken pool; only the first one replaces it
+            if self._pool is pool:
+                self._pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def _read_progress(self):
+        while True:
+            job_id, progress = self._progress.get()
+            self.on_progress(job_id, progress)
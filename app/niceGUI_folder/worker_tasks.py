@@ -0,0 +1,38 @@
+"""
+Entry points of the jobs run in ProgressPool workers.
+
+This module is preloaded by the forkserver that starts the workers, so it
+only imports the standard library and worker_pool; what a job needs is
+imported when the job runs, once per worker.
+"""
+import os
+
+from app.niceGUI_folder.worker_pool import report_progress
+
+
+def run_export(job_id: str, kind: str, path: str, title: str, headers: list, rows: list, options: dict):
+    """Build one export file (written under a temporary name, then renamed)"""
+    from functools import partial
+
+    from app.niceGUI_folder.export_jobs import build_pdf, build_xlsx
+
+    report = partial(report_progress, job_id)
+    tmp_path = f"{path}.part"
+    if kind == 'xlsx':
+        build_xlsx(tmp_path, title, headers, rows, report)
+    elif kind == 'pdf':
+        build_pdf(tmp_path, title, headers, rows, report=report, **options)
+    else:
+        raise ValueError(f"Unknown export kind: {kind}")
+    os.replace(tmp_path, path)
+
+
+def process_photo(job_id: str, content: bytes, filename: str):
+    """Standardize and save one photo, return its path (None on failure) and encoder statistics"""
+    from functools import partial
+
+    from app.niceGUI_folder.photo_service import PhotoService
+
+    stats = {}
+    path = PhotoService.save_photo(content, filename, report=partial(report_progress, job_id), stats=stats)
+    return path, stats
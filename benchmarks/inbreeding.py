@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Regression check and benchmark of the COI engine in
+app.database_folder.inbreeding.
+
+First checks PedigreeGraph against a small pedigree whose coefficients are
+worked out by hand below, and the window engine against the sparse one on a
+generated pedigree, and exits with status 1 on a mismatch. Then times the
+inbreeding coefficients of a generated pedigree of the given size (default
+100000 cats in closed lines with some linebreeding) and a mating ranking of
+500 dams x 200 sires on it, seeded with those coefficients as the cached
+graph is, and exits with status 1 when either takes longer than its budget.
+
+Usage: python -m benchmarks.inbreeding [cats]
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from app.database_folder.inbreeding import PedigreeGraph
+
+# cat_id, dam_id, sire_id
+HAND_PEDIGREE = [
+    (1, None, None),
+    (2, None, None),
+    (3, 1, 2),
+    (4, 1, 2),
+    (5, 3, 4),    # full siblings: F = 1/4
+    (6, 5, 3),    # a(5, 3)/2 = (f(3, 3) + f(3, 4)) / 2 = (1/2 + 1/4) / 2 = 3/8
+    (7, 3, 1),    # parent x offspring: f(1, 3) = (f(1, 1) + f(1, 2)) / 2 = 1/4
+    (8, None, 3),   # one unknown parent: 0
+    (9, 8, 4),    # f(8, 4) = f(3, 4) / 2 = 1/8
+    (10, 6, 7),   # f(6, 7) = (f(5, 7) + f(3, 7)) / 2 = (5/16 + 3/8) / 2 = 11/32
+]
+HAND_INBREEDING = {1: 0.0, 2: 0.0, 3: 0.0, 4: 0.0, 5: 0.25, 6: 0.375, 7: 0.25, 8: 0.0, 9: 0.125, 10: 0.34375}
+# Kinship of dam x sire pairs: a cat with itself is (1 + F) / 2, f(9, 2) = (f(8, 2) + f(4, 2)) / 2 = 3/16
+HAND_KINSHIP = {(5, 5): 0.625, (3, 4): 0.25, (6, 7): 0.34375, (9, 2): 0.1875}
+
+# Seconds for the coefficients of 100000 cats, and for ranking the matings of the youngest cats
+INBREEDING_BUDGET = 5.0
+MATING_DAMS, MATING_SIRES = 500, 200
+MATING_BUDGET = 1.0
+
+
+def check_hand_pedigree() -> bool:
+    graph = PedigreeGraph(random.Random(1).sample(HAND_PEDIGREE, len(HAND_PEDIGREE)))
+    ok = True
+    for cat_id, value in graph.coefficients().items():
+        if abs(value - HAND_INBREEDING[cat_id]) > 1e-12:
+            print(f"F({cat_id}) = {value}, expected {HAND_INBREEDING[cat_id]}")
+            ok = False
+    for (dam_id, sire_id), expected in HAND_KINSHIP.items():
+        value = graph.kinship_matrix([graph.index[dam_id]], [graph.index[sire_id]])[0, 0]
+        if abs(value - expected) > 1e-12:
+            print(f"kinship({dam_id}, {sire_id}) = {value}, expected {expected}")
+            ok = False
+    return ok
+
+
+def check_engines(cats: int = 5000) -> bool:
+    """The window engine, with one group per family and with all families in one group, agrees with the sparse one"""
+    rows = generated_pedigree(cats)
+    sparse = PedigreeGraph(rows)
+    sparse.WINDOW_CELLS = 0
+    expected = sparse.inbreeding()
+    ok = True
+    for group_cats in (1, cats):
+        graph = PedigreeGraph(rows)
+        graph.GROUP_CATS = group_cats
+        difference = np.abs(graph.inbreeding() - expected).max()
+        if difference > 1e-12:
+            print(f"Window engine with groups of {group_cats} cats differs from the sparse one by {difference}")
+            ok = False
+    return ok
+
+
+def generated_pedigree(cats: int, seed: int = 0) -> list:
+    """Lines of 500 cats per generation; parents come from the last three generations of the line"""
+    rng = random.Random(seed)
+    lines, per_generation = 10, 500
+    rows = []
+    generations = {}
+    for cat_id in range(1, cats + 1):
+        line = cat_id % lines
+        previous = generations.setdefault(line, [[]])
+        if len(previous[-1]) >= per_generation // lines:
+            previous.append([])
+        candidates = [c for generation in previous[-4:-1] for c in generation]
+        if candidates and rng.random() < 0.95:
+            dam_id, sire_id = rng.choice(candidates), rng.choice(candidates)
+        else:
+            dam_id = sire_id = None
+        previous[-1].append(cat_id)
+        rows.append((cat_id, dam_id, sire_id))
+    return rows
+
+
+if __name__ == "__main__":
+    if not check_hand_pedigree() or not check_engines():
+        sys.exit(1)
+    print("Hand-computed pedigree and engine agreement: ok")
+
+    cats = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = generated_pedigree(cats)
+    start = time.perf_counter()
+    graph = PedigreeGraph(rows)
+    loaded = time.perf_counter()
+    F = graph.inbreeding()
+    computed = time.perf_counter()
+    budget = INBREEDING_BUDGET * cats / 100000
+    print(f"{cats} cats: graph {loaded - start:.2f} s, inbreeding {computed - loaded:.2f} s "
+          f"(budget {budget:.1f} s), mean F {F[1:].mean():.4f}, max F {F.max():.4f}")
+
+    # rank_matings uses the cached graph, seeded with the stored coefficients
+    seeded = PedigreeGraph(rows, {int(cat_id): float(F[i]) for i, cat_id in enumerate(graph.ids) if i})
+    youngest = [seeded.index[cat_id] for cat_id, _, _ in rows[-(MATING_DAMS + MATING_SIRES):]]
+    start = time.perf_counter()
+    kinship = seeded.kinship_matrix(youngest[:MATING_DAMS], youngest[MATING_DAMS:])
+    ranked = time.perf_counter() - start
+    print(f"{MATING_DAMS} x {MATING_SIRES} matings: {ranked:.3f} s (budget {MATING_BUDGET:.1f} s), "
+          f"mean kinship {np.mean(kinship):.4f}")
+    if computed - loaded > budget or ranked > MATING_BUDGET:
+        sys.exit(1)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the JPEG size targeting in PhotoService.standardize_image.
+
+Compares the full encode passes and time of the old loop (quality 95, 85,
+..., 15 until the file fits) with the binary search of
+PhotoService.encode_jpeg_to_size over a corpus of photos, for several target
+sizes. The corpus is the photos in the given directories (default:
+cat_photos) plus generated photo-like images, so it also runs on an empty
+checkout.
+
+Usage: python -m benchmarks.photo_encoding [photo_dir ...]
+"""
+import io
+import os
+import random
+import sys
+import time
+
+from PIL import Image as PILImage, ImageFilter
+
+from app.niceGUI_folder.photo_service import PhotoService
+
+TARGETS_KB = (500, 100, 50, 30, 20)
+GENERATED_PHOTOS = 24
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+
+def generated_photo(seed: int) -> PILImage.Image:
+    """Smooth gradient with blurred shapes and sensor-like noise, more or less detailed by seed"""
+    rng = random.Random(seed)
+    width, height = rng.choice([(1600, 1200), (1200, 1600), (2400, 1600), (800, 800)])
+    image = PILImage.linear_gradient('L').resize((width, height)).convert('RGB')
+    image = PILImage.merge('RGB', [band.point(lambda v, k=rng.random(): int(v * k + 255 * (1 - k) * rng.random()))
+                                   for band in image.split()])
+    shapes = PILImage.effect_noise((width // 40, height // 40), 100)
+    shapes = shapes.resize((width, height), PILImage.Resampling.BICUBIC)
+    image = PILImage.blend(image, shapes.convert('RGB'), 0.3)
+    noise = PILImage.effect_noise((width, height), rng.choice([5, 15, 30, 60])).convert('RGB')
+    image = PILImage.blend(image, noise, rng.choice([0.05, 0.15, 0.3]))
+    return image.filter(ImageFilter.SMOOTH) if seed % 3 == 0 else image
+
+
+def load_corpus(directories) -> list:
+    """Photos resized to the standard size, as standardize_image would before encoding"""
+    images = []
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                if name.lower().endswith(PHOTO_EXTENSIONS):
+                    with PILImage.open(os.path.join(root, name)) as image:
+                        images.append(image.convert('RGB'))
+    images.extend(generated_photo(seed) for seed in range(GENERATED_PHOTOS))
+    return [PhotoService._resize_to_square(image, PhotoService.STANDARD_SIZE) for image in images]
+
+
+def linear_encode(image: PILImage.Image, target_size_bytes: int) -> tuple:
+    """Encode passes and chosen quality of the previous standardize_image loop"""
+    quality = 95
+    passes = 0
+    while quality > 10:
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=quality, optimize=True)
+        passes += 1
+        if len(output.getvalue()) <= target_size_bytes:
+            break
+        quality -= 10
+    return passes, quality
+
+
+def main(directories):
+    corpus = load_corpus(directories)
+    print(f"{len(corpus)} photos at {PhotoService.STANDARD_SIZE[0]}x{PhotoService.STANDARD_SIZE[1]}")
+    print(f"{'target':>8} {'old passes':>11} {'new passes':>11} {'max old/new':>12} "
+          f"{'old quality':>12} {'new quality':>12} {'old ms':>8} {'new ms':>8}")
+    for target_kb in TARGETS_KB:
+        target = target_kb * 1024
+        started = time.perf_counter()
+        old, old_quality = zip(*[linear_encode(image, target) for image in corpus])
+        old_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        new, new_quality = [], []
+        for image in corpus:
+            stats = {}
+            PhotoService.encode_jpeg_to_size(image, target, stats)
+            new.append(stats['passes'])
+            new_quality.append(stats['quality'])
+        new_seconds = time.perf_counter() - started
+        print(f"{target_kb:>6}KB {sum(old) / len(old):>11.2f} {sum(new) / len(new):>11.2f} "
+              f"{max(old):>6}/{max(new):<5} {sum(old_quality) / len(corpus):>12.1f} "
+              f"{sum(new_quality) / len(corpus):>12.1f} {old_seconds * 1000 / len(corpus):>8.1f} "
+              f"{new_seconds * 1000 / len(corpus):>8.1f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or [PhotoService.PHOTOS_DIR])
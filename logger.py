@@ -1,8 +1,17 @@
+import atexit
+import functools
+import inspect
 import logging
 import os
-from datetime import datetime
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta
 import asyncio
 
+from app.database_folder.metrics import registry as metrics_registry
+
 
 class DailyRotatingFileHandler(logging.Handler):
     def __init__(self, log_dir="logs", base_filename="cats", encoding="utf-8"):
@@ -11,14 +20,21 @@ class DailyRotatingFileHandler(logging.Handler):
         self.base_filename = base_filename
         self.encoding = encoding
         self.current_date = None
+        self.next_rollover = 0.0
         self.file = None
         self.ensure_log_file()
 
-    def ensure_log_file(self):
-        today = datetime.now().strftime("%Y-%m-%d")
+    def ensure_log_file(self, created=None):
+        # Cheap timestamp check per record, the date is only formatted at midnight
+        created = time.time() if created is None else created
+        if created < self.next_rollover and self.file is not None and not self.file.closed:
+            return
+        now = datetime.fromtimestamp(created)
+        today = now.strftime("%Y-%m-%d")
+        self.next_rollover = datetime.combine(now.date() + timedelta(days=1), datetime.min.time()).timestamp()
         if (
-            self.current_date != today or 
-            self.file is None or 
+            self.current_date != today or
+            self.file is None or
             self.file.closed
         ):
             if self.file and not self.file.closed:
@@ -36,16 +52,24 @@ class DailyRotatingFileHandler(logging.Handler):
                 self.file = None
 
     def emit(self, record):
+        self.emit_batch([record])
+
+    def emit_batch(self, records):
+        """Write several records and flush once; a record that fails is reported and the rest are still written"""
+        for record in records:
+            try:
+                self.ensure_log_file(record.created)
+                if self.file and not self.file.closed:
+                    self.file.write(self.format(record) + "\n")
+                else:
+                    print("[LogError] Cannot write log — file is not open.")
+            except Exception:
+                self.handleError(record)
         try:
-            self.ensure_log_file()
             if self.file and not self.file.closed:
-                msg = self.format(record)
-                self.file.write(msg + "\n")
                 self.file.flush()
-            else:
-                print("[LogError] Cannot write log — file is not open.")
         except Exception as e:
-            print(f"[LogError] Failed to write log: {e}")
+            print(f"[LogError] Failed to flush log: {e}")
 
     def close(self):
         if self.file and not self.file.closed:
@@ -56,6 +80,63 @@ class DailyRotatingFileHandler(logging.Handler):
         super().close()
 
 
+class LazyQueueHandler(logging.Handler):
+    """
+    Puts records on a queue without formatting them; the message is built in
+    the listener thread, so a log call on the event loop costs a queue put.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__()
+        self.queue = log_queue
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+class BatchQueueListener(threading.Thread):
+    """Drains the log queue in a background thread and hands records to the handler in batches"""
+
+    def __init__(self, log_queue, handler, batch_size=256, flush_interval=0.5):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = log_queue
+        self.handler = handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._stop_requested = False
+
+    def run(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._stop_requested:
+                    return
+                continue
+            if record is None:
+                return
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    self.handler.emit_batch(batch)
+                    return
+                batch.append(record)
+            self.handler.emit_batch(batch)
+
+    def stop(self):
+        """Write everything still queued and stop the thread"""
+        self._stop_requested = True
+        self.queue.put(None)
+        self.join(timeout=5)
+
+
 logger = logging.getLogger("bot")
 logger.setLevel(logging.INFO)
 
@@ -68,35 +149,127 @@ daily_file_handler = DailyRotatingFileHandler()
 daily_file_handler.setFormatter(formatter)
 
 # logger.addHandler(stream_handler)
-logger.addHandler(daily_file_handler)
+
+# LOG_MODE=queue (default) writes from a background thread, LOG_MODE=sync writes on the calling thread
+if os.getenv("LOG_MODE", "queue").lower() == "sync":
+    logger.addHandler(daily_file_handler)
+else:
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(LazyQueueHandler(log_queue))
+    log_listener = BatchQueueListener(log_queue, daily_file_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+
+# Argument logging policy of log_function_call
+REDACTED_ARG_NAMES = ("password", "secret", "token")
+MAX_ARG_LENGTH = 200
+MAX_ARGS_LENGTH = 1000
+
+# Fraction of successful calls logged per function name, errors are always logged
+LOG_SAMPLING = {}
+
+
+def set_log_sampling(function_name: str, rate: float):
+    """Log only a fraction (0..1) of the successful calls of a function"""
+    LOG_SAMPLING[function_name] = rate
+
+
+def _is_redacted(name) -> bool:
+    name = str(name).lower()
+    return any(part in name for part in REDACTED_ARG_NAMES)
+
+
+def _short_repr(value) -> str:
+    if isinstance(value, dict):
+        value = {k: "***" if _is_redacted(k) else v for k, v in value.items()}
+    text = repr(value)
+    if len(text) > MAX_ARG_LENGTH:
+        text = f"{text[:MAX_ARG_LENGTH]}...({len(text)} chars)"
+    return text
+
+
+def _call_arguments(signature, args, kwargs) -> str:
+    """
+    Redacted, truncated call arguments, rendered when the record is created:
+    the listener thread formats it later, when the arguments may have changed
+    """
+    try:
+        named = signature.bind_partial(*args, **kwargs).arguments
+    except (TypeError, ValueError):
+        named = {**{f"arg{i}": a for i, a in enumerate(args)}, **kwargs}
+    text = ", ".join(f"{name}={'***' if _is_redacted(name) else _short_repr(value)}"
+                     for name, value in named.items())
+    if len(text) > MAX_ARGS_LENGTH:
+        text = f"{text[:MAX_ARGS_LENGTH]}..."
+    return text
 
 
 def log_function_call(func):
+    # AsyncOrm methods are staticmethods: wrap the function inside, and let their
+    # errors propagate to the callers as they always did
+    if isinstance(func, staticmethod):
+        return staticmethod(_wrap(func.__func__, reraise=True))
+    return _wrap(func, reraise=False)
+
+
+def _wrap(func, reraise):
+    name = func.__name__
+    try:
+        signature = inspect.signature(func)
+    except (TypeError, ValueError):
+        signature = None
+
+    def log_call(args, kwargs):
+        if logger.isEnabledFor(logging.INFO) and random.random() < LOG_SAMPLING.get(name, 1.0):
+            logger.info("Calling function '%s' with args: %s", name,
+                        _call_arguments(signature, args, kwargs) if signature else "")
+            return True
+        return False
+
+    def record(start, result=None, error=False):
+        # AsyncOrm methods return (count, rows)
+        rows = None
+        if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], int):
+            rows = result[0]
+        elif isinstance(result, list):
+            rows = len(result)
+        metrics_registry.observe_call(name, time.perf_counter() - start, rows, error)
+
+    def log_error(ex):
+        logger.error("Error in function '%s': %s", name, ex)
+        if reraise:
+            raise ex
+
     if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
             try:
-                logger.info(
-                    f"""Calling function '{func.__name__}'
-                        with args: {args}, kwargs: {kwargs}""")
+                logged = log_call(args, kwargs)
                 result = await func(*args, **kwargs)
-                logger.info(
-                    f"Function '{func.__name__}' executed successfully")
+                record(start, result)
+                if logged:
+                    logger.info("Function '%s' executed successfully", name)
                 return result
             except Exception as ex:
-                logger.error(f"Error in function '{func.__name__}': {ex}")
+                record(start, error=True)
+                log_error(ex)
                 return None
         return wrapper
     else:
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
+            start = time.perf_counter()
             try:
-                logger.info(
-                    f"""Calling function '{func.__name__}'
-                        with args: {args}, kwargs: {kwargs}""")
+                logged = log_call(args, kwargs)
                 result = func(*args, **kwargs)
-                logger.info(
-                    f"Function '{func.__name__}' executed successfully")
+                record(start, result)
+                if logged:
+                    logger.info("Function '%s' executed successfully", name)
                 return result
             except Exception as ex:
-                logger.error(f"Error in function '{func.__name__}': {ex}")
+                record(start, error=True)
+                log_error(ex)
                 return None
         return wrapper
@@ -0,0 +1,23 @@
+-- Migration to add the blob table of the content-addressed photo and file store
+-- Run this SQL script in your PostgreSQL database, then move existing photos and files into the store with:
+--     python -m app.database_folder.blob_store import
+-- Unreferenced blobs are removed with:
+--     python -m app.database_folder.blob_store gc
+
+-- One row per stored blob that a cat references or referenced; refcount counts the cat_photos/cat_files entries
+CREATE TABLE IF NOT EXISTS blob (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    extension VARCHAR NOT NULL DEFAULT '',
+    size BIGINT,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Used by the garbage collection of unreferenced blobs
+CREATE INDEX IF NOT EXISTS ix_blob_unreferenced ON blob (updated_at) WHERE refcount = 0;
+
+COMMENT ON TABLE blob IS 'Index of the content-addressed photo and file store with reference counts';
+
+-- Migration completed successfully
+SELECT 'Migration completed successfully - blob table added' as result;
@@ -0,0 +1,19 @@
+-- Migration to add the cat_ancestry closure table
+-- Run this SQL script in your PostgreSQL database, then fill the table with:
+--     python -m app.database_folder.ancestry
+
+-- One row per ancestor of a cat: depth is the number of generations on the shortest path
+CREATE TABLE IF NOT EXISTS cat_ancestry (
+    ancestor_id BIGINT NOT NULL,
+    descendant_id BIGINT NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_cat_ancestry_ancestor_depth ON cat_ancestry (ancestor_id, depth);
+CREATE INDEX IF NOT EXISTS ix_cat_ancestry_descendant_depth ON cat_ancestry (descendant_id, depth);
+
+COMMENT ON TABLE cat_ancestry IS 'Closure table of cat ancestors with their shortest distance (self rows have depth 0)';
+
+-- Migration completed successfully
+SELECT 'Migration completed successfully - cat_ancestry table added' as result;
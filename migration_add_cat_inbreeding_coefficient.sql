@@ -0,0 +1,12 @@
+-- Migration to add the inbreeding coefficient field to the cat table
+-- Run this SQL script in your PostgreSQL database, then compute the values with:
+--     python -m app.database_folder.inbreeding
+
+-- Add inbreeding coefficient column to the cat table
+ALTER TABLE cat ADD COLUMN IF NOT EXISTS cat_inbreeding_coefficient FLOAT;
+
+-- Add comment to document the new field
+COMMENT ON COLUMN cat.cat_inbreeding_coefficient IS 'Inbreeding coefficient (COI) computed from the recorded pedigree, 0..1';
+
+-- Migration completed successfully
+SELECT 'Migration completed successfully - inbreeding coefficient field added' as result;
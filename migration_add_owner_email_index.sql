@@ -0,0 +1,18 @@
+-- Migration to add a case-insensitive unique index on owner emails
+-- Login looks up one owner by lower(owner_email) through this index.
+-- Run this SQL script in your PostgreSQL database.
+
+-- Emails that differ only by case must be merged or changed before the index can be created
+SELECT lower(owner_email) AS email, count(*) AS owners
+FROM owner
+WHERE owner_email IS NOT NULL
+GROUP BY lower(owner_email)
+HAVING count(*) > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_owner_email_lower ON owner (lower(owner_email));
+
+-- Password hashes move from unsalted SHA-256 to scrypt; existing hashes are upgraded on the next login
+COMMENT ON COLUMN owner.owner_hashed_password IS 'scrypt$n$r$p$salt$hash, or a legacy SHA-256 hex digest until the next login';
+
+-- Migration completed successfully
+SELECT 'Migration completed successfully - owner email index added' as result;
@@ -0,0 +1,20 @@
+-- Migration to add the indexes of the dam/sire typeahead search
+-- Run this SQL script in your PostgreSQL database
+
+-- Candidates of one gender in first name order, continued by (first name, id)
+CREATE INDEX IF NOT EXISTS ix_cat_gender_name ON cat (cat_gender, (coalesce(cat_firstname, '')), cat_id);
+
+-- Microchip prefix lookup (LIKE 'term%')
+CREATE INDEX IF NOT EXISTS ix_cat_microchip_pattern ON cat (cat_microchip_number text_pattern_ops);
+
+-- Lowercased names with a trigram index for name terms; without it the names are matched with ILIKE
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+ALTER TABLE cat ADD COLUMN IF NOT EXISTS cat_name_document TEXT GENERATED ALWAYS AS (
+    lower(coalesce("cat_firstname", '') || ' ' ||
+        coalesce("cat_surname", '') || ' ' ||
+        coalesce("cat_callname", ''))
+) STORED;
+CREATE INDEX IF NOT EXISTS ix_cat_name_document_trgm ON cat USING gin (cat_name_document gin_trgm_ops);
+
+-- Migration completed successfully
+SELECT 'Migration completed successfully - parent search indexes added' as result;
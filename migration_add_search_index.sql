@@ -0,0 +1,58 @@
+-- Migration to add indexed search over cats, owners and breeders
+-- Run this SQL script in your PostgreSQL database. Until the trigram indexes exist
+-- cat search falls back to ILIKE over the individual columns.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Lowercased search documents, maintained by PostgreSQL on every insert/update
+ALTER TABLE cat ADD COLUMN IF NOT EXISTS cat_search_document TEXT GENERATED ALWAYS AS (
+    lower(coalesce("cat_firstname", '') || ' ' ||
+        coalesce("cat_surname", '') || ' ' ||
+        coalesce("cat_callname", '') || ' ' ||
+        coalesce("cat_gender", '') || ' ' ||
+        coalesce("cat_microchip_number", '') || ' ' ||
+        coalesce("cat_EMS_colour", '') || ' ' ||
+        coalesce("cat_litter", '') || ' ' ||
+        coalesce("cat_haritage_number", '') || ' ' ||
+        coalesce("cat_haritage_number_2", '') || ' ' ||
+        coalesce("cat_eye_colour", '') || ' ' ||
+        coalesce("cat_hair_type", '') || ' ' ||
+        coalesce("cat_tests", '') || ' ' ||
+        coalesce("cat_blood_group", '') || ' ' ||
+        coalesce("cat_gencode", '') || ' ' ||
+        coalesce("cat_features", '') || ' ' ||
+        coalesce("cat_notes", '') || ' ' ||
+        coalesce("cat_show_results", '') || ' ' ||
+        coalesce("cat_birth_country", '') || ' ' ||
+        coalesce("cat_location", '') || ' ' ||
+        coalesce("cat_association", '') || ' ' ||
+        coalesce("cat_jaw_fault", '') || ' ' ||
+        coalesce("cat_hernia", '') || ' ' ||
+        coalesce("cat_testicles", '') || ' ' ||
+        coalesce("cat_death_cause", '') || ' ' ||
+        coalesce("cat_status", ''))
+) STORED;
+
+ALTER TABLE owner ADD COLUMN IF NOT EXISTS owner_search_document TEXT GENERATED ALWAYS AS (
+    lower(coalesce("owner_firstname", '') || ' ' ||
+        coalesce("owner_surname", '') || ' ' ||
+        coalesce("owner_email", ''))
+) STORED;
+
+ALTER TABLE breed ADD COLUMN IF NOT EXISTS breed_search_document TEXT GENERATED ALWAYS AS (
+    lower(coalesce("breed_firstname", '') || ' ' ||
+        coalesce("breed_surname", '') || ' ' ||
+        coalesce("breed_email", ''))
+) STORED;
+
+-- Trigram indexes serve LIKE '%term%' and word_similarity ranking
+CREATE INDEX IF NOT EXISTS ix_cat_search_document_trgm ON cat USING gin (cat_search_document gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_owner_search_document_trgm ON owner USING gin (owner_search_document gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_breed_search_document_trgm ON breed USING gin (breed_search_document gin_trgm_ops);
+
+-- Cats of matching owners and breeders are looked up by these
+CREATE INDEX IF NOT EXISTS ix_cat_owner_id ON cat (owner_id);
+CREATE INDEX IF NOT EXISTS ix_cat_breed_id ON cat (cat_breed_id);
+
+-- Migration completed successfully
+SELECT 'Migration completed successfully - search documents and trigram indexes added' as result;
@@ -0,0 +1,17 @@
+-- Migration to add the user_session table
+-- Used when SESSION_BACKEND=postgres so all server workers share logged-in sessions.
+-- Run this SQL script in your PostgreSQL database.
+
+CREATE TABLE IF NOT EXISTS user_session (
+    session_id VARCHAR PRIMARY KEY,
+    user_data JSONB NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- Used by the background sweeper that deletes expired sessions
+CREATE INDEX IF NOT EXISTS ix_user_session_expires_at ON user_session (expires_at);
+
+COMMENT ON TABLE user_session IS 'Logged-in sessions with sliding expiry';
+
+-- Migration completed successfully
+SELECT 'Migration completed successfully - user_session table added' as result;
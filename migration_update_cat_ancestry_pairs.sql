@@ -0,0 +1,21 @@
+-- Migration to change cat_ancestry from one row per pedigree path to one row per ancestor
+-- Run this SQL script in your PostgreSQL database, then fill the table again with:
+--     python -m app.database_folder.ancestry
+
+-- The rows are recomputed by the command above, so the old table is simply replaced
+DROP TABLE IF EXISTS cat_ancestry;
+
+CREATE TABLE cat_ancestry (
+    ancestor_id BIGINT NOT NULL,
+    descendant_id BIGINT NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_cat_ancestry_ancestor_depth ON cat_ancestry (ancestor_id, depth);
+CREATE INDEX IF NOT EXISTS ix_cat_ancestry_descendant_depth ON cat_ancestry (descendant_id, depth);
+
+COMMENT ON TABLE cat_ancestry IS 'Closure table of cat ancestors with their shortest distance (self rows have depth 0)';
+
+-- Migration completed successfully
+SELECT 'Migration completed successfully - cat_ancestry now has one row per ancestor' as result;
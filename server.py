@@ -4,9 +4,9 @@ import os
 import time
 import uuid
 from typing import Any, List
-from datetime import datetime
+from datetime import datetime, date
 from fastapi import FastAPI, HTTPException, Depends, Form, Query, APIRouter, Request, Response
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 import uvicorn
@@ -21,7 +21,10 @@ from app.niceGUI_folder.pydentic_models import CatCreate, CatUpdate, OwnerCreate
 from app.niceGUI_folder.add_cat_page import add_cat_page_render
 from app.niceGUI_folder.add_owner_page import add_owner_page_render
 from app.niceGUI_folder.add_breed_page import add_breed_page_render
-from app.database_folder.orm import AsyncOrm
+from app.database_folder.orm import AsyncOrm, BREED_EXPORT_COLUMNS, OWNER_EXPORT_COLUMNS
+from app.database_folder.cat_filters import CatFilter
+from app.database_folder.cat_projection import CAT_INFO_PROFILES, resolve_fields
+from app.database_folder.row_stream import ROW_FORMATS, encode_rows, gzip_chunks
 from app.database_folder.postgres import (check_db_connection,
                                           postgres_check_and_create_database,
                                           drop_database_if_exists)
@@ -42,16 +45,24 @@ from app.niceGUI_folder.auth_check_page import auth_check_page_render
 from app.niceGUI_folder.studbook_page import studbook_page_render
 from app.niceGUI_folder.auth_service import AuthService
 from app.niceGUI_folder.session_manager import SessionManager
+from app.database_folder.metrics import registry as metrics_registry
+from app.niceGUI_folder.export_jobs import EXPORT_DIR, export_jobs, run_export_sweeper
+from app.niceGUI_folder.worker_pool import in_worker_process
+from app.niceGUI_folder.static_files import static_response
 
+# Remove expired sessions and exports in the background
+app.on_startup(SessionManager.run_sweeper)
+app.on_startup(run_export_sweeper)
 
 
 
-def require_auth(request: Request):
+
+async def require_auth(request: Request):
     """Check if user is authenticated and return user data"""
     session_id = request.cookies.get("session_id")
-    if not session_id or not SessionManager.is_authenticated(session_id):
+    if not session_id:
         return None
-    return SessionManager.get_current_user(session_id)
+    return await SessionManager.get_current_user(session_id)
 
 
 @app.exception_handler(Exception)
@@ -64,11 +75,11 @@ async def swallow_disconnects(request: Request, exc: Exception):
 
 @ui.page('/')
 async def root_page(request: Request):
-    auth_check_page_render(request)
+    await auth_check_page_render(request)
 
 @ui.page('/dashboard')
 async def main_page(request: Request):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await main_page_render(request)
@@ -80,7 +91,7 @@ async def login_page(request: Request):
 
 @ui.page('/cats')
 async def cats_page(request: Request):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await cats_page_render(request)
@@ -88,7 +99,7 @@ async def cats_page(request: Request):
 
 @ui.page('/owners')
 async def owners_page(request: Request):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await owners_page_render(request)
@@ -96,7 +107,7 @@ async def owners_page(request: Request):
 
 @ui.page('/breeds')
 async def breeds_page(request: Request):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await breeds_page_render(request)
@@ -104,7 +115,7 @@ async def breeds_page(request: Request):
 
 @ui.page('/add_cat')
 async def add_cat_page(request: Request):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await add_cat_page_render(request)
@@ -112,7 +123,7 @@ async def add_cat_page(request: Request):
 
 @ui.page('/add_owner')
 async def add_owner_page(request: Request):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await add_owner_page_render(request)
@@ -120,7 +131,7 @@ async def add_owner_page(request: Request):
 
 @ui.page('/add_breed')
 async def add_breed_page(request: Request):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await add_breed_page_render(request)
@@ -128,7 +139,7 @@ async def add_breed_page(request: Request):
 
 @ui.page('/cat_profile/{cat_id}')
 async def cat_profile_page(request: Request, cat_id: int):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await cat_profile_page_render(request, cat_id)
@@ -136,7 +147,7 @@ async def cat_profile_page(request: Request, cat_id: int):
 
 @ui.page('/edit_cat/{cat_id}')
 async def edit_cat_page(request: Request, cat_id: int):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await edit_cat_page_render(request, cat_id)
@@ -144,7 +155,7 @@ async def edit_cat_page(request: Request, cat_id: int):
 
 @ui.page('/edit_owner/{owner_id}')
 async def edit_owner_page(request: Request, owner_id: int):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await edit_owner_page_render(request, owner_id)
@@ -152,7 +163,7 @@ async def edit_owner_page(request: Request, owner_id: int):
 
 @ui.page('/edit_breed/{breed_id}')
 async def edit_breed_page(request: Request, breed_id: int):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await edit_breed_page_render(request, breed_id)
@@ -160,14 +171,14 @@ async def edit_breed_page(request: Request, breed_id: int):
 
 @ui.page('/history')
 async def history_page(request: Request):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await history_page_render(request)
 
 @ui.page('/studbook')
 async def studbook_page(request: Request):
-    user = require_auth(request)
+    user = await require_auth(request)
     if not user:
         return RedirectResponse(url='/login', status_code=303)
     await studbook_page_render(request)
@@ -186,7 +197,7 @@ async def login_post(email: str = Form(...), password: str = Form(...)):
             session_id = str(uuid.uuid4())
             
             # Store session in SessionManager
-            SessionManager.set_current_user(user_data, session_id)
+            await SessionManager.set_current_user(user_data, session_id)
             
             # Create response with redirect to dashboard
             response = RedirectResponse(url='/dashboard', status_code=303)
@@ -218,7 +229,7 @@ async def logout_post(request: Request):
         session_id = request.cookies.get("session_id")
         if session_id:
             # Clear session from SessionManager
-            SessionManager.clear_session(session_id)
+            await SessionManager.clear_session(session_id)
         
         # Create response with redirect to login
         response = RedirectResponse(url='/login', status_code=303)
@@ -232,32 +243,162 @@ async def logout_post(request: Request):
         return RedirectResponse(url='/login', status_code=303)
 
 
-@app.get('/static/{file_path:path}')
-async def serve_static_files(file_path: str):
-    normalized_file_path = file_path.replace('/', '\\') if os.name == 'nt' else file_path
-    full_path = os.path.join(os.getcwd(), normalized_file_path)
-    print(f"Serving file: {file_path} -> {full_path}")
-    print(f"Normalized path: {normalized_file_path}")
-    print(f"File exists: {os.path.exists(full_path)}")
-    print(f"Is file: {os.path.isfile(full_path) if os.path.exists(full_path) else 'N/A'}")
-    
-    if os.path.exists(full_path) and os.path.isfile(full_path):
-        return FileResponse(full_path)
-    else:
-        print(f"File not found: {full_path}")
-        raise HTTPException(status_code=404, detail="File not found")
+@app.api_route('/static/{file_path:path}', methods=['GET', 'HEAD'])
+async def serve_static_files(request: Request, file_path: str):
+    """Serve cat photos and files with caching headers, conditional and range requests"""
+    return await static_response(request, file_path)
 
 
 @app.get('/exports/{filename}')
-async def serve_exports(filename: str):
-    """Serve exported files from exports directory"""
-    exports_dir = os.path.join(os.getcwd(), 'exports')
-    file_path = os.path.join(exports_dir, filename)
-    
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        return FileResponse(file_path, filename=filename)
-    else:
+async def serve_exports(request: Request, filename: str):
+    """Serve a finished export job's file from the exports directory"""
+    if not await require_auth(request):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    file_path = os.path.join(EXPORT_DIR, filename)
+    if os.path.basename(filename) != filename or not export_jobs.is_available(filename, request.cookies.get("session_id")) \
+            or not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="Export file not found")
+    return FileResponse(file_path, filename=filename)
+
+
+@app.get('/api/cats/parents')
+async def search_parents(request: Request, gender: str = Query(..., pattern='^(Male|Female)$'),
+                         q: str | None = None, cursor: str | None = None,
+                         limit: int = Query(20, ge=1, le=100), breeding_animal: bool = False,
+                         alive: bool = False, unlocked: bool = False,
+                         child_birthday: date | None = None, exclude_cat_id: int | None = None):
+    """Typeahead search for dam or sire candidates, one page per request"""
+    if not await require_auth(request):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        _, rows, next_cursor = await AsyncOrm.search_parents(
+            gender, q, cursor, limit, breeding_animal, alive, unlocked,
+            child_birthday, exclude_cat_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    items = [{key: row[key] for key in ('id', 'firstname', 'surname', 'microchip', 'birthday', 'colour')}
+             for row in rows]
+    return {'items': items, 'next_cursor': next_cursor}
+
+
+@app.get('/api/statistics')
+async def statistics(request: Request):
+    """Dashboard counts and breakdowns from the cached statistics snapshot"""
+    if not await require_auth(request):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    snapshot = await AsyncOrm.get_statistics()
+    return {name: {str(key): count for key, count in value.items()} if isinstance(value, dict) else value
+            for name, value in snapshot.items()}
+
+
+async def require_admin(request: Request):
+    """User data of a logged-in admin, otherwise an HTTP error"""
+    user = await require_auth(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if user.get('owner_permission') != AuthService.ADMIN_PERMISSION:
+        raise HTTPException(status_code=403, detail="Admin permission required")
+    return user
+
+
+@app.get('/metrics')
+async def metrics(request: Request):
+    """Query and ORM metrics in the Prometheus text format, for admins only"""
+    await require_admin(request)
+    return PlainTextResponse(metrics_registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get('/metrics/slow_queries')
+async def slow_queries(request: Request):
+    """Most recent slow queries with their normalized SQL, for admins only"""
+    await require_admin(request)
+    return list(metrics_registry.slow_queries)
+
+
+def cat_filter_params(search: str | None = None, gender: list[str] | None = Query(None),
+                      owner_id: list[int] | None = Query(None), breed_id: list[int] | None = Query(None),
+                      colour: list[str] | None = Query(None), eye_colour: list[str] | None = Query(None),
+                      hair_type: list[str] | None = Query(None), status: list[str] | None = Query(None),
+                      birthday_from: date | None = None, birthday_to: date | None = None,
+                      weight_min: float | None = None, weight_max: float | None = None,
+                      breeding_animal: bool | None = None, breeding_lock: bool | None = None,
+                      alive: bool | None = None) -> CatFilter:
+    """Cat filter spec from query parameters (list parameters may be repeated)"""
+    return CatFilter(search=search, genders=gender, owner_ids=owner_id, breed_ids=breed_id, colours=colour,
+                     eye_colours=eye_colour, hair_types=hair_type, statuses=status,
+                     birthday_from=birthday_from, birthday_to=birthday_to, weight_min=weight_min,
+                     weight_max=weight_max, breeding_animal=breeding_animal, breeding_lock=breeding_lock,
+                     alive=alive)
+
+
+ROW_FORMAT_PATTERN = f"^({'|'.join(ROW_FORMATS)})$"
+
+
+def rows_response(chunks, columns: list, row_format: str, name: str, compress: bool):
+    """Stream chunks of row dicts as a CSV or NDJSON download, gzipped when compress is set"""
+    body = encode_rows(chunks, columns, row_format)
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{row_format}"
+    media_type = ROW_FORMATS[row_format]
+    if compress:
+        body = gzip_chunks(body)
+        filename += '.gz'
+        media_type = 'application/gzip'
+    return StreamingResponse(body, media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+async def cat_rows_response(request: Request, filters: CatFilter, fields: str, row_format: str, name: str,
+                            compress: bool):
+    """Stream the cats visible to the user that match filters"""
+    user = await require_auth(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    owner_filter = AuthService.get_user_cats_filter(user)
+    if owner_filter == -1:
+        raise HTTPException(status_code=403, detail="No access to cats")
+    # A profile name or a comma separated list of row keys
+    keys = fields if fields in CAT_INFO_PROFILES else [key.strip() for key in fields.split(',') if key.strip()]
+    try:
+        # Built before the response starts, so a bad field is still a 400
+        query = await AsyncOrm.cat_info_query(owner_id=owner_filter, filters=filters, fields=keys)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {e}")
+    return rows_response(AsyncOrm.stream_rows(query), list(resolve_fields(keys)), row_format, name, compress)
+
+
+@app.get('/api/export/cats')
+async def export_cats(request: Request, format: str = Query('csv', pattern=ROW_FORMAT_PATTERN),
+                      fields: str = 'export', gzip: bool = False, filters: CatFilter = Depends(cat_filter_params)):
+    """All cats matching the filters (same spec as the cats page) as CSV or NDJSON"""
+    return await cat_rows_response(request, filters, fields, format, 'cats', gzip)
+
+
+@app.get('/api/export/studbook')
+async def export_studbook(request: Request, format: str = Query('csv', pattern=ROW_FORMAT_PATTERN),
+                          gzip: bool = False, filters: CatFilter = Depends(cat_filter_params)):
+    """Studbook rows of all cats matching the filters as CSV or NDJSON"""
+    return await cat_rows_response(request, filters, 'studbook', format, 'studbook', gzip)
+
+
+@app.get('/api/export/owners')
+async def export_owners(request: Request, format: str = Query('csv', pattern=ROW_FORMAT_PATTERN),
+                        gzip: bool = False):
+    """All owners (without password hashes) as CSV or NDJSON, for admins only"""
+    await require_admin(request)
+    return rows_response(AsyncOrm.stream_owners(), [column.key for column in OWNER_EXPORT_COLUMNS],
+                         format, 'owners', gzip)
+
+
+@app.get('/api/export/breeds')
+async def export_breeds(request: Request, format: str = Query('csv', pattern=ROW_FORMAT_PATTERN),
+                        gzip: bool = False):
+    """All breeders as CSV or NDJSON"""
+    if not await require_auth(request):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return rows_response(AsyncOrm.stream_breeds(), [column.key for column in BREED_EXPORT_COLUMNS],
+                         format, 'breeds', gzip)
 
 
 def start_db():
@@ -302,7 +443,8 @@ def start_db():
     log_success("Test data loaded")
 
 
-if __name__ in {"__main__", "__mp_main__"}:
+# Pool workers import this module again as __mp_main__ and must not start the server
+if __name__ in {"__main__", "__mp_main__"} and not in_worker_process():
     log_info("Starting Cat Database Management System v2.0")
     log_info("=" * 50)
     